@@ -0,0 +1,54 @@
+"""Synthetic servers/<guild_id>/ trees for the benchmarks, written in the bot's own file formats."""
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timezone
+
+START_TS = 1_600_000_000
+HEAVY_USER = 100_000  # the user the per-user benchmarks look up; owns ~1% of every store
+
+
+def _record(ts: int, **fields) -> dict:
+    return {"id": str(uuid.UUID(int=random.getrandbits(128))), **fields,
+            "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat(), "ts": ts}
+
+
+def generate_guild(guild_id: int, size: int, seed: int = 0) -> dict:
+    """Writes `size` warnings, mutes and MC infractions for one guild under ./servers. Returns a summary."""
+    rng = random.Random(seed)
+    random.seed(seed)
+    users = max(50, size // 20)
+    path = os.path.join(".", "servers", str(guild_id))
+    os.makedirs(path, exist_ok=True)
+
+    def pick_user() -> int:
+        return HEAVY_USER if rng.random() < 0.01 else HEAVY_USER + 1 + rng.randrange(users)
+
+    # Spread records over the past, time-ordered like the real stores
+    step = max(1, (int(datetime.now(timezone.utc).timestamp()) - START_TS) // size)
+    warnings, mutes, mc = [], [], []
+    for i in range(size):
+        ts = START_TS + i * step
+        warnings.append(_record(ts, userId=str(pick_user()), reason=f"reason {rng.randrange(200)}",
+                                moderatorId=str(rng.randrange(1, 20))))
+        mutes.append(_record(ts, userId=str(pick_user()), reason="spam", moderatorId=str(rng.randrange(1, 20)),
+                             durationSec=rng.choice([600, 3600, 86400])))
+        user = pick_user()
+        mc.append(_record(ts, playerName=f"player{user}", playerUuid=str(uuid.UUID(int=user)),
+                          moderatorDiscordId=str(rng.randrange(1, 20)), ruleId=str(rng.randrange(1, 10)),
+                          degree=1, punishmentType="mute_1h", reason="griefing"))
+    # A handful of mutes still running, so /sync/mutes has something to return
+    now = int(datetime.now(timezone.utc).timestamp())
+    for i in range(min(size, 200)):
+        mutes.append(_record(now, userId=str(HEAVY_USER + 1 + i), reason="live", moderatorId="1", durationSec=86400))
+
+    links = {str(HEAVY_USER + i): f"player{HEAVY_USER + i}" for i in range(min(users, 5000))}
+    files = {"warnings.json": warnings, "mutes.json": mutes, "mc_infractions.json": mc, "mclinks.json": links,
+             "modules.json": {"enabled": ["warnsextras", "minecraft"]}}
+    sizes = {}
+    for filename, data in files.items():
+        with open(os.path.join(path, filename), "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        sizes[filename] = os.path.getsize(os.path.join(path, filename))
+    return {"guild_id": guild_id, "records_per_store": size, "users": users, "file_bytes": sizes}
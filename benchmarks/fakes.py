@@ -0,0 +1,66 @@
+"""Minimal stand-ins for the discord.py objects the cogs touch, so handlers run without a gateway."""
+
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str = None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.display_name = self.name
+        self.nick = None
+        self.bot = False
+        self.mention = f"<@{user_id}>"
+
+
+class FakeMember(FakeUser):
+    def __init__(self, guild, user_id: int, name: str = None, administrator: bool = False):
+        super().__init__(user_id, name)
+        self.guild = guild
+        self.roles = []
+        self.guild_permissions = type("Permissions", (), {"administrator": administrator})()
+        self.timed_out_until = None
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, owner_id: int = 1, name: str = None):
+        self.id = guild_id
+        self.owner_id = owner_id
+        self.name = name or f"guild{guild_id}"
+        self._members = {}
+        self.filesize_limit = 25 * 1024 * 1024
+
+    def add_member(self, user_id: int, **kwargs) -> FakeMember:
+        member = self._members[user_id] = FakeMember(self, user_id, **kwargs)
+        return member
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, user_id: int):
+        return self._members.get(user_id)
+
+    def get_member_named(self, name: str):
+        return next((m for m in self._members.values() if m.name == name), None)
+
+
+class FakeContext:
+    """Quacks like commands.Context for handlers that only read guild/author and send replies."""
+
+    def __init__(self, guild: FakeGuild, author: FakeMember):
+        self.guild = guild
+        self.author = author
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+
+    async def reply(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+
+
+class FakeBot:
+    def __init__(self):
+        self.cogs = {}
+
+    def get_cog(self, name: str):
+        return self.cogs.get(name)
@@ -0,0 +1,200 @@
+"""
+In-process stand-in for the Discord gateway and REST API.
+
+FakeGateway builds a real commands.Bot, loads the real cogs, and feeds it gateway payloads
+through discord.py's own ConnectionState parsers, so commands, listeners, converters and
+views run unmodified. Every REST call (bot HTTP client and interaction webhooks) is answered
+locally, counted per route, and can be given an artificial latency.
+"""
+import asyncio
+import itertools
+import json
+import time
+
+import discord
+from discord.ext import commands
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+
+BOT_ID = 100_000_000_000_000_010
+OWNER_ID = 100_000_000_000_000_002
+EPOCH = "2024-01-01T00:00:00+00:00"
+COGS = ("core", "warnsextras", "lockdown", "natlang", "tickets", "minecraft")
+
+_ids = itertools.count(200_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_ids)
+
+
+def user_payload(user_id: int, name: str = None, bot: bool = False) -> dict:
+    return {"id": str(user_id), "username": name or f"user{user_id % 100000}", "discriminator": "0",
+            "global_name": None, "avatar": None, "bot": bot}
+
+
+def member_payload(user_id: int, roles=(), name: str = None, bot: bool = False, **extra) -> dict:
+    return {"user": user_payload(user_id, name, bot), "roles": [str(r) for r in roles], "joined_at": EPOCH,
+            "deaf": False, "mute": False, "flags": 0, "nick": None, "communication_disabled_until": None, **extra}
+
+
+def message_payload(channel_id: int, author: dict, content: str, guild_id: int = None, member: dict = None,
+                    mentions=()) -> dict:
+    data = {"id": str(snowflake()), "channel_id": str(channel_id), "author": author, "content": content,
+            "timestamp": EPOCH, "edited_timestamp": None, "tts": False, "mention_everyone": False,
+            "mentions": list(mentions), "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0}
+    if guild_id:
+        data["guild_id"] = str(guild_id)
+    if member:
+        data["member"] = member
+    return data
+
+
+class FakeRest:
+    """Counts REST calls by route template and returns just enough payload for discord.py to continue."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+
+    async def answer(self, method: str, path: str, params: dict, payload) -> object:
+        key = f"{method} {path}"
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        channel_id = params.get("channel_id") or 0
+        if path.endswith("/messages") and method == "POST" or path.startswith("/webhooks/") and method == "POST":
+            content = (payload or {}).get("content") if isinstance(payload, dict) else None
+            return message_payload(channel_id, user_payload(BOT_ID, "bot", True), content or "")
+        if path.endswith("/callback"):
+            return {"interaction": {"id": str(params.get("webhook_id", 0)), "type": 2,
+                                    "response_message_id": str(snowflake()), "response_message_loading": False,
+                                    "response_message_ephemeral": False}}
+        if "/members/{user_id}" in path:
+            return member_payload(int(params.get("user_id", 0)))
+        if path == "/users/@me/channels":
+            recipient = int((payload or {}).get("recipient_id", 0))
+            return {"id": str(snowflake()), "type": 1, "recipients": [user_payload(recipient)], "last_message_id": None}
+        if path == "/users/{user_id}":
+            return user_payload(int(params.get("user_id", 0)))
+        return {}
+
+
+class _FakeWebhookAdapter(AsyncWebhookAdapter):
+    def __init__(self, rest: FakeRest):
+        super().__init__()
+        self.rest = rest
+
+    async def request(self, route, session=None, *, payload=None, multipart=None, files=None, **kwargs):
+        if multipart and payload is None:
+            payload = next((json.loads(p["value"]) for p in multipart if p.get("name") == "payload_json"), None)
+        return await self.rest.answer(route.method, route.path,
+                                      {"webhook_id": route.webhook_id, "channel_id": 0}, payload)
+
+
+class FakeGateway:
+    def __init__(self, rest_latency: float = 0.0):
+        self.rest = FakeRest(rest_latency)
+        self.bot = None
+        self.guild_data = None
+
+    async def start(self, cogs=COGS) -> commands.Bot:
+        intents = discord.Intents.default()
+        intents.message_content = True
+        intents.members = True
+        bot = commands.Bot(command_prefix="!", intents=intents, help_command=None, chunk_guilds_at_startup=False)
+        bot.loop = asyncio.get_running_loop()
+
+        async def request(route, **kwargs):
+            payload = kwargs.get("json")
+            if payload is None and kwargs.get("form"):
+                payload = next((json.loads(p["value"]) for p in kwargs["form"] if p.get("name") == "payload_json"), None)
+            # Route keeps only the major parameters; a {user_id} is always the last path segment
+            user_id = route.url.rsplit("/", 1)[-1] if route.path.endswith("{user_id}") else None
+            params = {"channel_id": route.channel_id, "user_id": user_id}
+            return await self.rest.answer(route.method, route.path, params, payload)
+        bot.http.request = request
+        async_context.set(_FakeWebhookAdapter(self.rest))
+
+        state = bot._connection
+        state.user = discord.ClientUser(state=state, data=user_payload(BOT_ID, "bot", True))
+        state.application_id = BOT_ID
+        for name in cogs:
+            await bot.load_extension(f"modules.{name}")
+        self.bot = bot
+        return bot
+
+    def create_guild(self, guild_id: int, channels: int = 10, members: int = 50, modules=COGS) -> dict:
+        """Adds a guild with an admin role, `channels` text channels and `members` plain members."""
+        admin_role = snowflake()
+        channel_ids = [snowflake() for _ in range(channels)]
+        member_ids = [snowflake() for _ in range(members)]
+        self.guild_data = {
+            "id": str(guild_id), "name": f"Replay {guild_id}", "owner_id": str(OWNER_ID), "icon": None,
+            "roles": [
+                {"id": str(guild_id), "name": "@everyone", "permissions": "1024", "position": 0, "color": 0,
+                 "hoist": False, "managed": False, "mentionable": False, "flags": 0},
+                {"id": str(admin_role), "name": "admin", "permissions": "8", "position": 1, "color": 0,
+                 "hoist": False, "managed": False, "mentionable": False, "flags": 0},
+            ],
+            "channels": [{"id": str(c), "type": 0, "name": f"channel-{i}", "position": i, "permission_overwrites": []}
+                         for i, c in enumerate(channel_ids)],
+            "members": [member_payload(OWNER_ID, [admin_role], "owner"), member_payload(BOT_ID, [admin_role], "bot", True)]
+                       + [member_payload(m) for m in member_ids],
+            "member_count": members + 2, "emojis": [], "stickers": [], "features": [], "large": False,
+            "unavailable": False, "threads": [], "voice_states": [], "presences": [], "stage_instances": [],
+            "guild_scheduled_events": [], "premium_tier": 0,
+        }
+        self.bot._connection.parse_guild_create(self.guild_data)
+
+        from module_utils import save_server_data
+        save_server_data(guild_id, "modules.json", {"enabled": [m for m in modules if m != "core"]})
+        return {"guild_id": guild_id, "admin_role": admin_role, "channels": channel_ids, "members": member_ids}
+
+    # ── Events ───────────────────────────────────────────────────────────────
+
+    def message(self, guild_id: int, channel_id: int, author_id: int, content: str, roles=(), mentions=()):
+        author = user_payload(author_id, "owner" if author_id == OWNER_ID else None)
+        member = {k: v for k, v in member_payload(author_id, roles).items() if k != "user"}
+        mention_payloads = [{**user_payload(m), "member": {k: v for k, v in member_payload(m).items() if k != "user"}}
+                            for m in mentions]
+        self.bot._connection.parse_message_create(
+            message_payload(channel_id, author, content, guild_id, member, mention_payloads))
+
+    def slash(self, guild_id: int, channel_id: int, author_id: int, name: str, options: dict, roles=()):
+        """Dispatches an application command; user options are given as {"member": user_id}."""
+        opts, resolved_users, resolved_members = [], {}, {}
+        for key, value in options.items():
+            if key in ("member", "user", "moderator"):
+                opts.append({"name": key, "type": 6, "value": str(value)})
+                resolved_users[str(value)] = user_payload(value)
+                resolved_members[str(value)] = {k: v for k, v in member_payload(value).items() if k != "user"}
+            else:
+                opts.append({"name": key, "type": 3, "value": str(value)})
+        data = {  # a time-based id, so Interaction.created_at is "now"
+            "id": str(discord.utils.time_snowflake(discord.utils.utcnow())), "application_id": str(BOT_ID), "type": 2, "token": "replay-token", "version": 1,
+            "guild_id": str(guild_id), "channel_id": str(channel_id),
+            "channel": {"id": str(channel_id), "type": 0, "guild_id": str(guild_id), "name": "replay", "position": 0},
+            "member": {**member_payload(author_id, roles), "permissions": "8"},
+            "app_permissions": "8", "locale": "en-US", "guild_locale": "en-US", "entitlements": [],
+            "authorizing_integration_owners": {}, "context": 0, "attachment_size_limit": 26214400,
+            "data": {"id": str(snowflake()), "name": name, "type": 1, "options": opts,
+                     "resolved": {"users": resolved_users, "members": resolved_members}},
+        }
+        self.bot._connection.parse_interaction_create(data)
+
+    def member_update(self, guild_id: int, user_id: int, timed_out_until: str = None):
+        self.bot._connection.parse_guild_member_update(
+            {"guild_id": str(guild_id), **member_payload(user_id, communication_disabled_until=timed_out_until)})
+
+    async def drain(self, timeout: float = 600):
+        """Waits for every task spawned by the fed events (listeners, commands, views) to finish."""
+        deadline = time.monotonic() + timeout
+        me = asyncio.current_task()
+        while time.monotonic() < deadline:
+            pending = [t for t in asyncio.all_tasks() if t is not me and not t.done()
+                       and not t.get_name().startswith("replay-idle")]
+            # Views keep a timeout task alive; only wait on work that will actually finish
+            pending = [t for t in pending if "View" not in repr(t.get_coro())]
+            if not pending:
+                return
+            await asyncio.wait(pending, timeout=min(1.0, deadline - time.monotonic()))
@@ -0,0 +1,204 @@
+"""
+Offline gateway replay: drives the real cogs with a message/interaction/member-event stream.
+
+    python -m benchmarks.replay [--events 5000] [--channels 300] [--members 500] [--rest-latency-ms 0]
+    python -m benchmarks.replay --scenario lockdown --channels 300 --rest-latency-ms 40
+    python -m benchmarks.replay --recording events.jsonl
+
+Scenarios: "mixed" (chatter with prefix commands, NatLang wakewords, /hwarn and member
+updates), "chatter" (plain messages only: on_message throughput), "lockdown" (!lockdown over
+every channel, then !lockdown unlock). A recording is JSONL with one event per line:
+
+    {"type": "message", "channel": 0, "author": "member:3", "content": "!warn <@member:4> spam"}
+    {"type": "slash", "channel": 0, "author": "owner", "name": "hwarn", "options": {"member": "member:4"}}
+    {"type": "member_update", "user": "member:4", "timed_out_until": null}
+
+"owner" and "member:N" refer to the synthetic guild; channels are indexes. Groq is stubbed.
+Handler percentiles come from the bot's own latency histograms (bucket-interpolated).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("SHARD_PROCESS_INDEX", "1")  # keep the Minecraft cog from binding port 7912
+
+from benchmarks.gateway import OWNER_ID, FakeGateway, snowflake
+
+GUILD_ID = 300_000_000_000_000_001
+
+
+class StubGroq:
+    """Answers NatLang prompts locally: warns the first user id in the query, otherwise asks to clarify."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)  # the real client is synchronous too
+        query = messages[-1]["content"].rsplit("Query:", 1)[-1]
+        match = re.search(r"\d{15,20}", query)
+        if match:
+            answer = {"action": "warn", "args": {"user_id": match.group(0), "reason": "replay"}, "confirm": False}
+        else:
+            answer = {"clarify": True, "message": "Which user?", "buttons": {"cancel": "Cancel"}}
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(answer)))])
+
+
+def synthetic_events(scenario: str, count: int, channels: int, members: int, seed: int = 0):
+    rng = random.Random(seed)
+    if scenario == "lockdown":
+        yield {"type": "message", "channel": 0, "author": "owner", "content": "!lockdown"}
+        yield {"type": "message", "channel": 0, "author": "owner", "content": "!lockdown unlock"}
+        return
+    for _ in range(count):
+        channel, member = rng.randrange(channels), f"member:{rng.randrange(members)}"
+        target = f"member:{rng.randrange(members)}"
+        roll = rng.random() if scenario == "mixed" else 0
+        if roll < 0.90:
+            yield {"type": "message", "channel": channel, "author": member, "content": f"chatter {rng.random():.6f}"}
+        elif roll < 0.95:
+            yield {"type": "message", "channel": channel, "author": "owner", "content": f"!warn <@{target}> replay spam"}
+        elif roll < 0.97:
+            yield {"type": "message", "channel": channel, "author": "owner", "content": f"WM warn <@{target}> for spam"}
+        elif roll < 0.99:
+            yield {"type": "slash", "channel": channel, "author": "owner", "name": "hwarn", "options": {"member": target}}
+        else:
+            yield {"type": "member_update", "user": target, "timed_out_until": None}
+
+
+class Replayer:
+    def __init__(self, gateway: FakeGateway, guild: dict):
+        self.gw = gateway
+        self.guild = guild
+
+    def resolve(self, ref) -> int:
+        if ref == "owner":
+            return OWNER_ID
+        if isinstance(ref, str) and ref.startswith("member:"):
+            members = self.guild["members"]
+            return members[int(ref[7:]) % len(members)]
+        return int(ref)
+
+    def feed(self, event: dict):
+        guild_id = self.guild["guild_id"]
+        channel = self.guild["channels"][int(event.get("channel", 0)) % len(self.guild["channels"])]
+        author = self.resolve(event.get("author", "owner"))
+        roles = [self.guild["admin_role"]] if author == OWNER_ID else []
+        if event["type"] == "message":
+            mentions = []
+            def mention(match):
+                user_id = self.resolve(match.group(1))
+                mentions.append(user_id)
+                return f"<@{user_id}>"
+            content = re.sub(r"<@!?([^>]+)>", mention, event["content"])
+            self.gw.message(guild_id, channel, author, content, roles=roles, mentions=mentions)
+        elif event["type"] == "slash":
+            options = {k: self.resolve(v) if k in ("member", "user", "moderator") else v
+                       for k, v in event.get("options", {}).items()}
+            self.gw.slash(guild_id, channel, author, event["name"], options, roles=roles)
+        elif event["type"] == "member_update":
+            self.gw.member_update(guild_id, self.resolve(event["user"]), event.get("timed_out_until"))
+        else:
+            raise ValueError(f"unknown event type {event['type']!r}")
+
+
+def percentiles(family: dict) -> dict:
+    return {label: {"count": h.count, "p50_ms": h.quantile(0.5) * 1000, "p99_ms": h.quantile(0.99) * 1000,
+                    "total_ms": h.sum * 1000}
+            for label, h in sorted(family.items(), key=lambda kv: kv[1].sum, reverse=True)}
+
+
+async def replay(args) -> dict:
+    from module_utils import metrics
+
+    gw = FakeGateway(rest_latency=args.rest_latency_ms / 1000)
+    await gw.start()
+    groq = StubGroq(args.groq_latency_ms / 1000)
+    sys.modules["modules.natlang"].groq_client = groq  # the module object load_extension created
+    guild = gw.create_guild(GUILD_ID, channels=args.channels, members=args.members)
+    replayer = Replayer(gw, guild)
+
+    if args.recording:
+        with open(args.recording) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    else:
+        events = list(synthetic_events(args.scenario, args.events, args.channels, args.members, args.seed))
+
+    metrics.reset()
+    gw.rest.calls.clear()
+    started = time.perf_counter()
+    for i in range(0, len(events), args.batch):
+        for event in events[i:i + args.batch]:
+            replayer.feed(event)
+        await gw.drain()
+    wall = time.perf_counter() - started
+
+    return {
+        "scenario": "recording" if args.recording else args.scenario,
+        "events": len(events), "guild": {"channels": args.channels, "members": args.members},
+        "wall_seconds": wall, "events_per_second": len(events) / wall if wall else 0.0,
+        "rest_latency_ms": args.rest_latency_ms, "groq_calls": groq.calls,
+        "rest_calls_total": sum(gw.rest.calls.values()),
+        "rest_calls": dict(sorted(gw.rest.calls.items(), key=lambda kv: -kv[1])),
+        "commands": percentiles(metrics.family("command")),
+        "listeners": percentiles(metrics.family("listener")),
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{report['scenario']}: {report['events']:,} events in {report['wall_seconds']:.2f}s "
+          f"→ {report['events_per_second']:,.0f} events/s, {report['rest_calls_total']:,} REST calls, "
+          f"{report['groq_calls']} Groq calls")
+    for section in ("commands", "listeners"):
+        print(f"\n  {section}:")
+        for label, s in report[section].items():
+            print(f"    {label[:48]:<48} ×{s['count']:<6} p50 {s['p50_ms']:8.2f}ms  p99 {s['p99_ms']:8.2f}ms  total {s['total_ms']:9.1f}ms")
+    print("\n  REST calls:")
+    for route, n in report["rest_calls"].items():
+        print(f"    {route:<60} {n}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=("mixed", "chatter", "lockdown"), default="mixed")
+    parser.add_argument("--recording", help="JSONL event file to replay instead of a synthetic scenario")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=100, help="events fed before waiting for handlers to finish")
+    parser.add_argument("--rest-latency-ms", type=float, default=0.0, help="simulated latency per REST call")
+    parser.add_argument("--groq-latency-ms", type=float, default=0.0, help="simulated (blocking) Groq latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="wm-replay-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        report = asyncio.run(replay(args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Storage and history benchmarks against synthetic guilds.
+
+    python -m benchmarks.run [--sizes 1k,100k,1m] [--repeat 5] [--out results.json]
+    python -m benchmarks.run --compare old.json new.json
+
+Everything runs in a temporary working directory (the bot's stores are relative to the
+cwd) against fake discord.py objects; the WMMC API is served on a loopback ephemeral port.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("SHARD_PROCESS_INDEX", "1")  # keep the Minecraft cog from binding port 7912
+
+from benchmarks.datasets import HEAVY_USER, generate_guild
+from benchmarks.fakes import FakeBot, FakeContext, FakeGuild
+
+DEFAULT_SIZES = "1k,100k,1m"
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+    }
+
+
+async def timeit(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def http_get(port: int, path: str) -> bytes:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=300) as resp:
+        return resp.read()
+
+
+async def bench_size(size: int, repeat: int) -> dict:
+    from module_utils import load_server_data
+    from modules import minecraft
+    from modules.core import Core, add_warning
+    from modules.warnsextras import WarnsExtras
+
+    guild_id = 900_000 + size
+    started = time.perf_counter()
+    dataset = generate_guild(guild_id, size)
+    dataset["generate_seconds"] = time.perf_counter() - started
+
+    bot = FakeBot()
+    core, extras, mc = Core(bot), WarnsExtras(bot), minecraft.Minecraft(bot)
+    bot.cogs.update({"Core": core, "WarnsExtras": extras, "Minecraft": mc})
+    guild = FakeGuild(guild_id)
+    moderator = guild.add_member(1, administrator=True)
+    member = guild.add_member(HEAVY_USER)
+    ctx = FakeContext(guild, moderator)
+
+    # The API throttles per guild; lift it so the benchmark measures the handlers
+    minecraft._buckets[guild_id] = minecraft.TokenBucket(1e9, 1e9)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), minecraft.PermanentAPIHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    player_uuid = str(uuid.UUID(int=HEAVY_USER))
+
+    results = {}
+    try:
+        results["load_server_data(warnings.json)"] = await timeit(lambda: load_server_data(guild_id, "warnings.json"), repeat)
+        results["execute_hwarn (data path, first page)"] = await timeit(lambda: core.execute_hwarn(ctx, member), repeat)
+        results["_do_allwarns (first page)"] = await timeit(lambda: extras._do_allwarns(ctx, {}), repeat)
+        results["get_combined_history"] = await timeit(lambda: mc.get_combined_history(member), repeat)
+        results["GET /history"] = await timeit(
+            lambda: http_get(port, f"/history?server_id={guild_id}&player_uuid={player_uuid}"), repeat)
+        results["GET /sync/mutes (full)"] = await timeit(lambda: http_get(port, f"/sync/mutes?server_id={guild_id}"), repeat)
+        cursor = json.loads(http_get(port, f"/sync/mutes?server_id={guild_id}"))["cursor"]
+        results["GET /sync/mutes (delta)"] = await timeit(
+            lambda: http_get(port, f"/sync/mutes?server_id={guild_id}&since={cursor}"), repeat)
+        # Writes last: they grow the dataset
+        results["add_warning"] = await timeit(lambda: add_warning(guild_id, HEAVY_USER, 1, "benchmark"), repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+        mc.cog_unload()
+    return {"dataset": dataset, "benchmarks": results}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(sizes: list, repeat: int) -> dict:
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "sizes": {},
+    }
+    for size in sizes:
+        print(f"[bench] {size:,} records per store…", flush=True)
+        report["sizes"][str(size)] = result = await bench_size(size, repeat)
+        for name, stats in result["benchmarks"].items():
+            print(f"  {name:<40} median {stats['median_ms']:10.2f} ms   min {stats['min_ms']:10.2f} ms")
+    return report
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f: old = json.load(f)
+    with open(new_path) as f: new = json.load(f)
+    print(f"{old['meta']['git_revision']} → {new['meta']['git_revision']} (median ms)")
+    for size, result in new["sizes"].items():
+        before = old["sizes"].get(size, {}).get("benchmarks", {})
+        print(f"\n{int(size):,} records per store")
+        for name, stats in result["benchmarks"].items():
+            if name not in before:
+                print(f"  {name:<40} {'—':>10} → {stats['median_ms']:10.2f}")
+                continue
+            ratio = stats["median_ms"] / before[name]["median_ms"] if before[name]["median_ms"] else float("inf")
+            flag = "  ⚠ slower" if ratio > 1.2 else ""
+            print(f"  {name:<40} {before[name]['median_ms']:10.2f} → {stats['median_ms']:10.2f}  ×{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"records per store, comma separated (default {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="results file (default benchmarks/results/bench-<rev>-<time>.json)")
+    parser.add_argument("--keep-data", action="store_true", help="leave the generated servers/ tree behind")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    out = args.out or os.path.join(REPO_ROOT, "benchmarks", "results",
+                                   f"bench-{git_revision()}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    out = os.path.abspath(out)
+    workdir = tempfile.mkdtemp(prefix="wm-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        report = asyncio.run(run([parse_size(s) for s in args.sizes.split(",")], args.repeat))
+    finally:
+        os.chdir(cwd)
+        if args.keep_data: print(f"[bench] data kept in {workdir}")
+        else: shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"[bench] results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+"""
+Load generator for the permanent WMMC API, plus a stand-in WMMC receiver for /command pushes.
+
+    python -m benchmarks.wmmc_load [--size 100k] [--concurrency 32] [--duration 10] [--pushes 200]
+    python -m benchmarks.wmmc_load --transport unix [--pushes 200]
+    python -m benchmarks.wmmc_load --url http://localhost:7912 --guild <id> [--token <api token>]
+    python -m benchmarks.wmmc_load --url unix:/run/wm/api.sock --guild <id> [--token <api token>]
+    python -m benchmarks.wmmc_load receiver [--port 25580] [--latency-ms 5] [--fail-rate 0.01]
+
+Without --url the API is served in-process on a loopback ephemeral port, against a synthetic
+guild in a temporary working directory (throttle lifted, unless --throttle), after a preflight
+that logs a punishment and reads it back through /history (200, then 304). Each worker
+replays a weighted mix of /identify, /rules/sync, /punishment/log, /history, /sync/mutes and
+/ping (--mix history=40,ping=20,...); batched /ingest chat flushes are opt-in (ingest=5).
+With --pushes, a local fake WMMC registers itself via /identify and _execute_punish-style
+commands are delivered to it through the instance registry.
+--transport unix serves both the API and the fake WMMC on Unix domain sockets instead.
+
+Reported: request rate, p50/p95/p99 latency and error rate per endpoint, and storage write
+amplification (bytes the bot wrote to disk per request-body byte it received), read from /metrics.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("SHARD_PROCESS_INDEX", "1")  # keep the Minecraft cog from binding port 7912
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.datasets import HEAVY_USER, generate_guild
+from benchmarks.run import parse_size
+
+DEFAULT_MIX = "ping=30,history=25,sync_mutes=20,punishment_log=15,identify=5,rules_sync=5"
+RULES = {str(i): {"name": f"Rule {i}", "punishments": ["warn", "mute_30m", "temp_ban_7d", "perm_ban"]}
+         for i in range(1, 41)}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint {name!r}, expected one of {', '.join(ENDPOINTS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples: return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+# ── Traffic ──────────────────────────────────────────────────────────────────
+# Each builder returns (method, path, json body or None) for one realistic WMMC request.
+
+class Traffic:
+    def __init__(self, guild_id: int, players: int, receiver, seed: int = 0):
+        self.guild_id = guild_id
+        self.players = players
+        self.receiver = receiver
+        self.rng = random.Random(seed)
+
+    def player(self) -> tuple:
+        # Mostly the linked player population, sometimes the heavy user the datasets centre on
+        n = HEAVY_USER if self.rng.random() < 0.05 else HEAVY_USER + self.rng.randrange(self.players)
+        return str(uuid.UUID(int=n)), f"player{n}"
+
+    def ping(self):
+        return "GET", f"/ping?server_id={self.guild_id}&instance_id=load", None
+
+    def history(self):
+        return "GET", f"/history?server_id={self.guild_id}&player_uuid={self.player()[0]}", None
+
+    def sync_mutes(self):
+        return "GET", f"/sync/mutes?server_id={self.guild_id}", None
+
+    def punishment_log(self):
+        player_uuid, name = self.player()
+        rule = self.rng.choice(list(RULES))
+        degree = self.rng.randint(1, 4)
+        return "POST", "/punishment/log", {
+            "discord_server_id": str(self.guild_id), "player_uuid": player_uuid, "player_name": name,
+            "rule_id": rule, "degree": degree, "punishment_type": RULES[rule]["punishments"][degree - 1],
+            "reason": "load test", "timestamp": int(time.time() * 1000)}
+
+    def identify(self):
+        return "POST", "/identify", {"discord_server_id": str(self.guild_id), "wmmc_version": "load",
+                                     "instance_id": "load", **(self.receiver.endpoint() if self.receiver else {})}
+
+    def rules_sync(self):
+        return "POST", "/rules/sync", {"discord_server_id": str(self.guild_id), "rules": json.dumps(RULES)}
+
+    def ingest(self):
+        # One flush of a busy server's chat buffer; not in DEFAULT_MIX, add it with --mix
+        now = int(time.time() * 1000)
+        events = []
+        for i in range(INGEST_BATCH):
+            player_uuid, name = self.player()
+            events.append({"type": "chat", "player_uuid": player_uuid, "player_name": name,
+                           "message": self.rng.choice(CHAT_LINES), "timestamp": now + i})
+        return "POST", "/ingest", {"discord_server_id": str(self.guild_id), "events": events}
+
+ENDPOINTS = ("ping", "history", "sync_mutes", "punishment_log", "identify", "rules_sync", "ingest")
+INGEST_BATCH = 200
+CHAT_LINES = ("gg", "anyone want to trade?", "where is spawn", "lol", "brb", "nice build", "tp me pls")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}   # endpoint -> [seconds]
+        self.statuses = {}    # endpoint -> {status: count}
+        self.body_bytes = 0   # request-body bytes sent to write endpoints
+
+    def record(self, endpoint: str, status, seconds: float):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def summary(self, wall: float) -> dict:
+        result = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples.sort()
+            errors = sum(n for status, n in self.statuses[endpoint].items() if status not in (200, 202))
+            result[endpoint] = {
+                "requests": len(samples), "rps": len(samples) / wall,
+                "p50_ms": percentile(samples, 0.50) * 1000, "p95_ms": percentile(samples, 0.95) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000, "max_ms": samples[-1] * 1000,
+                "error_rate": errors / len(samples),
+                "statuses": {str(k): v for k, v in sorted(self.statuses[endpoint].items(), key=str)},
+            }
+        return result
+
+
+async def worker(session, base_url: str, headers: dict, traffic: Traffic, mix: dict, recorder: Recorder,
+                 deadline: float, budget: list):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline and budget[0] > 0:
+        budget[0] -= 1
+        endpoint = traffic.rng.choices(names, weights)[0]
+        method, path, body = getattr(traffic, endpoint)()
+        data = json.dumps(body).encode() if body is not None else None
+        if data:
+            recorder.body_bytes += len(data)
+        started = time.perf_counter()
+        try:
+            async with session.request(method, base_url + path, data=data, headers=headers) as resp:
+                await resp.read()
+                status = resp.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = type(e).__name__
+        recorder.record(endpoint, status, time.perf_counter() - started)
+
+
+async def scrape_storage(session, base_url: str) -> dict:
+    """Sums the storage counters in the API's /metrics output: {metric name: total}."""
+    totals = {}
+    async with session.get(base_url + "/metrics") as resp:
+        text = await resp.text()
+    for line in text.splitlines():
+        if line.startswith("wm_storage_"):
+            name, value = line.split("{", 1)[0], float(line.rsplit(" ", 1)[1])
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+async def check_history_after_log(session, base_url: str, headers: dict, guild_id: int):
+    """
+    The normal WMMC flow on a fresh process: log a punishment, then view the player's history.
+    The first /history must answer 200 and a repeat with its ETag 304.
+    """
+    player_uuid, name = str(uuid.UUID(int=HEAVY_USER)), f"player{HEAVY_USER}"
+    async with session.post(base_url + "/punishment/log", headers=headers, data=json.dumps({
+            "discord_server_id": str(guild_id), "player_uuid": player_uuid, "player_name": name,
+            "rule_id": "1", "degree": 1, "punishment_type": "warn", "reason": "preflight",
+            "timestamp": int(time.time() * 1000)}).encode()) as resp:
+        if resp.status != 200:
+            raise SystemExit(f"preflight: /punishment/log answered {resp.status}")
+    path = f"{base_url}/history?server_id={guild_id}&player_uuid={player_uuid}"
+    try:
+        async with session.get(path, headers=headers) as resp:
+            await resp.read()
+            status, etag = resp.status, resp.headers.get("ETag")
+        async with session.get(path, headers={**headers, "If-None-Match": etag or ""}) as resp:
+            repeat = resp.status
+    except aiohttp.ClientError as e:
+        raise SystemExit(f"preflight: /history after /punishment/log failed: {e!r}")
+    if status != 200 or repeat != 304:
+        raise SystemExit(f"preflight: /history after /punishment/log answered {status}, then {repeat} (want 200, 304)")
+
+
+# ── Fake WMMC ────────────────────────────────────────────────────────────────
+
+class FakeWMMC:
+    """Answers POST /command like a WMMC instance, with optional latency and failure injection."""
+
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.received = []
+        self.failed = 0
+        self.runner = None
+        self.port = None
+        self.socket_path = None
+
+    async def handle_command(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self.failed += 1
+            return web.json_response({"error": "injected failure"}, status=500)
+        self.received.append(body.get("command"))
+        return web.json_response({"status": "executed"})
+
+    async def start(self, port: int = 0, host: str = "127.0.0.1", socket_path: str | None = None):
+        app = web.Application()
+        app.router.add_post("/command", self.handle_command)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        if socket_path:
+            await web.UnixSite(self.runner, socket_path).start()
+            self.socket_path = socket_path
+        else:
+            site = web.TCPSite(self.runner, host, port)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+
+    def endpoint(self) -> dict:
+        """The /identify fields that point the bot at this receiver."""
+        return {"listen_socket": self.socket_path} if self.socket_path else {"listen_port": self.port}
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+async def push_commands(guild_id: int, count: int, concurrency: int, recorder: Recorder):
+    """Delivers `count` punish commands through the instance registry, as _execute_punish does."""
+    from modules.minecraft import instances
+
+    pending = list(range(count))
+
+    async def pusher():
+        while pending:
+            n = pending.pop()
+            started = time.perf_counter()
+            results = await instances.deliver(guild_id, f"punish player{HEAVY_USER + n} 1 1")
+            ok = bool(results) and all(status.startswith("✅") for status in results.values())
+            recorder.record("push /command", 200 if ok else "failed", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(pusher() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+# ── Runs ─────────────────────────────────────────────────────────────────────
+
+def start_local_api(size: int, throttle: bool, transport: str) -> tuple:
+    from modules import minecraft
+
+    guild_id = 910_000 + size
+    dataset = generate_guild(guild_id, size)
+    minecraft.save_mc_rules(guild_id, RULES)
+    token = minecraft.issue_api_token(guild_id)
+    if not throttle:
+        minecraft._buckets[guild_id] = minecraft.TokenBucket(1e9, 1e9)
+    if transport == "unix":
+        minecraft.INSTANCE_SOCKET_DIR = os.getcwd()  # where the fake WMMC's socket goes
+        server = minecraft.UnixHTTPServer(os.path.abspath("api.sock"), minecraft.PermanentAPIHandler)
+        url = f"unix:{server.server_address}"
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), minecraft.PermanentAPIHandler)
+        server.daemon_threads = True
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, url, guild_id, token, dataset
+
+
+def open_client(url: str, concurrency: int) -> tuple:
+    """Returns (connector, base URL); "unix:<path>" URLs go over a Unix domain socket."""
+    if url.startswith("unix:"):
+        return aiohttp.UnixConnector(path=url[5:], limit=concurrency), "http://localhost"
+    return aiohttp.TCPConnector(limit=concurrency), url.rstrip("/")
+
+
+async def run_load(args) -> dict:
+    server, dataset = None, None
+    if args.url:
+        url, guild_id, token = args.url, args.guild, args.token
+    else:
+        server, url, guild_id, token, dataset = start_local_api(parse_size(args.size), args.throttle, args.transport)
+    players = dataset["users"] if dataset else args.players
+
+    receiver = None
+    if args.pushes and not args.url:
+        receiver = FakeWMMC(args.receiver_latency_ms / 1000, args.receiver_fail_rate)
+        await receiver.start(socket_path=os.path.abspath("wmmc.sock") if args.transport == "unix" else None)
+
+    headers = {"Content-Type": "application/json", **({"Authorization": f"Bearer {token}"} if token else {})}
+    mix = parse_mix(args.mix)
+    recorder = Recorder()
+    connector, base_url = open_client(url, args.concurrency)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+            if receiver:
+                # Register the fake WMMC first, so pushes have somewhere to go
+                await session.post(base_url + "/identify", headers=headers, data=json.dumps({
+                    "discord_server_id": str(guild_id), "wmmc_version": "load", "instance_id": "load",
+                    **receiver.endpoint()}).encode())
+            if server:
+                await check_history_after_log(session, base_url, headers, guild_id)
+            before = await scrape_storage(session, base_url)
+            deadline = time.perf_counter() + args.duration
+            budget = [args.requests or float("inf")]
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                worker(session, base_url, headers, Traffic(guild_id, players, receiver, args.seed + i),
+                       mix, recorder, deadline, budget)
+                for i in range(args.concurrency)))
+            wall = time.perf_counter() - started
+            after = await scrape_storage(session, base_url)
+
+        push_wall = None
+        if receiver:
+            push_wall = await push_commands(guild_id, args.pushes, args.push_concurrency, recorder)
+    finally:
+        if receiver:
+            await receiver.stop()
+        if server:
+            server.shutdown()
+            server.server_close()
+
+    written = after.get("wm_storage_write_bytes_total", 0) - before.get("wm_storage_write_bytes_total", 0)
+    total = sum(len(s) for e, s in recorder.latencies.items() if e != "push /command")
+    report = {
+        "target": args.url or f"in-process ({args.transport})", "guild_id": guild_id, "dataset": dataset,
+        "concurrency": args.concurrency, "mix": mix, "wall_seconds": wall,
+        "requests": total, "rps": total / wall if wall else 0.0,
+        "endpoints": recorder.summary(wall),
+        "storage": {
+            "reads": after.get("wm_storage_reads_total", 0) - before.get("wm_storage_reads_total", 0),
+            "writes": after.get("wm_storage_writes_total", 0) - before.get("wm_storage_writes_total", 0),
+            "read_bytes": after.get("wm_storage_read_bytes_total", 0) - before.get("wm_storage_read_bytes_total", 0),
+            "write_bytes": written,
+            "request_body_bytes": recorder.body_bytes,
+            "write_amplification": written / recorder.body_bytes if recorder.body_bytes else None,
+        },
+    }
+    if receiver:
+        report["pushes"] = {"sent": args.pushes, "received": len(receiver.received), "failed": receiver.failed,
+                            "wall_seconds": push_wall,
+                            "rate": args.pushes / push_wall if push_wall else 0.0}
+        report["endpoints"]["push /command"] = recorder.summary(push_wall or 1)["push /command"]
+    return report
+
+
+def print_report(report: dict):
+    print(f"\n{report['target']}: {report['requests']:,} requests in {report['wall_seconds']:.2f}s "
+          f"at concurrency {report['concurrency']} → {report['rps']:,.0f} req/s")
+    print(f"\n  {'endpoint':<16} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    for endpoint, s in report["endpoints"].items():
+        print(f"  {endpoint:<16} {s['requests']:>9,} {s['rps']:>8,.0f} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+              f"{s['p99_ms']:>9.2f} {s['error_rate']:>7.1%}")
+        bad = {k: v for k, v in s["statuses"].items() if k != "200"}
+        if bad:
+            print(f"  {'':<16} statuses: {bad}")
+    st = report["storage"]
+    amp = f"{st['write_amplification']:,.1f}×" if st["write_amplification"] is not None else "n/a"
+    print(f"\n  storage: {st['reads']:,.0f} reads ({st['read_bytes'] / 1e6:,.1f} MB), {st['writes']:,.0f} writes "
+          f"({st['write_bytes'] / 1e6:,.1f} MB) for {st['request_body_bytes'] / 1e3:,.1f} kB of request bodies "
+          f"→ write amplification {amp}")
+    if "pushes" in report:
+        p = report["pushes"]
+        print(f"  pushes: {p['received']:,}/{p['sent']:,} received by the fake WMMC ({p['failed']} injected failures) "
+              f"at {p['rate']:,.0f}/s")
+
+
+async def run_receiver(args):
+    receiver = FakeWMMC(args.latency_ms / 1000, args.fail_rate)
+    await receiver.start(args.port, args.host, args.socket)
+    where = f"unix:{args.socket}" if args.socket else f"http://{args.host}:{receiver.port}"
+    print(f"Fake WMMC listening on {where}/command (Ctrl+C to stop)")
+    started, last = time.perf_counter(), 0
+    try:
+        while True:
+            await asyncio.sleep(5)
+            if len(receiver.received) != last:
+                last = len(receiver.received)
+                print(f"  {last:,} commands received, {receiver.failed} failed "
+                      f"({last / (time.perf_counter() - started):,.1f}/s); last: {receiver.received[-1]}")
+    finally:
+        await receiver.stop()
+
+
+def main():
+    if sys.argv[1:2] == ["receiver"]:
+        parser = argparse.ArgumentParser(prog="benchmarks.wmmc_load receiver", description="Fake WMMC /command receiver")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=25580)
+        parser.add_argument("--latency-ms", type=float, default=0.0)
+        parser.add_argument("--fail-rate", type=float, default=0.0)
+        parser.add_argument("--socket", help="listen on this Unix socket instead (register it as listen_socket)")
+        try:
+            asyncio.run(run_receiver(parser.parse_args(sys.argv[2:])))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="load a running bot's API (http://host:port or unix:/path) instead of an in-process one")
+    parser.add_argument("--transport", choices=("tcp", "unix"), default="tcp", help="in-process API and fake WMMC transport")
+    parser.add_argument("--guild", type=int, help="guild id to use with --url")
+    parser.add_argument("--token", help="API token for --guild (from /minecraft setup)")
+    parser.add_argument("--players", type=int, default=1000, help="player population to draw from with --url")
+    parser.add_argument("--size", default="100k", help="records per store in the synthetic guild (in-process only)")
+    parser.add_argument("--throttle", action="store_true", help="keep the per-guild token bucket (in-process only)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests instead")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--pushes", type=int, default=0, help="/command pushes to the fake WMMC after the load phase")
+    parser.add_argument("--push-concurrency", type=int, default=8)
+    parser.add_argument("--receiver-latency-ms", type=float, default=0.0)
+    parser.add_argument("--receiver-fail-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args()
+    if args.url and not args.guild:
+        parser.error("--url needs --guild")
+
+    workdir, cwd = None, os.getcwd()
+    if not args.url:
+        workdir = tempfile.mkdtemp(prefix="wm-load-")
+        os.chdir(workdir)
+    try:
+        report = asyncio.run(run_load(args))
+    finally:
+        os.chdir(cwd)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
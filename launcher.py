@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import urllib.request
+from dotenv import load_dotenv
+from module_utils import split_shards
+
+# Multi-process launcher: splits the bot's shards into contiguous ranges and runs one
+# main.py process per range, restarting any that crash.
+#   python launcher.py [processes] [shard_count]
+# Defaults: one process per CPU core, and Discord's recommended shard count.
+
+load_dotenv()
+
+RESTART_BACKOFF_MAX = 60
+STABLE_AFTER = 300  # a process that ran this long gets its restart backoff reset
+
+def recommended_shards(token: str) -> int:
+    req = urllib.request.Request("https://discord.com/api/v10/gateway/bot",
+                                 headers={"Authorization": f"Bot {token}", "User-Agent": "WeirdoesModerator launcher"})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.load(resp)["shards"]
+
+def spawn(index: int, shard_range: tuple, shard_count: int, process_count: int) -> subprocess.Popen:
+    env = dict(os.environ, SHARDING="auto", SHARD_COUNT=str(shard_count), SHARD_IDS=f"{shard_range[0]}-{shard_range[1]}",
+               SHARD_PROCESS_INDEX=str(index), SHARD_PROCESS_COUNT=str(process_count))
+    print(f"[launcher] process {index}: shards {shard_range[0]}-{shard_range[1]} of {shard_count}")
+    return subprocess.Popen([sys.executable, "main.py"], env=env)
+
+def main():
+    token = os.getenv("TOKEN")
+    if not token:
+        sys.exit("No TOKEN found in .env file!")
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    shard_count = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.getenv("SHARD_COUNT") or recommended_shards(token))
+
+    # Run the one-off record migration here so shard processes never race on it
+    from modules.core import migrate_all_servers
+    migrated = migrate_all_servers()
+    if migrated: print(f"[launcher] Migrated {migrated} infraction records")
+
+    ranges = split_shards(shard_count, processes)
+    children = {i: spawn(i, r, shard_count, len(ranges)) for i, r in enumerate(ranges)}
+    backoff = {i: 1 for i in children}
+    started = {i: time.monotonic() for i in children}
+    restart_at = {}  # index -> monotonic time its replacement is due
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children.values():
+            child.terminate()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Restarts wait out their backoff here rather than in a sleep, so the other children stay
+    # watched and a signal during the backoff cancels the restart
+    while not stopping:
+        time.sleep(1)
+        for i, child in list(children.items()):
+            if stopping:
+                break
+            if i in restart_at:
+                if time.monotonic() >= restart_at[i]:
+                    del restart_at[i]
+                    children[i] = spawn(i, ranges[i], shard_count, len(ranges))
+                    started[i] = time.monotonic()
+                    if stopping: children[i].terminate()  # the signal landed mid-spawn
+                continue
+            code = child.poll()
+            if code is None:
+                continue
+            if time.monotonic() - started[i] > STABLE_AFTER:
+                backoff[i] = 1
+            print(f"[launcher] process {i} exited with {code}, restarting in {backoff[i]}s")
+            restart_at[i] = time.monotonic() + backoff[i]
+            backoff[i] = min(backoff[i] * 2, RESTART_BACKOFF_MAX)
+
+    for child in children.values():
+        try: child.wait(timeout=30)
+        except subprocess.TimeoutExpired: child.kill()
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import os
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
+from module_utils import get_bot_profile
 
 # Load environment variables
 load_dotenv()
@@ -12,7 +13,30 @@ intents.message_content = True
 intents.members = True
 intents.guilds = True
 
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+# The members intent stays on in both profiles: member events and query_members need it.
+# message_content also stays on, because the "!" prefix commands can't be parsed without it.
+if get_bot_profile() == "lean":
+    bot_options = {"member_cache_flags": discord.MemberCacheFlags.none(), "chunk_guilds_at_startup": False, "max_messages": 100}
+else:
+    bot_options = {}
+
+def parse_shard_ids(value: str):
+    """"0-3" or "0,2,5" -> list of shard ids; empty -> None (let discord.py pick)."""
+    if not value: return None
+    ids = []
+    for part in value.split(","):
+        lo, _, hi = part.strip().partition("-")
+        ids.extend(range(int(lo), int(hi or lo) + 1))
+    return ids
+
+# SHARDING=auto opts into AutoShardedBot. launcher.py sets SHARD_COUNT/SHARD_IDS per process;
+# on its own, an AutoShardedBot runs every shard Discord recommends in this process.
+if os.getenv("SHARDING", "off").lower() == "auto":
+    shard_count = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, help_command=None,
+                                  shard_count=shard_count, shard_ids=parse_shard_ids(os.getenv("SHARD_IDS", "")), **bot_options)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, help_command=None, **bot_options)
 
 async def setup():
     # Explicitly load the Core module
@@ -1,34 +1,472 @@
 import os
 import json
+import time
+import asyncio
+import inspect
+import secrets
+import tempfile
+import threading
 import discord
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+try:
+    import fcntl  # POSIX only: cross-process store locks when the launcher runs several processes
+except ImportError:
+    fcntl = None
+
+# ===== Metrics =====
+# Process-wide latency histograms and counters. Core feeds commands, listeners and Discord
+# API calls into it; storage and Groq calls are counted where they happen. Rendered by
+# `!stats perf` and the WMMC API's /metrics endpoint (Prometheus text format).
+
+# Most listeners and commands finish well under a millisecond, hence the 50µs-500µs buckets
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_FAMILIES = {  # histogram family -> label name
+    "command": "command",
+    "listener": "listener",
+    "groq": "model",
+    "discord_api": "route",
+    "loop_lag": "handler",
+}
+COUNTER_LABELS = {  # counter name -> label name (default "file", for the storage counters)
+    "command_errors_total": "command",
+}
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        i = 0
+        while i < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile by interpolating inside the bucket it falls in."""
+        if not self.count: return 0.0
+        rank, seen, lower = q * self.count, 0, 0.0
+        for i, n in enumerate(self.counts):
+            upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            if n and seen + n >= rank:
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = upper
+        return LATENCY_BUCKETS[-1]
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # (family, label) -> Histogram
+        self.counters = {}    # (name, label) -> number
+        self._collectors = []
+
+    def observe(self, family: str, label: str, seconds: float):
+        with self._lock:
+            h = self.histograms.get((family, label))
+            if h is None: h = self.histograms[(family, label)] = Histogram()
+            h.observe(seconds)
+
+    def inc(self, name: str, label: str, value: float = 1):
+        with self._lock:
+            self.counters[(name, label)] = self.counters.get((name, label), 0) + value
+
+    @contextmanager
+    def timer(self, family: str, label: str):
+        start = time.perf_counter()
+        try: yield
+        finally: self.observe(family, label, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def add_collector(self, collect):
+        """collect() -> [(metric_name, {label: value}, number)], read at render time."""
+        if collect not in self._collectors: self._collectors.append(collect)
+
+    def remove_collector(self, collect):
+        if collect in self._collectors: self._collectors.remove(collect)
+
+    def family(self, family: str) -> dict:
+        with self._lock:
+            return {label: h for (f, label), h in self.histograms.items() if f == family}
+
+    def counter_totals(self, name: str) -> dict:
+        with self._lock:
+            return {label: v for (n, label), v in self.counters.items() if n == name}
+
+    def render_prometheus(self) -> str:
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for family, label_name in METRIC_FAMILIES.items():
+            rows = [(label, h) for (f, label), h in histograms if f == family]
+            if not rows: continue
+            name = f"wm_{family}_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for label, h in rows:
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), h.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{label_name}="{esc(label)}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label_name}="{esc(label)}"}} {h.sum:.6f}')
+                lines.append(f'{name}_count{{{label_name}="{esc(label)}"}} {h.count}')
+        typed = set()
+        for (name, label), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE wm_{name} counter")
+                typed.add(name)
+            lines.append(f'wm_{name}{{{COUNTER_LABELS.get(name, "file")}="{esc(label)}"}} {value}')
+        for collect in list(self._collectors):
+            for name, labels, value in collect():
+                if name not in typed:
+                    lines.append(f"# TYPE wm_{name} gauge" if not name.endswith("_total") else f"# TYPE wm_{name} counter")
+                    typed.add(name)
+                rendered = ",".join(f'{k}="{esc(v)}"' for k, v in labels.items())
+                lines.append(f"wm_{name}{{{rendered}}} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
 
 def get_server_dir(guild_id: int) -> str:
     path = os.path.join(".", "servers", str(guild_id))
     os.makedirs(path, exist_ok=True)
     return path
 
+def has_server_dir(guild_id: int) -> bool:
+    """True if the bot has stored anything for the guild; unlike get_server_dir, creates nothing."""
+    return os.path.isdir(os.path.join(".", "servers", str(guild_id)))
+
 def load_server_data(guild_id: int, filename: str):
-    path = os.path.join(get_server_dir(guild_id), filename)
+    return _read_json(os.path.join(get_server_dir(guild_id), filename), filename)
+
+def _read_json(path: str, filename: str):
     if os.path.exists(path):
         try:
             with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
+                raw = f.read()
+            metrics.inc("storage_reads_total", filename)
+            metrics.inc("storage_read_bytes_total", filename, len(raw))
+            return json.loads(raw)
         except:
             pass
     return None
 
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+def _write_json_atomic(path: str, data):
+    # Write to a temp file and swap it in, so readers in other threads or shard processes
+    # never see a half-written file (load_*_data would read that as "no data")
+    raw = json.dumps(data, indent=4)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        # mkstemp creates 0600; keep the file's existing mode, or what open() would have given it
+        try: mode = os.stat(path).st_mode & 0o777
+        except OSError: mode = 0o666 & ~_UMASK
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(raw)
+        os.replace(tmp, path)
+        filename = os.path.basename(path)
+        metrics.inc("storage_writes_total", filename)
+        metrics.inc("storage_write_bytes_total", filename, len(raw))
+    except BaseException:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+
 def save_server_data(guild_id: int, filename: str, data):
-    path = os.path.join(get_server_dir(guild_id), filename)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    _write_json_atomic(os.path.join(get_server_dir(guild_id), filename), data)
+
+class StoreLock:
+    """
+    A re-entrant lock for one store. With several launcher processes the outermost holder
+    also takes an flock on servers/<id>/.<filename>.lock, since process 0 (the WMMC API)
+    and the guild's shard process both rewrite the same files.
+    """
+
+    def __init__(self, guild_id: int, filename: str):
+        self._lock = threading.RLock()
+        self._path = os.path.join(".", "servers", str(guild_id), f".{filename}.lock")
+        self._depth = 0  # only touched by the thread holding _lock
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl and get_process_count() > 1:
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o666)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None: os.close(self._fd)
+                self._fd = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            os.close(self._fd)  # closing drops the flock
+            self._fd = None
+        self._lock.release()
+
+_data_locks = {}  # (guild_id, filename) -> StoreLock
+_data_locks_guard = threading.Lock()
+
+def server_data_lock(guild_id: int, filename: str) -> StoreLock:
+    """
+    Held around a load-modify-save of one store. The event loop, the WMMC API's handler
+    threads, the storage workers and (under the launcher) other processes all append to the
+    same files, and without it the slower writer silently drops the other's records.
+    Re-entrant, so helpers can nest.
+    """
+    key = (guild_id, filename)
+    lock = _data_locks.get(key)
+    if lock is None:
+        with _data_locks_guard:
+            lock = _data_locks.setdefault(key, StoreLock(guild_id, filename))
+    return lock
+
+def get_server_data_mtime(guild_id: int, filename: str):
+    try:
+        return os.stat(os.path.join(get_server_dir(guild_id), filename)).st_mtime_ns
+    except OSError:
+        return None
+
+def get_bot_dir() -> str:
+    path = os.path.join(".", "data")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def load_bot_data(filename: str):
+    return _read_json(os.path.join(get_bot_dir(), filename), filename)
+
+def save_bot_data(filename: str, data):
+    _write_json_atomic(os.path.join(get_bot_dir(), filename), data)
+
+# ===== Gateway profile =====
+# BOT_PROFILE=lean keeps no member cache and never chunks guilds; members are fetched or
+# queried on demand instead. "full" (default) caches every member, as before.
+BOT_PROFILES = ("full", "lean")
+
+def get_bot_profile() -> str:
+    profile = os.getenv("BOT_PROFILE", "full").lower()
+    return profile if profile in BOT_PROFILES else "full"
+
+def get_process_memory() -> dict:
+    """Current and peak resident memory of this process in bytes (current is Linux only, else None)."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        current = None
+    return {"rss": current, "peak_rss": peak}
+
+# ===== Sharding =====
+# launcher.py runs one bot process per shard range; process 0 owns the process-wide
+# singletons (slash command sync, the WMMC API ports). A plain `python main.py` is process 0.
+
+def get_process_index() -> int:
+    return int(os.getenv("SHARD_PROCESS_INDEX", "0"))
+
+def is_primary_process() -> bool:
+    return get_process_index() == 0
+
+def get_process_count() -> int:
+    return int(os.getenv("SHARD_PROCESS_COUNT", "1"))
+
+def is_secondary_process() -> bool:
+    """True in a launcher process other than 0, which hands process-wide work to process 0."""
+    return get_process_count() > 1 and not is_primary_process()
+
+def split_shards(shard_count: int, processes: int) -> list:
+    """Contiguous [lo, hi] shard ranges, as even as possible, one per process."""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges, lo = [], 0
+    for i in range(processes):
+        hi = lo + base + (1 if i < extra else 0) - 1
+        ranges.append((lo, hi))
+        lo = hi + 1
+    return ranges
+
+def get_guild_process(guild_id: int) -> int:
+    """Index of the process whose shards hold the guild (this one when not split across processes)."""
+    shard_count = int(os.getenv("SHARD_COUNT") or 0)
+    if get_process_count() <= 1 or not shard_count:
+        return get_process_index()
+    shard_id = (guild_id >> 22) % shard_count
+    for index, (lo, hi) in enumerate(split_shards(shard_count, get_process_count())):
+        if lo <= shard_id <= hi:
+            return index
+    return 0
+
+# ===== Cross-process channel =====
+# Shard processes hand each other small JSON messages through spool files under
+# ./data/ipc/<target process>/. Every sender appends to its own segment files and the target
+# reads them in order from ProcessChannel.run, deleting segments it has finished. A process
+# that starts up skips whatever was queued for it while it was down, like the in-memory
+# state those messages feed.
+IPC_POLL_INTERVAL = 0.25
+IPC_SEGMENT_BYTES = 1024 * 1024
+
+class ProcessChannel:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = {}   # kind -> handler(message), returning a JSON-able result or an awaitable
+        self._outgoing = {}   # target process -> [segment path, bytes written]
+        self._offsets = {}    # inbound segment path -> bytes consumed
+        self._calls = {}      # call id -> future waiting for the reply
+        self._task = None
+
+    def on(self, kind: str, handler):
+        self._handlers[kind] = handler
+
+    @staticmethod
+    def _inbox(index: int) -> str:
+        path = os.path.join(get_bot_dir(), "ipc", str(index))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def send(self, target: int, kind: str, **payload):
+        """Queues a message for another process. Thread-safe; never waits for the target."""
+        line = (json.dumps({"kind": kind, "from": get_process_index(), **payload}, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            segment = self._outgoing.get(target)
+            if segment is None or segment[1] >= IPC_SEGMENT_BYTES:
+                name = f"{get_process_index()}-{time.time_ns():020d}.jsonl"
+                segment = self._outgoing[target] = [os.path.join(self._inbox(target), name), 0]
+            with open(segment[0], "ab") as f:
+                f.write(line)
+            segment[1] += len(line)
+
+    async def call(self, target: int, kind: str, timeout: float = 5.0, **payload):
+        """Sends a message and returns the target handler's result. Raises asyncio.TimeoutError."""
+        call_id = secrets.token_hex(8)
+        future = self._calls[call_id] = asyncio.get_running_loop().create_future()
+        try:
+            self.send(target, kind, call_id=call_id, **payload)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._calls.pop(call_id, None)
+
+    def _segments(self) -> list:
+        """This process's inbound segments, grouped per sender, oldest first."""
+        inbox = self._inbox(get_process_index())
+        by_sender = {}
+        for name in sorted(os.listdir(inbox)):
+            if name.endswith(".jsonl"):
+                by_sender.setdefault(name.split("-", 1)[0], []).append(os.path.join(inbox, name))
+        return list(by_sender.values())
+
+    def _skip_backlog(self):
+        for paths in self._segments():
+            for path in paths[:-1]:
+                try: os.unlink(path)
+                except OSError: pass
+            try: self._offsets[paths[-1]] = os.path.getsize(paths[-1])
+            except OSError: pass
+
+    def _read(self) -> list:
+        messages = []
+        for paths in self._segments():
+            for i, path in enumerate(paths):
+                offset = self._offsets.get(path, 0)
+                try:
+                    with open(path, "rb") as f:
+                        f.seek(offset)
+                        data = f.read()
+                except OSError:
+                    continue
+                end = data.rfind(b"\n") + 1  # a line still being written is picked up next round
+                for line in data[:end].splitlines():
+                    try: messages.append(json.loads(line))
+                    except ValueError: pass
+                self._offsets[path] = offset + end
+                if i < len(paths) - 1 and end == len(data):
+                    # The sender has moved on to a newer segment, so nothing more arrives here
+                    try: os.unlink(path)
+                    except OSError: pass
+                    self._offsets.pop(path, None)
+        return messages
+
+    async def _dispatch(self, message: dict):
+        kind = message.get("kind")
+        if kind == "reply":
+            future = self._calls.get(message.get("call_id"))
+            if future and not future.done(): future.set_result(message.get("result"))
+            return
+        handler = self._handlers.get(kind)
+        if handler is None:
+            return
+        try:
+            result = handler(message)
+            if inspect.isawaitable(result): result = await result
+        except Exception as e:
+            print(f"[IPC] Handler for '{kind}' failed: {e}")
+            result = None
+        if message.get("call_id"):
+            self.send(message["from"], "reply", call_id=message["call_id"], result=result)
+
+    async def run(self):
+        self._skip_backlog()
+        while True:
+            try:
+                for message in self._read():
+                    # Tasks start in order, so synchronous handlers see messages in send order
+                    asyncio.ensure_future(self._dispatch(message))
+            except OSError as e:
+                print(f"[IPC] Could not read the inbox: {e}")
+            await asyncio.sleep(IPC_POLL_INTERVAL)
+
+    def start(self):
+        """Starts polling this process's inbox on the running loop; a no-op in a single process."""
+        if get_process_count() > 1 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+process_channel = ProcessChannel()
+
+# Bulk storage work (exports, imports, rebuilds) runs here instead of on the event loop.
+# One worker per process by default, so those jobs never interleave their writes.
+_storage_executor = ThreadPoolExecutor(max_workers=int(os.getenv("STORAGE_WORKERS", "1")), thread_name_prefix="storage")
+
+async def run_storage(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_storage_executor, func, *args)
+
+_enabled_cache = {}  # guild_id -> (modules.json mtime, set of enabled module names)
 
 def is_module_enabled(guild_id: int, module_name: str) -> bool:
     if module_name.lower() == "core":
         return True
-    data = load_server_data(guild_id, "modules.json") or {}
-    enabled = data.get("enabled", [])
-    return module_name.lower() in [m.lower() for m in enabled]
+    # Checked on every message by on_message listeners, so parse modules.json only when it changes
+    mtime = get_server_data_mtime(guild_id, "modules.json")
+    cached = _enabled_cache.get(guild_id)
+    if not cached or cached[0] != mtime:
+        data = load_server_data(guild_id, "modules.json") or {}
+        cached = _enabled_cache[guild_id] = (mtime, {m.lower() for m in data.get("enabled", [])})
+    return module_name.lower() in cached[1]
 
 def enable_server_module(guild_id: int, module_name: str):
     data = load_server_data(guild_id, "modules.json") or {"enabled": []}
@@ -1,13 +1,28 @@
 import os
+import asyncio
 import inspect
 import importlib
 import discord
 from discord.ext import commands
 from discord import app_commands
-from module_utils import Module, get_server_dir, load_server_data, save_server_data, is_module_enabled, enable_server_module, disable_server_module
+from module_utils import Module, get_server_dir, load_server_data, save_server_data, get_server_data_mtime, server_data_lock, load_bot_data, save_bot_data, is_module_enabled, enable_server_module, disable_server_module, is_primary_process, run_storage, get_bot_profile, get_process_memory, metrics
 from datetime import datetime, timedelta, timezone
+import bisect
+import csv
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import secrets
+import tempfile
+import threading
+import time
 import uuid
 import re
+import sys
+import traceback
+from collections import deque
 
 def get_moderator_roles(guild_id: int):
     data = load_server_data(guild_id, "info.json") or {}
@@ -20,7 +35,7 @@ def get_moderator_roles(guild_id: int):
 def is_moderator(member: discord.Member, min_level: int = 1) -> bool:
     if not member or not member.guild:
         return False
-    if member == member.guild.owner:
+    if member.id == member.guild.owner_id:
         return True
     if member.guild_permissions.administrator:
         return True
@@ -50,6 +65,29 @@ async def send_response(ctx_or_int, content=None, embed=None, view=None, ephemer
     else:
         await ctx_or_int.send(**kwargs)
 
+async def resolve_member(guild: discord.Guild, text: str):
+    """Finds a member from a mention, ID, name or nickname.
+
+    Tries the member cache first and falls back to the API/gateway, so it also works
+    with the lean profile where nothing is cached.
+    """
+    text = str(text).strip()
+    digits = text.strip("<@!>")
+    if digits.isdigit():
+        member = guild.get_member(int(digits))
+        if member: return member
+        try: return await guild.fetch_member(int(digits))
+        except discord.HTTPException: return None
+    member = guild.get_member_named(text)
+    if member: return member
+    try: candidates = await guild.query_members(query=text.split("#")[0], limit=10)
+    except (discord.ClientException, asyncio.TimeoutError): return None
+    lower = text.lower()
+    for m in candidates:
+        if m.name.lower() == lower or (m.nick and m.nick.lower() == lower) or m.display_name.lower() == lower:
+            return m
+    return None
+
 def get_author(ctx_or_int):
     if isinstance(ctx_or_int, discord.Interaction): return ctx_or_int.user
     return getattr(ctx_or_int, 'author', None)
@@ -68,37 +106,767 @@ def parse_duration(duration_str: str) -> Optional[int]:
     elif unit == 'd': return value * 86400
     return None
 
+# ===== Infraction record schema =====
+# Every warning, mute and MC infraction carries "ts" (integer epoch seconds, used for sorting,
+# merging and filtering) next to "timestamp" (ISO-8601, kept for display and compatibility).
+RECORD_FILES = ("warnings.json", "mutes.json", "mc_infractions.json")
+RECORD_SCHEMA_VERSION = 1
+
+def record_timestamps(when: datetime = None) -> dict:
+    when = when or datetime.now(timezone.utc)
+    return {"timestamp": when.isoformat(), "ts": int(when.timestamp())}
+
+def epoch_from_any(value) -> int:
+    """Converts an ISO string or a numeric epoch (seconds or milliseconds) to epoch seconds."""
+    if isinstance(value, str):
+        try: return int(datetime.fromisoformat(value).timestamp())
+        except ValueError:
+            try: value = float(value)
+            except ValueError: return 0
+    if not value: return 0
+    value = float(value)
+    if value > 1e11: value /= 1000  # milliseconds (e.g. Java's currentTimeMillis)
+    return int(value)
+
+def record_ts(record) -> int:
+    ts = record.get("ts")
+    if isinstance(ts, int): return ts
+    return epoch_from_any(record.get("timestamp"))
+
+def normalize_record(record: dict) -> bool:
+    """Brings a record up to the canonical schema in place. Returns True if it changed."""
+    if isinstance(record.get("ts"), int) and isinstance(record.get("timestamp"), str):
+        return False
+    ts = epoch_from_any(record.get("timestamp"))
+    record["ts"] = ts
+    record["timestamp"] = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+    return True
+
+def migrate_infraction_records(guild_id: int) -> int:
+    """Normalizes and time-orders a guild's infraction files. Returns the number of records rewritten."""
+    changed = 0
+    for filename in RECORD_FILES:
+        records = load_server_data(guild_id, filename)
+        if not isinstance(records, list): continue
+        file_changed = sum(normalize_record(r) for r in records)
+        if any(records[i]["ts"] > records[i + 1]["ts"] for i in range(len(records) - 1)):
+            records.sort(key=lambda r: r["ts"])  # stable, keeps insertion order for ties
+            file_changed = file_changed or 1
+        if file_changed:
+            save_server_data(guild_id, filename, records)
+            changed += file_changed
+    return changed
+
+def migrate_all_servers() -> int:
+    state = load_bot_data("schema.json") or {}
+    if state.get("records", 0) >= RECORD_SCHEMA_VERSION: return 0
+    servers_dir = os.path.join(".", "servers")
+    changed = 0
+    if os.path.isdir(servers_dir):
+        for name in os.listdir(servers_dir):
+            if name.isdigit(): changed += migrate_infraction_records(int(name))
+    state["records"] = RECORD_SCHEMA_VERSION
+    save_bot_data("schema.json", state)
+    return changed
+
+# ===== Per-user warning counters =====
+# warn_counters.json is a materialized view of warnings.json + mutes.json so the warn
+# hot path never has to scan the full log. It can always be rebuilt from the raw files.
+# Every writer holds server_data_lock(guild_id, "warn_counters.json") from load to save,
+# taken after the warnings.json lock where both are needed.
+RECENT_WARNINGS_KEPT = 50
+_counter_cache = {}  # guild_id -> (mtime_ns, counters)
+
+def _user_counter(counters: dict, user_id) -> dict:
+    return counters["users"].setdefault(str(user_id), {"warnings": 0, "mutes": 0, "muted_until": 0, "last_infraction": 0, "recent": []})
+
+def _counters_for_update(guild_id: int) -> dict:
+    """Re-loads the counters for a writer holding the lock; the copy keeps the cached dict intact for readers."""
+    counters = load_warning_counters(guild_id)
+    return {**counters, "users": dict(counters["users"])}
+
+def _edit_user_counter(counters: dict, user_id) -> dict:
+    """The user's entry from _counters_for_update, replaced by a copy that is safe to change."""
+    c = dict(_user_counter(counters, user_id))
+    c["recent"] = list(c["recent"])
+    counters["users"][str(user_id)] = c
+    return c
+
+def rebuild_warning_counters(guild_id: int) -> dict:
+    with server_data_lock(guild_id, "warn_counters.json"):
+        counters = {"users": {}}
+        for w in load_server_data(guild_id, "warnings.json") or []:
+            c = _user_counter(counters, w["userId"])
+            ts = record_ts(w)
+            c["warnings"] += 1
+            c["last_infraction"] = max(c["last_infraction"], ts)
+            c["recent"].append(ts)
+        for m in load_server_data(guild_id, "mutes.json") or []:
+            c = _user_counter(counters, m["userId"])
+            ts = record_ts(m)
+            c["mutes"] += 1
+            c["last_infraction"] = max(c["last_infraction"], ts)
+            if not m.get("endedAt"): c["muted_until"] = max(c["muted_until"], ts + m.get("durationSec", 0))
+        now = int(datetime.now(timezone.utc).timestamp())
+        for c in counters["users"].values():
+            c["recent"] = sorted(c["recent"])[-RECENT_WARNINGS_KEPT:]
+            if c["muted_until"] <= now: c["muted_until"] = 0
+        save_warning_counters(guild_id, counters)
+        return counters
+
+def load_warning_counters(guild_id: int) -> dict:
+    mtime = get_server_data_mtime(guild_id, "warn_counters.json")
+    if mtime is None:
+        return rebuild_warning_counters(guild_id)
+    cached = _counter_cache.get(guild_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    counters = load_server_data(guild_id, "warn_counters.json")
+    if not isinstance(counters, dict) or "users" not in counters:
+        return rebuild_warning_counters(guild_id)
+    _counter_cache[guild_id] = (mtime, counters)
+    return counters
+
+def save_warning_counters(guild_id: int, counters: dict):
+    save_server_data(guild_id, "warn_counters.json", counters)
+    _counter_cache[guild_id] = (get_server_data_mtime(guild_id, "warn_counters.json"), counters)
+
+def get_user_counters(guild_id: int, user_id: int) -> dict:
+    c = load_warning_counters(guild_id)["users"].get(str(user_id))
+    return dict(c) if c else {"warnings": 0, "mutes": 0, "muted_until": 0, "last_infraction": 0, "recent": []}
+
+def remove_warnings_from_counters(guild_id: int, removed: list):
+    with server_data_lock(guild_id, "warn_counters.json"):
+        counters = _counters_for_update(guild_id)
+        for w in removed:
+            if str(w["userId"]) not in counters["users"]: continue
+            c = _edit_user_counter(counters, w["userId"])
+            c["warnings"] = max(0, c["warnings"] - 1)
+            ts = record_ts(w)
+            if ts in c["recent"]: c["recent"].remove(ts)
+        save_warning_counters(guild_id, counters)
+
+def reset_warning_counters(guild_id: int, user_id: int = None):
+    with server_data_lock(guild_id, "warn_counters.json"):
+        counters = _counters_for_update(guild_id)
+        targets = [str(user_id)] if user_id is not None else list(counters["users"])
+        for uid in targets:
+            if uid not in counters["users"]: continue
+            c = _edit_user_counter(counters, uid)
+            c["warnings"] = 0
+            c["recent"] = []
+        save_warning_counters(guild_id, counters)
+
+# ===== Active mute index =====
+class ActiveMuteIndex:
+    """Live Discord mutes per guild, kept in an expiry-ordered heap.
+
+    Built once from mutes.json, then maintained by add_mute, unmutes and expiry. Expired
+    entries are popped whenever the index is read, so readers never see a stale mute and no
+    timer is needed. Every change gets a sequence number so pollers can ask for deltas with
+    a "<epoch>.<seq>" cursor. When another writer (a shard process, a hand edit) changes the
+    file, the difference is logged as deltas under the same epoch; listeners aren't told,
+    since the writing process notified its own. Shared with the WMMC API thread, hence the lock.
+    Listeners are queued under the lock and called after it is released, since they do I/O.
+    """
+
+    LOG_SIZE = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._guilds = {}
+        self._listeners = []
+        self._pending = []
+
+    def add_listener(self, callback):
+        """callback(guild_id, action, user_id, expiry) runs after every mute/unmute/expire."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners: self._listeners.remove(callback)
+
+    @staticmethod
+    def _read_live(guild_id: int) -> dict:
+        now = int(time.time())
+        live = {}
+        for m in load_server_data(guild_id, "mutes.json") or []:
+            expiry = record_ts(m) + m.get("durationSec", 0)
+            if expiry > now and not m.get("endedAt") and expiry > live.get(str(m["userId"]), 0):
+                live[str(m["userId"])] = expiry
+        return live
+
+    def _build(self, guild_id: int) -> dict:
+        live = self._read_live(guild_id)
+        state = {
+            "guild_id": guild_id,
+            "heap": [(expiry, user_id) for user_id, expiry in live.items()],
+            "live": live,
+            "epoch": secrets.token_hex(4),
+            "seq": 0,
+            "log": deque(maxlen=self.LOG_SIZE),
+            "mtime": get_server_data_mtime(guild_id, "mutes.json")
+        }
+        heapq.heapify(state["heap"])
+        self._guilds[guild_id] = state
+        return state
+
+    def _refresh(self, state: dict):
+        """Folds a foreign rewrite of mutes.json into the index as deltas, keeping the epoch."""
+        state["mtime"] = get_server_data_mtime(state["guild_id"], "mutes.json")
+        live = self._read_live(state["guild_id"])
+        for user_id, expiry in live.items():
+            if state["live"].get(user_id) != expiry:
+                heapq.heappush(state["heap"], (expiry, user_id))
+                self._log(state, "mute", user_id, expiry, notify=False)
+        for user_id in [u for u in state["live"] if u not in live]:
+            self._log(state, "unmute", user_id, 0, notify=False)
+        state["live"] = live
+
+    def _state(self, guild_id: int, own_write: bool = False) -> dict:
+        # own_write: the caller just wrote mutes.json itself, so a changed mtime is expected
+        state = self._guilds.get(guild_id)
+        if state is None:
+            state = self._build(guild_id)
+        elif not own_write and state["mtime"] != get_server_data_mtime(guild_id, "mutes.json"):
+            self._refresh(state)
+        if own_write: state["mtime"] = get_server_data_mtime(guild_id, "mutes.json")
+        self._expire(state, int(time.time()))
+        return state
+
+    def _log(self, state: dict, action: str, user_id: str, expiry: int, notify: bool = True):
+        state["seq"] += 1
+        state["log"].append((state["seq"], action, user_id, expiry))
+        if notify and self._listeners:
+            self._pending.append((state["guild_id"], action, user_id, expiry))
+
+    def _take_pending(self) -> list:
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _notify(self, pending: list):
+        # Called without the lock held; listeners write files and publish events
+        for change in pending:
+            for callback in list(self._listeners):
+                try: callback(*change)
+                except Exception as e: print(f"Active mute listener failed: {e}")
+
+    def _expire(self, state: dict, now: int):
+        heap, live = state["heap"], state["live"]
+        while heap and heap[0][0] <= now:
+            expiry, user_id = heapq.heappop(heap)
+            if live.get(user_id) == expiry:
+                del live[user_id]
+                self._log(state, "expire", user_id, expiry)
+
+    def add(self, guild_id: int, user_id: int, expiry: int):
+        with self._lock:
+            state = self._state(guild_id, own_write=True)
+            user_id = str(user_id)
+            if expiry > state["live"].get(user_id, 0):
+                state["live"][user_id] = expiry
+                heapq.heappush(state["heap"], (expiry, user_id))
+                self._log(state, "mute", user_id, expiry)
+            pending = self._take_pending()
+        self._notify(pending)
+
+    def remove(self, guild_id: int, user_id: int):
+        with self._lock:
+            state = self._state(guild_id, own_write=True)
+            if state["live"].pop(str(user_id), None) is not None:
+                self._log(state, "unmute", str(user_id), 0)
+            pending = self._take_pending()
+        self._notify(pending)
+
+    def snapshot(self, guild_id: int):
+        """Returns ({user_id: expiry}, cursor) for every live mute."""
+        with self._lock:
+            state = self._state(guild_id)
+            result = dict(state["live"]), f"{state['epoch']}.{state['seq']}"
+            pending = self._take_pending()
+        self._notify(pending)
+        return result
+
+    def changes_since(self, guild_id: int, cursor: str):
+        """Returns ([(action, user_id, expiry)], cursor), or (None, cursor) when a full snapshot is needed."""
+        with self._lock:
+            state = self._state(guild_id)
+            current = f"{state['epoch']}.{state['seq']}"
+            epoch, _, seq = (cursor or "").partition(".")
+            if epoch != state["epoch"] or not seq.isdigit() or int(seq) > state["seq"]:
+                result = None, current
+            elif int(seq) < state["seq"] and (not state["log"] or state["log"][0][0] > int(seq) + 1):
+                result = None, current  # fell out of the change log
+            else:
+                result = [(a, u, e) for s, a, u, e in state["log"] if s > int(seq)], current
+            pending = self._take_pending()
+        self._notify(pending)
+        return result
+
+active_mutes = ActiveMuteIndex()
+
 def add_warning(guild_id: int, user_id: int, mod_id: int, reason: str):
-    warns = load_server_data(guild_id, "warnings.json") or []
-    new_warn = {
-        "id": str(uuid.uuid4()),
-        "userId": str(user_id),
-        "reason": reason,
-        "moderatorId": str(mod_id),
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    }
-    warns.append(new_warn)
-    save_server_data(guild_id, "warnings.json", warns)
-    return len([w for w in warns if w["userId"] == str(user_id)])
+    """Appends a warning and bumps the user's counters. Blocks on the store locks, so call it via run_storage."""
+    with server_data_lock(guild_id, "warnings.json"), server_data_lock(guild_id, "warn_counters.json"):
+        counters = _counters_for_update(guild_id)
+        mtime_before = get_server_data_mtime(guild_id, "warnings.json")
+        warns = load_server_data(guild_id, "warnings.json") or []
+        new_warn = {
+            "id": str(uuid.uuid4()),
+            "userId": str(user_id),
+            "reason": reason,
+            "moderatorId": str(mod_id),
+            **record_timestamps()
+        }
+        warns.append(new_warn)
+        save_server_data(guild_id, "warnings.json", warns)
+        note_record_appended(guild_id, "warnings.json", new_warn, mtime_before)
+        c = _edit_user_counter(counters, user_id)
+        c["warnings"] += 1
+        c["last_infraction"] = new_warn["ts"]
+        c["recent"] = (c["recent"] + [new_warn["ts"]])[-RECENT_WARNINGS_KEPT:]
+        save_warning_counters(guild_id, counters)
+        return c["warnings"]
+
+def add_warnings_bulk(guild_id: int, new_warns: list) -> int:
+    """Merges already-built warning records into warnings.json with one write, keeping it time-ordered.
+
+    Counters are rebuilt once afterwards instead of being bumped per record. No escalation is run.
+    Runs on a storage worker, so the re-read, merge and write happen under the same lock as
+    add_warning; warnings issued meanwhile are merged in rather than overwritten. The rebuild
+    runs after that lock is released, under the counters lock only, and re-reads warnings.json,
+    so it counts anything add_warning wrote in between.
+    """
+    if not new_warns: return 0
+    incoming = sorted(new_warns, key=record_ts)
+    with server_data_lock(guild_id, "warnings.json"):
+        warns = load_server_data(guild_id, "warnings.json") or []
+        if warns and record_ts(incoming[0]) >= record_ts(warns[-1]):
+            warns.extend(incoming)
+        else:
+            warns = list(heapq.merge(warns, incoming, key=record_ts))
+        save_server_data(guild_id, "warnings.json", warns)
+    rebuild_warning_counters(guild_id)
+    return len(incoming)
 
 def add_mute(guild_id: int, user_id: int, mod_id: int, reason: str, durationSec: int):
-    mutes = load_server_data(guild_id, "mutes.json") or []
-    new_mute = {
-        "id": str(uuid.uuid4()),
-        "userId": str(user_id),
-        "reason": reason,
-        "moderatorId": str(mod_id),
-        "durationSec": durationSec,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+    """Records a mute and bumps the user's counters. Blocks on the counters lock, so call it via run_storage."""
+    # The counters lock also covers mutes.json, whose other writer is end_active_mute
+    with server_data_lock(guild_id, "warn_counters.json"):
+        counters = _counters_for_update(guild_id)
+        mtime_before = get_server_data_mtime(guild_id, "mutes.json")
+        mutes = load_server_data(guild_id, "mutes.json") or []
+        new_mute = {
+            "id": str(uuid.uuid4()),
+            "userId": str(user_id),
+            "reason": reason,
+            "moderatorId": str(mod_id),
+            "durationSec": durationSec,
+            **record_timestamps()
+        }
+        mutes.append(new_mute)
+        save_server_data(guild_id, "mutes.json", mutes)
+        note_record_appended(guild_id, "mutes.json", new_mute, mtime_before)
+        c = _edit_user_counter(counters, user_id)
+        c["mutes"] += 1
+        c["last_infraction"] = new_mute["ts"]
+        c["muted_until"] = max(c["muted_until"], new_mute["ts"] + durationSec)
+        save_warning_counters(guild_id, counters)
+        active_mutes.add(guild_id, user_id, new_mute["ts"] + durationSec)
+
+def end_active_mute(guild_id: int, user_id: int):
+    """Ends a user's running mutes. Blocks on the counters lock, so call it via run_storage."""
+    with server_data_lock(guild_id, "warn_counters.json"):
+        # Stamp the still-running mutes so a rebuild from mutes.json doesn't resurrect them
+        mutes = load_server_data(guild_id, "mutes.json") or []
+        now = int(time.time())
+        ended = False
+        for m in mutes:
+            if m["userId"] == str(user_id) and not m.get("endedAt") and record_ts(m) + m.get("durationSec", 0) > now:
+                m["endedAt"] = now
+                ended = True
+        if ended: save_server_data(guild_id, "mutes.json", mutes)
+        counters = _counters_for_update(guild_id)
+        if counters["users"].get(str(user_id), {}).get("muted_until"):
+            _edit_user_counter(counters, user_id)["muted_until"] = 0
+            save_warning_counters(guild_id, counters)
+        active_mutes.remove(guild_id, user_id)
+
+def get_command_tree_hash(tree: app_commands.CommandTree) -> str:
+    # Same payload tree.sync() uploads, so any change Discord would see changes the hash
+    payload = []
+    for cmd in tree.get_commands():
+        try: payload.append(cmd.to_dict(tree))
+        except TypeError: payload.append(cmd.to_dict())  # discord.py < 2.4 takes no tree
+    payload.sort(key=lambda c: (c.get("type", 1), c["name"]))
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# ===== Paginated history =====
+# warnings.json, mutes.json and mc_infractions.json are append-only in time order, so the
+# file order doubles as a time index: the newest page is a slice off the end of the list.
+HISTORY_PAGE_SIZE = 10
+
+def parse_history_date(value: str, end_of_day: bool = False) -> Optional[int]:
+    try: d = datetime.strptime(value.strip(), "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError: return None
+    if end_of_day: d += timedelta(days=1, seconds=-1)
+    return int(d.timestamp())
+
+def build_history_filters(moderator: str = None, since: str = None, until: str = None, origin: str = None) -> dict:
+    """Filter dict from raw option values. Raises ValueError on a date that isn't YYYY-MM-DD."""
+    filters = {"moderator": moderator, "origin": origin}
+    for key, value in (("since", since), ("until", until)):
+        if value is None: continue
+        filters[key] = parse_history_date(value, end_of_day=key == "until")
+        if filters[key] is None: raise ValueError(f"Invalid `{key}` date `{value}`, use YYYY-MM-DD.")
+    return {k: v for k, v in filters.items() if v is not None}
+
+def parse_history_filters(text: str) -> dict:
+    """Parses `mod:@user since:YYYY-MM-DD until:YYYY-MM-DD origin:discord|minecraft` tokens. Raises ValueError on bad dates."""
+    options = {}
+    for token in (text or "").split():
+        key, _, value = token.partition(":")
+        key = key.lower()
+        if key in ("mod", "moderator"):
+            digits = re.sub(r"\D", "", value)
+            if digits: options["moderator"] = digits
+        elif key in ("since", "until"): options[key] = value
+        elif key == "origin" and value.lower() in ("discord", "minecraft"): options["origin"] = value.lower()
+    return build_history_filters(**options)
+
+def describe_history_filters(filters: dict) -> str:
+    # Plain text: used in embed footers, which don't render mentions or timestamps
+    day = lambda ts: datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+    parts = []
+    if filters.get("moderator"): parts.append(f"mod {filters['moderator']}")
+    if filters.get("since"): parts.append(f"since {day(filters['since'])}")
+    if filters.get("until"): parts.append(f"until {day(filters['until'])}")
+    if filters.get("origin"): parts.append(f"origin {filters['origin']}")
+    return ", ".join(parts)
+
+def _time_slice(records: list, filters: dict):
+    """Narrows a time-ordered record list to the filter's date range by binary search."""
+    lo, hi = 0, len(records)
+    if filters.get("since") is not None: lo = bisect.bisect_left(records, filters["since"], key=record_ts)
+    if filters.get("until") is not None: hi = bisect.bisect_right(records, filters["until"], key=record_ts)
+    return lo, max(lo, hi)
+
+def _moderator_of(record) -> Optional[str]:
+    return record.get("moderatorId") or record.get("moderatorDiscordId")
+
+def page_records(records: list, offset: int, limit: int, filters: dict = None):
+    """Returns (page, total) for a time-ordered list, newest first, without touching records outside the page unless filtering by moderator."""
+    filters = filters or {}
+    lo, hi = _time_slice(records, filters)
+    mod = filters.get("moderator")
+    if not mod:
+        end = max(lo, hi - offset)
+        return records[max(lo, end - limit):end][::-1], hi - lo
+    page, total = [], 0
+    for i in range(hi - 1, lo - 1, -1):
+        if _moderator_of(records[i]) != mod: continue
+        if offset <= total < offset + limit: page.append(records[i])
+        total += 1
+    return page, total
+
+def _history_stream(records, indices, to_item):
+    for i in indices:
+        yield record_ts(records[i]), records[i], to_item
+
+def merge_history_sources(sources: list, offset: int, limit: int, filters: dict = None):
+    """Lazily merges time-ordered (origin, records, to_item) sources, newest first, and renders only one page."""
+    filters = filters or {}
+    streams, total = [], 0
+    for origin, records, to_item in sources:
+        if filters.get("origin") and filters["origin"] != origin.lower(): continue
+        lo, hi = _time_slice(records, filters)
+        mod = filters.get("moderator")
+        picked = range(hi - 1, lo - 1, -1)
+        if mod: picked = [i for i in picked if _moderator_of(records[i]) == mod]
+        total += len(picked)
+        streams.append(_history_stream(records, picked, to_item))
+    merged = heapq.merge(*streams, key=lambda t: t[0], reverse=True)
+    return [to_item(rec) for _, rec, to_item in itertools.islice(merged, offset, offset + limit)], total
+
+_record_index_cache = {}  # (guild_id, filename, field) -> (mtime_ns, {field value lowercased: [records, time order]})
+
+def load_records_by(guild_id: int, filename: str, field: str, value) -> list:
+    """
+    The records of one user (or player) from a time-ordered store, through a per-value index that
+    is rebuilt only when the file changes, so a history page doesn't rescan the guild's records.
+    The returned list is shared with the cache; don't modify it.
+    """
+    mtime = get_server_data_mtime(guild_id, filename)
+    cached = _record_index_cache.get((guild_id, filename, field))
+    if not cached or cached[0] != mtime:
+        index = {}
+        for r in load_server_data(guild_id, filename) or []:
+            index.setdefault(str(r.get(field, "")).lower(), []).append(r)
+        cached = _record_index_cache[(guild_id, filename, field)] = (mtime, index)
+    return cached[1].get(str(value).lower(), [])
+
+def note_record_appended(guild_id: int, filename: str, record: dict, mtime_before):
+    """Adds a just-appended record to the cached indexes of its store, sparing them a rebuild.
+    Only when they were current right before the write (`mtime_before`)."""
+    mtime = get_server_data_mtime(guild_id, filename)
+    for (g, f, field), (cached_mtime, index) in list(_record_index_cache.items()):
+        if g == guild_id and f == filename and cached_mtime == mtime_before:
+            index.setdefault(str(record.get(field, "")).lower(), []).append(record)
+            _record_index_cache[(g, f, field)] = (mtime, index)
+
+def discord_history_sources(guild_id: int, user_id: int) -> list:
+    warns = load_records_by(guild_id, "warnings.json", "userId", user_id)
+    mutes = load_records_by(guild_id, "mutes.json", "userId", user_id)
+    return [
+        ("Discord", warns, lambda w: {"origin": "Discord", "type": "Warning", "reason": w["reason"], "ts": record_ts(w)}),
+        ("Discord", mutes, lambda m: {"origin": "Discord", "type": f"Mute ({m['durationSec']//60}m)", "reason": m["reason"], "ts": record_ts(m)})
+    ]
+
+# ── Export ──────────────────────────────────────────────────────────────────
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_FIELDS = ["timestamp", "ts", "origin", "type", "user_id", "player", "moderator_id", "reason", "id"]
+
+def export_row(record: dict, origin: str, rtype: str, user_id=None, player=None) -> dict:
+    return {
+        "timestamp": record.get("timestamp"), "ts": record_ts(record), "origin": origin, "type": rtype,
+        "user_id": user_id, "player": player, "moderator_id": _moderator_of(record),
+        "reason": record.get("reason", ""), "id": record.get("id"),
     }
-    mutes.append(new_mute)
-    save_server_data(guild_id, "mutes.json", mutes)
+
+def discord_export_sources(guild_id: int) -> list:
+    """Guild-wide (origin, records, to_row) sources for Discord warnings and mutes."""
+    return [
+        ("Discord", load_server_data(guild_id, "warnings.json") or [],
+         lambda w: export_row(w, "Discord", "warning", user_id=w["userId"])),
+        ("Discord", load_server_data(guild_id, "mutes.json") or [],
+         lambda m: export_row(m, "Discord", f"mute:{m['durationSec']}s", user_id=m["userId"])),
+    ]
+
+def _export_stream(records, lo, hi, to_row):
+    for i in range(lo, hi):
+        yield record_ts(records[i]), records[i], to_row
+
+def iter_history_export(sources: list, filters: dict = None):
+    """Yields export rows from time-ordered (origin, records, to_row) sources, merged oldest first, one at a time."""
+    filters = filters or {}
+    mod = filters.get("moderator")
+    streams = []
+    for origin, records, to_row in sources:
+        if filters.get("origin") and filters["origin"] != origin.lower(): continue
+        lo, hi = _time_slice(records, filters)
+        streams.append(_export_stream(records, lo, hi, to_row))
+    for _, record, to_row in heapq.merge(*streams, key=lambda t: t[0]):
+        if mod and _moderator_of(record) != mod: continue
+        yield to_row(record)
+
+def iter_export_lines(rows, fmt: str = "ndjson"):
+    """Serializes rows to NDJSON or CSV text, one line per yield."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        yield buf.getvalue()
+        for row in rows:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow(row)
+            yield buf.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+# ── Instrumentation ─────────────────────────────────────────────────────────
+
+def install_instrumentation(bot: commands.Bot):
+    """Times every cog listener and every Discord REST call into module_utils.metrics. Idempotent."""
+    if getattr(bot, "_wm_instrumented", False): return
+    bot._wm_instrumented = True
+
+    schedule_event = bot._schedule_event
+    def timed_schedule_event(coro, event_name, *args, **kwargs):
+        label = getattr(coro, "__qualname__", event_name)
+        async def timed(*a, **kw):
+            start = time.perf_counter()
+            try: await coro(*a, **kw)
+            finally: metrics.observe("listener", label, time.perf_counter() - start)
+        return schedule_event(timed, event_name, *args, **kwargs)
+    bot._schedule_event = timed_schedule_event
+
+    http_request = bot.http.request
+    async def timed_request(route, **kwargs):
+        # Route.path is the template ("/channels/{channel_id}/messages"), so labels stay bounded
+        with metrics.timer("discord_api", f"{route.method} {route.path}"):
+            return await http_request(route, **kwargs)
+    bot.http.request = timed_request
+
+class LoopLagWatchdog:
+    """Side thread that checks the event loop answers within `threshold` seconds.
+
+    When it doesn't, the loop thread's stack is captured while it is still stuck and the
+    stall is attributed to the innermost bot frame (the command/listener code doing the
+    blocking). Incidents go to a ring buffer for `!debug lag`.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.5, keep: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.incidents = deque(maxlen=keep)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self._thread and self._thread.is_alive(): return
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()  # called from the loop thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            answered = threading.Event()
+            sent = time.perf_counter()
+            try: self._loop.call_soon_threadsafe(answered.set)
+            except RuntimeError: return  # loop closed
+            if answered.wait(self.threshold):
+                metrics.observe("loop_lag", "(idle)", time.perf_counter() - sent)
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            handler = self._attribute(frame)
+            while not answered.wait(1) and not self._stop.is_set():
+                pass
+            lag = time.perf_counter() - sent
+            metrics.observe("loop_lag", handler, lag)
+            self.incidents.append({"ts": int(time.time()), "lag": lag, "handler": handler, "stack": stack})
+            print(f"[watchdog] Event loop blocked for {lag * 1000:.0f}ms in {handler}")
+
+    def _attribute(self, frame) -> str:
+        task = asyncio.current_task(self._loop) if frame else None
+        innermost = None
+        while frame is not None:
+            if os.sep + "modules" + os.sep in frame.f_code.co_filename:
+                innermost = frame
+                break
+            frame = frame.f_back
+        where = getattr(innermost.f_code, "co_qualname", innermost.f_code.co_name) if innermost else "(outside bot code)"
+        return f"{where} [{task.get_name()}]" if task else where
+
+loop_watchdog = LoopLagWatchdog(threshold=float(os.getenv("WATCHDOG_LAG_MS", "250")) / 1000)
+
+class SamplingProfiler:
+    """Samples every thread's stack at `hz` from a side thread; output is collapsed-stack text.
+
+    Costs one sys._current_frames() walk per sample, so it is safe to run on the live bot.
+    """
+
+    def __init__(self, hz: int = 100):
+        self.interval = 1 / hz
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _label(code) -> str:
+        return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def run(self, seconds: float) -> tuple:
+        """Blocks for `seconds`. Returns (Counter of collapsed stacks, sample count)."""
+        from collections import Counter
+        stacks, samples = Counter(), 0
+        me = threading.get_ident()
+        names = {}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me: continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                stacks[(names.get(thread_id, str(thread_id)),) + tuple(reversed(codes))] += 1
+            samples += 1
+            time.sleep(self.interval)
+        return stacks, samples
+
+    def render(self, stacks, samples: int, top: int = 25) -> tuple:
+        """Returns (collapsed text for flamegraph.pl/speedscope, top-N summary text)."""
+        from collections import Counter
+        collapsed = "\n".join(
+            ";".join([thread.replace(";", ":")] + [self._label(c).replace(";", ":") for c in codes]) + f" {n}"
+            for (thread, *codes), n in stacks.most_common()) + "\n"
+        own, total = Counter(), Counter()
+        for (thread, *codes), n in stacks.items():
+            if not codes: continue
+            own[self._label(codes[-1])] += n
+            for label in {self._label(c) for c in codes}:
+                total[label] += n
+        hits = sum(stacks.values()) or 1
+        lines = [f"{samples} samples @ {1 / self.interval:.0f}Hz across all threads (idle waits included)", "",
+                 f"Top {top} by own time:"]
+        lines += [f"  {n / hits:6.1%}  {label}" for label, n in own.most_common(top)]
+        lines += ["", f"Top {top} by total time (self + callees):"]
+        lines += [f"  {n / hits:6.1%}  {label}" for label, n in total.most_common(top)]
+        return collapsed, "\n".join(lines) + "\n"
+
+profiler = SamplingProfiler()
+PROFILE_MAX_SECONDS = 120
+
+def _format_family(rows: dict, limit: int = 8) -> str:
+    top = sorted(rows.items(), key=lambda kv: kv[1].sum, reverse=True)[:limit]
+    return "\n".join(
+        f"`{label[:40]}` ×{h.count} • p50 {h.quantile(0.5) * 1000:.0f}ms • p99 {h.quantile(0.99) * 1000:.0f}ms"
+        for label, h in top) or "No data yet"
+
+class PaginatedEmbedView(discord.ui.View):
+    """Prev/next pager that fetches and renders one page at a time.
+
+    fetch_page(offset, limit) -> (items, total); render(items, page, pages, total) -> discord.Embed
+    """
+
+    def __init__(self, author_id: int, fetch_page, render, page_size: int = HISTORY_PAGE_SIZE, timeout: float = 180):
+        super().__init__(timeout=timeout)
+        self.author_id = author_id
+        self.fetch_page = fetch_page
+        self.render = render
+        self.page_size = page_size
+        self.page = 0
+        self.total = 0
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-self.total // self.page_size))
+
+    def build_embed(self) -> discord.Embed:
+        items, self.total = self.fetch_page(self.page * self.page_size, self.page_size)
+        self.prev_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.pages - 1
+        return self.render(items, self.page, self.pages, self.total)
+
+    async def _turn(self, interaction: discord.Interaction, delta: int):
+        if interaction.user.id != self.author_id:
+            return await interaction.response.send_message("You're not authorized to use this.", ephemeral=True)
+        self.page = min(max(0, self.page + delta), self.pages - 1)
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, -1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, 1)
 
 @Module.version("1.6")
 @Module.help(
     commands={
         "help": "displays help menu",
-        "hwarn": "shows user's full moderation history",
+        "hwarn": "shows user's full moderation history (filters: mod:@user since:YYYY-MM-DD until:YYYY-MM-DD origin:discord|minecraft)",
+        "history export": "exports the server's whole moderation history as NDJSON or CSV (same filters as hwarn)",
         "delwarn": "delete warns from a user",
         "modrole": "adds/removes a mod role with a level (1-3)",
         "kick": "kicks a user",
@@ -108,28 +876,101 @@ def add_mute(guild_id: int, user_id: int, mod_id: int, reason: str, durationSec:
         "unmute": "unmutes a user",
         "module enable": "Enables a module in this server",
         "module disable": "Disables a module in this server",
-        "refresh_modules": "Refreshes modules from GitHub (Owner only)"
+        "refresh_modules": "Refreshes modules from GitHub (Owner only)",
+        "synccommands": "Forces a slash command sync (Bot owner only)",
+        "debug lag": "lists recent event loop stalls with the blocking stack (Bot owner only)",
+        "debug profile": "samples the live bot for N seconds and uploads flamegraph stacks (Bot owner only)",
+        "stats memory": "shows memory use and cache sizes for the running gateway profile",
+        "stats perf": "shows command, listener, Discord API, Groq and storage timings"
     },
     description="Core functionality for the bot (cannot be disabled)."
 )
 class Core(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._ready_handled = False
+
+    async def cog_load(self):
+        install_instrumentation(self.bot)
+        loop_watchdog.start(asyncio.get_running_loop())
+        # Runs from setup_hook, before the gateway connects, so nothing else is writing yet.
+        # Under launcher.py the migration already ran before any shard process started.
+        if not is_primary_process(): return
+        migrated = migrate_all_servers()
+        if migrated: print(f" Migrated {migrated} infraction records to the epoch timestamp schema")
+
+    async def cog_unload(self):
+        loop_watchdog.stop()
 
     @commands.Cog.listener()
     async def on_ready(self):
-        print(f" Logged in as {self.bot.user.name}")
+        # on_ready fires again after every gateway reconnect; only do startup work once
+        if self._ready_handled: return
+        self._ready_handled = True
+        print(f" Logged in as {self.bot.user.name}" + (f" (shards {sorted(self.bot.shards)})" if isinstance(self.bot, commands.AutoShardedBot) else ""))
+        # The command tree is global; one process syncing it is enough
+        if is_primary_process(): await self.sync_command_tree()
+        mem = get_process_memory()
+        print(f" Bot is ready! ({get_bot_profile()} profile, {len(self.bot.guilds)} guilds, "
+              f"{sum(len(g.members) for g in self.bot.guilds)} cached members, RSS {(mem['rss'] or mem['peak_rss']) / 1048576:.1f} MiB)")
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        # Timeouts lifted from the Discord UI never go through our unmute commands
+        if before.timed_out_until and not after.timed_out_until:
+            await run_storage(end_active_mute, after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry):
+        # Without a member cache on_member_update never fires, so the lean profile
+        # learns about lifted timeouts from the audit log instead
+        if get_bot_profile() != "lean" or entry.action != discord.AuditLogAction.member_update: return
+        if getattr(entry.before, "timed_out_until", None) and not getattr(entry.after, "timed_out_until", None):
+            await run_storage(end_active_mute, entry.guild.id, entry.target.id)
+
+    async def sync_command_tree(self, force: bool = False):
+        """Syncs the global app command tree only when it differs from the last successful sync."""
         try:
+            try: tree_hash = get_command_tree_hash(self.bot.tree)
+            except Exception as e:
+                # Without a hash the tree can't be shown unchanged, so sync rather than skip
+                print(f"⚠️ Could not hash the command tree, syncing anyway: {e}")
+                tree_hash = None
+            app_id = str(self.bot.application_id)
+            state = load_bot_data("tree_sync.json") or {}
+            if not force and tree_hash and state.get("hash") == tree_hash and state.get("application_id") == app_id:
+                print(" Slash commands unchanged, skipping sync")
+                return None
             synced = await self.bot.tree.sync()
+            save_bot_data("tree_sync.json", {"hash": tree_hash, "application_id": app_id, "synced_at": datetime.now(timezone.utc).isoformat()})
             print(f" Synced {len(synced)} slash commands")
+            return synced
         except Exception as e:
             print(f"⚠️ Failed to sync commands: {e}")
-        print(" Bot is ready!")
+            return None
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx):
+        ctx.perf_started = time.perf_counter()
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx):
+        if hasattr(ctx, "perf_started"):
+            metrics.observe("command", f"!{ctx.command.qualified_name}", time.perf_counter() - ctx.perf_started)
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        # Measured from interaction creation, so it includes gateway delivery as the user sees it
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        metrics.observe("command", f"/{command.qualified_name}", max(elapsed, 0.0))
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
+        if ctx.command and hasattr(ctx, "perf_started"):
+            metrics.observe("command", f"!{ctx.command.qualified_name}", time.perf_counter() - ctx.perf_started)
+            metrics.inc("command_errors_total", f"!{ctx.command.qualified_name}")
         if isinstance(error, commands.CheckFailure):
-            if ctx.command and ctx.command.cog:
+            if ctx.guild and ctx.command and ctx.command.cog:
                 cog_name = ctx.command.cog.__class__.__name__
                 if not is_module_enabled(ctx.guild.id, cog_name):
                     return await ctx.reply(f"Command disabled, enable with `!module enable {cog_name}`")
@@ -180,9 +1021,13 @@ class Core(commands.Cog):
         await self.execute_warn(interaction, member, reason)
 
     @app_commands.command(name="hwarn", description="Show user history")
-    async def hwarn_slash(self, interaction: discord.Interaction, member: discord.Member):
+    @app_commands.describe(moderator="Only infractions issued by this moderator", since="YYYY-MM-DD", until="YYYY-MM-DD")
+    @app_commands.choices(origin=[app_commands.Choice(name="Discord", value="discord"), app_commands.Choice(name="Minecraft", value="minecraft")])
+    async def hwarn_slash(self, interaction: discord.Interaction, member: discord.Member, moderator: discord.Member = None, since: str = None, until: str = None, origin: str = None):
         if not is_moderator(interaction.user, min_level=1): return await interaction.response.send_message("Permission denied (Level 1 required).", ephemeral=True)
-        await self.execute_hwarn(interaction, member)
+        try: filters = build_history_filters(str(moderator.id) if moderator else None, since, until, origin)
+        except ValueError as e: return await interaction.response.send_message(f"⚠️ {e}", ephemeral=True)
+        await self.execute_hwarn(interaction, member, filters)
 
     @app_commands.command(name="mute", description="Mute a user")
     async def mute_slash(self, interaction: discord.Interaction, member: discord.Member, duration: str, reason: str):
@@ -194,13 +1039,14 @@ class Core(commands.Cog):
         if not is_moderator(interaction.user, min_level=1): return await interaction.response.send_message("Permission denied (Level 1 required).", ephemeral=True)
         try:
             await member.timeout(None)
+            await run_storage(end_active_mute, member.guild.id, member.id)
             await interaction.response.send_message(f" **{member.mention}** has been unmuted.")
         except Exception as e: await interaction.response.send_message(f"Failed: {e}", ephemeral=True)
 
     @app_commands.command(name="kick", description="Kick a user")
     async def kick_slash(self, interaction: discord.Interaction, member: discord.Member, reason: str = "None"):
         if not is_moderator(interaction.user, min_level=2): return await interaction.response.send_message("Permission denied (Level 2 required).", ephemeral=True)
-        if member == interaction.guild.owner: return await interaction.response.send_message("Cannot kick owner.", ephemeral=True)
+        if member.id == interaction.guild.owner_id: return await interaction.response.send_message("Cannot kick owner.", ephemeral=True)
         try:
             await member.kick(reason=reason)
             await interaction.response.send_message(f"👢 **{member.name}** kicked. Reason: {reason}")
@@ -209,7 +1055,7 @@ class Core(commands.Cog):
     @app_commands.command(name="ban", description="Ban a user")
     async def ban_slash(self, interaction: discord.Interaction, member: discord.Member, reason: str = "None"):
         if not is_moderator(interaction.user, min_level=2): return await interaction.response.send_message("Permission denied (Level 2 required).", ephemeral=True)
-        if member == interaction.guild.owner: return await interaction.response.send_message("Cannot ban owner.", ephemeral=True)
+        if member.id == interaction.guild.owner_id: return await interaction.response.send_message("Cannot ban owner.", ephemeral=True)
         try:
             await member.ban(reason=reason)
             await interaction.response.send_message(f"🔨 **{member.name}** banned. Reason: {reason}")
@@ -376,7 +1222,7 @@ class Core(commands.Cog):
     async def execute_warn(self, ctx_or_int, member: discord.Member, reason: str):
         guild_id = member.guild.id
         mod_id = get_author(ctx_or_int).id
-        count = add_warning(guild_id, member.id, mod_id, reason)
+        count = await run_storage(add_warning, guild_id, member.id, mod_id, reason)
         embed = discord.Embed(
             title=f"⚠️ Warning Issued: {member.name}",
             description=f"**Reason:** {reason}\n**Total Warnings:** {count}",
@@ -392,60 +1238,95 @@ class Core(commands.Cog):
         await self.execute_warn(ctx, member, reason)
 
     @commands.command(name="hwarn")
-    async def hwarn_command(self, ctx, member: discord.Member = None):
+    async def hwarn_command(self, ctx, member: discord.Member = None, *, filters: str = None):
         if not is_moderator(ctx.author, min_level=1): return await ctx.reply("You don't have permission.")
         if not member: return await ctx.reply("⚠️ Please mention a user.")
-        await self.execute_hwarn(ctx, member)
+        try: filters = parse_history_filters(filters)
+        except ValueError as e: return await ctx.reply(f"⚠️ {e}")
+        await self.execute_hwarn(ctx, member, filters)
 
-    async def execute_hwarn(self, ctx_or_int, member: discord.Member):
+    async def execute_hwarn(self, ctx_or_int, member: discord.Member, filters: dict = None):
         guild_id = member.guild.id
+        filters = filters or {}
         
         # 1. Discord Data
-        warns = load_server_data(guild_id, "warnings.json") or []
-        user_warns = [w for w in warns if w["userId"] == str(member.id)]
-        mutes = load_server_data(guild_id, "mutes.json") or []
-        user_mutes = [m for m in mutes if m["userId"] == str(member.id)]
+        sources = discord_history_sources(guild_id, member.id)
+        mc_name = None
 
         # 2. Check for Minecraft Data integration
-        items = []
-        mc_name = None
-        
         mc_cog = self.bot.get_cog("Minecraft")
-        if mc_cog and hasattr(mc_cog, "get_combined_history"):
-            # If Minecraft module is enabled, fetch linked infractions
-            mc_items, mc_name = await mc_cog.get_combined_history(member)
-            items = mc_items # Minecraft helper already combines Discord + MC
-        else:
-            # Fallback to standard Discord-only logic if MC module is missing
-            for w in user_warns:
-                ts = datetime.fromisoformat(w["timestamp"]).timestamp()
-                items.append({"origin": "Discord", "type": "Warning", "reason": w["reason"], "ts": ts})
-            for m in user_mutes:
-                ts = datetime.fromisoformat(m["timestamp"]).timestamp()
-                items.append({"origin": "Discord", "type": f"Mute ({m['durationSec']//60}m)", "reason": m["reason"], "ts": ts})
-            items.sort(key=lambda x: x["ts"], reverse=True)
-
-        if not items:
-            return await send_response(ctx_or_int, f" **{member.name}** has a clean history!")
+        if mc_cog and hasattr(mc_cog, "get_history_sources"):
+            # If Minecraft module is enabled, add linked infractions
+            mc_sources, mc_name = mc_cog.get_history_sources(member)
+            sources += mc_sources
+
+        def fetch_page(offset, limit):
+            return merge_history_sources(sources, offset, limit, filters)
+
+        def render(items, page, pages, total):
+            embed = discord.Embed(title=f"📜 Moderation History — {member.name}", color=0xffaa00)
+            if mc_name:
+                embed.set_author(name=f"Linked Minecraft Account: {mc_name}")
+            lines = []
+            for it in items:
+                date = f"<t:{int(it['ts'])}:d>" if it['ts'] > 0 else "N/A"
+                origin_icon = "🎮" if it["origin"] == "Minecraft" else "💬"
+                lines.append(f"{origin_icon} **{it['type']}** — {date}\n└ *{it['reason']}*")
+            embed.description = "\n".join(lines)
+            footer = f"Page {page + 1}/{pages} • {total} total infractions"
+            if filters: footer += f" • {describe_history_filters(filters)}"
+            embed.set_footer(text=footer)
+            return embed
+
+        view = PaginatedEmbedView(get_author(ctx_or_int).id, fetch_page, render)
+        embed = view.build_embed()
+        if not view.total:
+            suffix = " matching those filters" if filters else ""
+            return await send_response(ctx_or_int, f" **{member.name}** has a clean history{suffix}!")
+        await send_response(ctx_or_int, embed=embed, view=view if view.pages > 1 else None)
+
+    @commands.group(name="history", invoke_without_command=True)
+    async def history_group(self, ctx):
+        await ctx.reply("⚠️ Usage: `!history export [ndjson|csv] [filters]`")
+
+    @history_group.command(name="export")
+    async def history_export(self, ctx, fmt: str = "ndjson", *, filters: str = None):
+        if not is_moderator(ctx.author, min_level=2): return await ctx.reply("You don't have permission.")
+        fmt = fmt.lower()
+        if fmt not in EXPORT_FORMATS:
+            # No format given, the first word is already a filter
+            filters = f"{fmt} {filters or ''}".strip()
+            fmt = "ndjson"
+        try: filters = parse_history_filters(filters)
+        except ValueError as e: return await ctx.reply(f"⚠️ {e}")
+
+        guild_id = ctx.guild.id
+        mc_cog = self.bot.get_cog("Minecraft")
 
-        embed = discord.Embed(
-            title=f"📜 Moderation History — {member.name}",
-            color=0xffaa00
-        )
-        if mc_name:
-            embed.set_author(name=f"Linked Minecraft Account: {mc_name}")
-
-        lines = []
-        for it in items[:15]: # Show latest 15
-            date = f"<t:{int(it['ts'])}:d>" if it['ts'] > 0 else "N/A"
-            origin_icon = "🎮" if it["origin"] == "Minecraft" else "💬"
-            lines.append(f"{origin_icon} **{it['type']}** — {date}\n└ *{it['reason']}*")
-        
-        embed.description = "\n".join(lines)
-        if len(items) > 15:
-            embed.set_footer(text=f"Showing latest 15 of {len(items)} total infractions.")
+        def write_export():
+            # Loading and parsing every store happens here too, off the event loop
+            sources = discord_export_sources(guild_id)
+            if mc_cog and hasattr(mc_cog, "get_export_sources"):
+                sources += mc_cog.get_export_sources(guild_id)
+            # Rows go straight to a temp file, so memory stays flat however long the history is
+            fp = tempfile.TemporaryFile()
+            rows = 0
+            for line in iter_export_lines(iter_history_export(sources, filters), fmt):
+                fp.write(line.encode("utf-8"))
+                rows += 1
+            fp.seek(0)
+            return fp, rows - (1 if fmt == "csv" else 0)
 
-        await send_response(ctx_or_int, embed=embed)
+        async with ctx.typing():
+            fp, rows = await run_storage(write_export)
+        with fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size > ctx.guild.filesize_limit:
+                return await ctx.reply(f"⚠️ The export is {size // 1024} KiB, over this server's upload limit. "
+                                       "Narrow it with `since:`/`until:` or fetch it from the WMMC API's `/history/export`.")
+            filename = f"history-{ctx.guild.id}-{datetime.now(timezone.utc):%Y%m%d}.{fmt}"
+            suffix = f" ({describe_history_filters(filters)})" if filters else ""
+            await ctx.reply(f"📦 Exported **{rows}** records{suffix}.", file=discord.File(fp, filename=filename))
 
     @commands.command(name="delwarn")
     async def delwarn_command(self, ctx, member: discord.Member = None):
@@ -461,9 +1342,14 @@ class Core(commands.Cog):
         options = [discord.SelectOption(label=f"Warning {i}: {w['reason'][:50]}", value=w["id"]) for i, w in enumerate(user_warns, 1)]
         select = discord.ui.Select(placeholder="Select warnings to remove...", options=options, min_values=1, max_values=len(options))
         
+        def delete_selected(guild_id: int, ids: list):
+            with server_data_lock(guild_id, "warnings.json"):
+                current = load_server_data(guild_id, "warnings.json") or []
+                save_server_data(guild_id, "warnings.json", [w for w in current if w["id"] not in ids])
+                remove_warnings_from_counters(guild_id, [w for w in current if w["id"] in ids])
+
         async def select_callback(interaction):
-            updated_warnings = [w for w in load_server_data(interaction.guild_id, "warnings.json") if w["id"] not in select.values]
-            save_server_data(interaction.guild_id, "warnings.json", updated_warnings)
+            await run_storage(delete_selected, interaction.guild_id, list(select.values))
             await interaction.response.edit_message(embed=discord.Embed(title=" Selected Warnings Deleted", color=0x00ff00), view=None)
             
         select.callback = select_callback
@@ -477,20 +1363,18 @@ class Core(commands.Cog):
         parts = [p.strip() for p in args.split(',', 2)]
         if len(parts) < 3: return await ctx.reply("⚠️ Usage: `!mute <user>, <duration>, <reason>`")
         user_input, duration_str, reason = parts
-        member = ctx.guild.get_member_named(user_input) or (ctx.message.mentions[0] if ctx.message.mentions else None)
-        if not member:
-            try: member = await ctx.guild.fetch_member(int(user_input))
-            except: return await ctx.reply(f"Could not find user.")
+        member = ctx.message.mentions[0] if ctx.message.mentions else await resolve_member(ctx.guild, user_input)
+        if not isinstance(member, discord.Member): return await ctx.reply(f"Could not find user.")
         await self.execute_mute(ctx, member, duration_str, reason)
 
     async def execute_mute(self, ctx_or_int, member, duration_str, reason):
-        if member == ctx_or_int.guild.owner:
+        if member.id == ctx_or_int.guild.owner_id:
             return await send_response(ctx_or_int, "You cannot mute the server owner!")
         dur = parse_duration(duration_str)
         if not dur: return await send_response(ctx_or_int, "⚠️ Invalid duration. Use format: `10s`, `5m`, `2h`, `1d`")
         try:
             await member.timeout(timedelta(seconds=dur), reason=reason)
-            add_mute(member.guild.id, member.id, get_author(ctx_or_int).id, reason, dur)
+            await run_storage(add_mute, member.guild.id, member.id, get_author(ctx_or_int).id, reason, dur)
             await send_response(ctx_or_int, f"🔇 **{member.mention}** muted for **{duration_str}**. Reason: {reason}")
         except Exception as e:
             await send_response(ctx_or_int, f"Failed to mute: {e}")
@@ -501,6 +1385,7 @@ class Core(commands.Cog):
         if not member: return await ctx.reply("⚠️ Content missing.")
         try:
             await member.timeout(None)
+            await run_storage(end_active_mute, member.guild.id, member.id)
             await ctx.reply(f" **{member.mention}** has been unmuted.")
         except Exception as e:
             await ctx.reply(f"Failed to unmute: {e}")
@@ -510,7 +1395,7 @@ class Core(commands.Cog):
         if not is_moderator(ctx.author, min_level=2): return await ctx.reply("Higher permission (Level 2) required.")
         if not member: return await ctx.reply("⚠️ Content missing.")
         try:
-            if member == ctx.guild.owner:
+            if member.id == ctx.guild.owner_id:
                 return await ctx.reply("You cannot kick the server owner!")
             await member.kick(reason=reason)
             await ctx.reply(f"👢 **{member.name}** kicked. Reason: {reason}")
@@ -521,7 +1406,7 @@ class Core(commands.Cog):
         if not is_moderator(ctx.author, min_level=2): return await ctx.reply("Higher permission (Level 2) required.")
         if not member: return await ctx.reply("⚠️ Content missing.")
         try:
-            if member == ctx.guild.owner:
+            if member.id == ctx.guild.owner_id:
                 return await ctx.reply("You cannot ban the server owner!")
             await member.ban(reason=reason)
             await ctx.reply(f"🔨 **{member.name}** banned. Reason: {reason}")
@@ -563,7 +1448,7 @@ class Core(commands.Cog):
 
     @app_commands.command(name="refresh_modules", description="Refresh modules from GitHub (Owner only)")
     async def refresh_modules_slash(self, interaction: discord.Interaction):
-        if interaction.user != interaction.guild.owner:
+        if interaction.user.id != interaction.guild.owner_id:
             return await interaction.response.send_message("Only the server owner can use this command.", ephemeral=True)
         await interaction.response.defer()
         
@@ -580,7 +1465,7 @@ class Core(commands.Cog):
 
     @commands.command(name="refresh_modules")
     async def refresh_modules_command(self, ctx):
-        if ctx.author != ctx.guild.owner:
+        if ctx.author.id != ctx.guild.owner_id:
             return await ctx.reply("Only the server owner can use this command.")
         
         msg = await ctx.reply("⏳ Checking for updates...")
@@ -596,6 +1481,90 @@ class Core(commands.Cog):
         update_list = "\n".join([f"- `{u}`" for u in updates])
         await msg.edit(content=f"**Do you want to refresh these modules?**\n{update_list}", view=view)
 
+    @commands.group(name="stats", invoke_without_command=True)
+    async def stats_group(self, ctx):
+        await ctx.reply("⚠️ Usage: `!stats perf` or `!stats memory`")
+
+    @stats_group.command(name="perf")
+    async def stats_perf(self, ctx):
+        if ctx.author.id != ctx.guild.owner_id and not await self.bot.is_owner(ctx.author):
+            return await ctx.reply("Only the server or bot owner can use this command.")
+        embed = discord.Embed(title="Performance (since start)", color=0x5865F2)
+        embed.add_field(name="Commands", value=_format_family(metrics.family("command")), inline=False)
+        embed.add_field(name="Listeners", value=_format_family(metrics.family("listener"), 5), inline=False)
+        embed.add_field(name="Discord API", value=_format_family(metrics.family("discord_api"), 5), inline=False)
+        embed.add_field(name="Groq", value=_format_family(metrics.family("groq"), 3), inline=False)
+        embed.add_field(name="Event Loop Lag", value=_format_family(metrics.family("loop_lag"), 4), inline=False)
+        reads, writes = metrics.counter_totals("storage_reads_total"), metrics.counter_totals("storage_writes_total")
+        read_kib = sum(metrics.counter_totals("storage_read_bytes_total").values()) / 1024
+        write_kib = sum(metrics.counter_totals("storage_write_bytes_total").values()) / 1024
+        busiest = sorted(reads, key=reads.get, reverse=True)[:3]
+        embed.add_field(name="Storage", value=(
+            f"{int(sum(reads.values()))} reads ({read_kib:,.0f} KiB) • {int(sum(writes.values()))} writes ({write_kib:,.0f} KiB)\n"
+            + (f"Most read: {', '.join(f'`{f}` ×{int(reads[f])}' for f in busiest)}" if busiest else "")), inline=False)
+        embed.set_footer(text="Prometheus format: GET /metrics on the WMMC API port")
+        await ctx.reply(embed=embed)
+
+    @stats_group.command(name="memory")
+    async def stats_memory(self, ctx):
+        if ctx.author.id != ctx.guild.owner_id and not await self.bot.is_owner(ctx.author):
+            return await ctx.reply("Only the server or bot owner can use this command.")
+        mem = get_process_memory()
+        mib = lambda b: f"{b / 1048576:.1f} MiB" if b is not None else "n/a"
+        embed = discord.Embed(title=f"Memory — `{get_bot_profile()}` profile", color=0x5865F2)
+        embed.add_field(name="RSS", value=mib(mem["rss"]), inline=True)
+        embed.add_field(name="Peak RSS", value=mib(mem["peak_rss"]), inline=True)
+        embed.add_field(name="Guilds", value=str(len(self.bot.guilds)), inline=True)
+        embed.add_field(name="Cached Members", value=str(sum(len(g.members) for g in self.bot.guilds)), inline=True)
+        embed.add_field(name="Cached Users", value=str(len(self.bot.users)), inline=True)
+        embed.add_field(name="Cached Messages", value=str(len(self.bot.cached_messages)), inline=True)
+        embed.set_footer(text="Set BOT_PROFILE=lean or full and restart to compare")
+        await ctx.reply(embed=embed)
+
+    @commands.group(name="debug", invoke_without_command=True)
+    async def debug_group(self, ctx):
+        await ctx.reply("⚠️ Usage: `!debug lag` or `!debug profile <seconds>`")
+
+    @debug_group.command(name="profile")
+    async def debug_profile(self, ctx, seconds: float = 10):
+        if not await self.bot.is_owner(ctx.author): return await ctx.reply("Bot owner only.")
+        if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+            return await ctx.reply(f"⚠️ Pick a window between 1 and {PROFILE_MAX_SECONDS} seconds.")
+        if profiler.lock.locked(): return await ctx.reply("A profile is already running.")
+        with profiler.lock:
+            await ctx.reply(f"⏱️ Sampling for {seconds:g}s…")
+            stacks, samples = await asyncio.to_thread(profiler.run, seconds)
+            collapsed, summary = profiler.render(stacks, samples)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        preview = "\n".join(summary.splitlines()[:12])
+        await ctx.reply(f"```\n{preview[:1900]}\n```", files=[
+            discord.File(io.BytesIO(collapsed.encode()), filename=f"profile-{stamp}.collapsed"),
+            discord.File(io.BytesIO(summary.encode()), filename=f"profile-{stamp}-top.txt"),
+        ])
+
+    @debug_group.command(name="lag")
+    async def debug_lag(self, ctx):
+        if not await self.bot.is_owner(ctx.author): return await ctx.reply("Bot owner only.")
+        incidents = list(loop_watchdog.incidents)
+        if not incidents:
+            return await ctx.reply(f"No event loop stalls over {loop_watchdog.threshold * 1000:.0f}ms since start.")
+        embed = discord.Embed(title=f"Event Loop Stalls (last {len(incidents)})", color=0xff8800)
+        embed.description = "\n".join(
+            f"<t:{i['ts']}:T> **{i['lag'] * 1000:.0f}ms** — `{i['handler'][:80]}`" for i in reversed(incidents[-15:]))
+        embed.set_footer(text=f"Threshold {loop_watchdog.threshold * 1000:.0f}ms • stacks attached, newest first")
+        dump = "\n\n".join(
+            f"=== {datetime.fromtimestamp(i['ts'], timezone.utc).isoformat()} {i['lag'] * 1000:.0f}ms {i['handler']}\n{i['stack']}"
+            for i in reversed(incidents))
+        await ctx.reply(embed=embed, file=discord.File(io.BytesIO(dump.encode()), filename="loop-lag.txt"))
+
+    @commands.command(name="synccommands")
+    @commands.is_owner()
+    async def synccommands_command(self, ctx):
+        # The tree is global and Discord rate-limits syncs, so this stays with the bot owner (DMs included)
+        synced = await self.sync_command_tree(force=True)
+        if synced is None: return await ctx.reply("⚠️ Failed to sync commands.")
+        await ctx.reply(f"✅ Synced {len(synced)} slash commands.")
+
     async def _get_module_list_embed(self, guild_id):
         import os
         local_files = [f for f in os.listdir("modules") if f.endswith(".py")]
@@ -802,9 +1771,7 @@ class Core(commands.Cog):
                 except Exception as e:
                     print(f"Failed to reload {mod_name}: {e}")
             
-            try:
-                await self.bot.tree.sync()
-            except: pass
+            await self.sync_command_tree()
 
             if not applied:
                 return "✅ All modules are already up to date."
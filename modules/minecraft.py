@@ -1,17 +1,43 @@
 import asyncio
+import bisect
+import gzip
+import hashlib
+import heapq
+import hmac
+import ipaddress
 import json
+import math
+import os
+import queue
 import re
+import secrets
+import socket
+import socketserver
+import stat
 import threading
+import time
 import uuid
+import zlib
+from collections import deque
+from itertools import islice
 from datetime import datetime, timezone
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
-from module_utils import Module, load_server_data, save_server_data, is_module_enabled
-from modules.core import is_moderator, send_response, get_author, add_warning
+try:
+    import msgpack  # optional: compact API bodies for WMMC builds that ask for them
+except ImportError:
+    msgpack = None
+
+from module_utils import Module, has_server_dir, load_server_data, save_server_data, get_server_data_mtime, server_data_lock, is_module_enabled, is_primary_process, is_secondary_process, get_process_index, get_guild_process, process_channel, run_storage, metrics
+from modules.core import (is_moderator, send_response, get_author, add_warning, record_ts, record_timestamps, epoch_from_any,
+                          active_mutes, EXPORT_FORMATS, export_row, discord_export_sources, iter_history_export, iter_export_lines,
+                          parse_history_filters, parse_duration, load_records_by, note_record_appended)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Constants
@@ -19,6 +45,27 @@ from modules.core import is_moderator, send_response, get_author, add_warning
 HANDSHAKE_PORT = 7913   # Temporary port for setup handshake
 API_PORT       = 7912   # Permanent port for ongoing WMMC ↔ WMD communication
 HANDSHAKE_TIMEOUT = 600  # 10 minutes
+EVENT_KEEPALIVE = 15     # seconds between SSE keepalive comments
+EVENT_POLL_MAX = 30      # longest a /events/poll request may hang
+MAX_BODY_BYTES = 64 * 1024
+THROTTLE_RATE  = 20      # sustained requests per second per guild
+THROTTLE_BURST = 40
+MAX_INFLATED_BYTES = 16 * MAX_BODY_BYTES  # gzip request bodies may not expand past this
+GZIP_MIN_BYTES = 1024                     # smaller responses go out uncompressed even if gzip is accepted
+MSGPACK_TYPES  = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+HISTORY_PAGE_MAX = 500   # largest /history page
+INGEST_BATCH_MAX = 1000  # events per POST /ingest
+INGEST_BODY_BYTES = 1024 * 1024  # /ingest's body limit instead of MAX_BODY_BYTES: a full batch of chat lines
+INGEST_QUEUE_BATCHES = 256  # batches waiting for the automod worker before /ingest answers 429
+MAX_TIMEOUT_SEC  = 28 * 86400  # Discord's timeout limit; longer MC punishments become bans on Discord
+# Optional Unix domain sockets for the same HTTP APIs, for a WMMC on the same host. Served
+# alongside the TCP ports; access is governed by the socket file's permissions.
+API_SOCKET       = os.getenv("WMMC_API_SOCKET")
+HANDSHAKE_SOCKET = os.getenv("WMMC_HANDSHAKE_SOCKET")
+SOCKET_MODE      = 0o660  # owner and group (put the Minecraft server's user in the bot's group)
+# Where WMMC instances' own sockets (/identify listen_socket) must live; defaults to the API
+# socket's directory. With neither set, instances can only register a loopback port.
+INSTANCE_SOCKET_DIR = os.getenv("WMMC_INSTANCE_SOCKET_DIR") or (os.path.dirname(API_SOCKET) if API_SOCKET else None)
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -29,8 +76,33 @@ def load_mc_rules(guild_id: int) -> dict:
     """Load mcrules.json for a guild (source-of-truth pushed from WMMC at startup)."""
     return load_server_data(guild_id, "mcrules.json") or {}
 
-def save_mc_rules(guild_id: int, rules: dict):
-    save_server_data(guild_id, "mcrules.json", rules)
+def rules_hash(rules: dict) -> str:
+    """
+    SHA-256 of the rules' canonical JSON: UTF-8, keys sorted, no whitespace. WMMC hashes its
+    rules the same way and asks GET /rules/check before uploading them.
+    """
+    canonical = json.dumps(rules, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def load_mc_rules_meta(guild_id: int) -> dict:
+    """{"hash", "version", "synced_at"} of the guild's synced rules; version counts actual changes."""
+    meta = load_server_data(guild_id, "mcrules_meta.json")
+    if meta is None:
+        rules = load_mc_rules(guild_id)  # synced before rules were versioned
+        meta = {"hash": rules_hash(rules), "version": 1 if rules else 0, "synced_at": None}
+    return meta
+
+def save_mc_rules(guild_id: int, rules: dict) -> tuple:
+    """Stores the rules unless they are unchanged. Returns (changed, meta)."""
+    with server_data_lock(guild_id, "mcrules.json"):
+        meta = load_mc_rules_meta(guild_id)
+        digest = rules_hash(rules)
+        if digest == meta["hash"] and get_server_data_mtime(guild_id, "mcrules.json") is not None:
+            return False, meta
+        save_server_data(guild_id, "mcrules.json", rules)
+        meta = {"hash": digest, "version": meta["version"] + 1, "synced_at": int(time.time())}
+        save_server_data(guild_id, "mcrules_meta.json", meta)
+        return True, meta
 
 def load_mc_links(guild_id: int) -> dict:
     """Load account links {discord_id: minecraft_name}."""
@@ -45,22 +117,61 @@ def load_mc_infractions(guild_id: int) -> list:
 
 def save_mc_infractions(guild_id: int, records: list):
     save_server_data(guild_id, "mc_infractions.json", records)
+    history_versions.wrote_infractions(guild_id)
 
 def add_mc_infraction(guild_id: int, player_name: str, mod_discord_id: int,
                       rule_id: str, degree: int | None, punishment: str, reason: str):
-    records = load_mc_infractions(guild_id)
-    records.append({
-        "id": str(uuid.uuid4()),
-        "playerName": player_name,
-        "moderatorDiscordId": str(mod_discord_id),
-        "ruleId": rule_id,
-        "degree": degree,
-        "punishmentType": punishment,
-        "reason": reason,
-        "timestamp": datetime.now(timezone.utc).timestamp()
-    })
-    save_mc_infractions(guild_id, records)
-
+    with server_data_lock(guild_id, "mc_infractions.json"):
+        mtime_before = get_server_data_mtime(guild_id, "mc_infractions.json")
+        records = load_mc_infractions(guild_id)
+        records.append({
+            "id": str(uuid.uuid4()),
+            "playerName": player_name,
+            "moderatorDiscordId": str(mod_discord_id),
+            "ruleId": rule_id,
+            "degree": degree,
+            "punishmentType": punishment,
+            "reason": reason,
+            **record_timestamps()
+        })
+        save_mc_infractions(guild_id, records)
+        note_record_appended(guild_id, "mc_infractions.json", records[-1], mtime_before)
+
+
+_token_cache = {}  # guild_id -> (mc_api.json mtime, token sha256 or None)
+
+def issue_api_token(guild_id: int) -> str:
+    """Creates a new API token for the guild (replacing any old one). Only its hash is stored."""
+    token = secrets.token_urlsafe(32)
+    data = load_server_data(guild_id, "mc_api.json") or {}
+    data["token_sha256"] = hashlib.sha256(token.encode()).hexdigest()
+    data["issued_at"] = int(time.time())
+    save_server_data(guild_id, "mc_api.json", data)
+    return token
+
+def is_legacy_tether(guild_id: int) -> bool:
+    """True if the guild was tethered to a WMMC server before API tokens existed."""
+    return any(get_server_data_mtime(guild_id, f) is not None for f in ("mc_port.json", "mc_instances.json"))
+
+def check_api_token(guild_id: int, token: str | None) -> bool:
+    """
+    True if the token matches. Guilds without a token are refused, except those tethered before
+    tokens existed, which stay open (with a deprecation warning) until they re-run /minecraft setup.
+    """
+    mtime = get_server_data_mtime(guild_id, "mc_api.json")
+    cached = _token_cache.get(guild_id)
+    if not cached or cached[0] != mtime:
+        data = load_server_data(guild_id, "mc_api.json") or {}
+        cached = _token_cache[guild_id] = (mtime, data.get("token_sha256"))
+    if cached[1] is None:
+        if not is_legacy_tether(guild_id):
+            return False
+        print(f"[WMMC API] DEPRECATED: guild {guild_id} has no API token; accepting an unauthenticated request. "
+              f"Run /minecraft setup to issue one.")
+        return True
+    if not token:
+        return False
+    return hmac.compare_digest(cached[1], hashlib.sha256(token.encode()).hexdigest())
 
 
 def get_punishment_for_degree(rule: dict, degree: int) -> str | None:
@@ -75,13 +186,16 @@ def get_punishment_for_degree(rule: dict, degree: int) -> str | None:
 
 def parse_punishment(punishment_str: str) -> dict:
     """
-    Parse a punishment string into an action dict.
+    Parse a punishment string into an action dict (served from the compiled step cache).
     Examples:
         "warn"           → {"action": "warn"}
         "perm_ban"       → {"action": "perm_ban"}
         "temp_ban_7d"    → {"action": "temp_ban", "duration": "7d"}
         "mute_30m"       → {"action": "mute",    "duration": "30m"}
     """
+    return dict(compile_punishment(punishment_str).parsed)
+
+def _parse_punishment(punishment_str: str) -> dict:
     if punishment_str == "warn":
         return {"action": "warn"}
     if punishment_str == "perm_ban":
@@ -92,54 +206,899 @@ def parse_punishment(punishment_str: str) -> dict:
         return {"action": "mute", "duration": punishment_str[len("mute_"):]}
     return {"action": punishment_str}
 
+class PunishmentStep:
+    """One rung of a rule's punishment ladder, parsed once.
+
+    `discord` is what a linked Discord account gets: ("warn",), ("perm_ban",), ("timeout", seconds),
+    ("long_ban",) for durations past Discord's timeout limit, ("ban",) for other bans, or ("none",).
+    """
+    __slots__ = ("raw", "parsed", "action", "duration", "seconds", "discord")
+
+    def __init__(self, raw: str):
+        self.parsed = _parse_punishment(raw)
+        self.raw = raw
+        self.action = self.parsed["action"]
+        self.duration = raw.split("_")[-1]
+        self.seconds = parse_duration(self.duration)
+        if raw == "perm_ban": self.discord = ("perm_ban",)
+        elif raw == "warn": self.discord = ("warn",)
+        elif self.seconds: self.discord = ("timeout", self.seconds) if self.seconds <= MAX_TIMEOUT_SEC else ("long_ban",)
+        elif "ban" in raw: self.discord = ("ban",)
+        else: self.discord = ("none",)
+
+@lru_cache(maxsize=1024)
+def compile_punishment(punishment_str: str) -> PunishmentStep:
+    return PunishmentStep(punishment_str)
+
+class CompiledRule:
+    """A synced rule with its ladder precompiled: ladder[degree - 1] is that degree's PunishmentStep."""
+    __slots__ = ("rule_id", "name", "ladder")
+
+    def __init__(self, rule_id: str, rule: dict):
+        self.rule_id = rule_id
+        self.name = rule.get("name", f"Rule {rule_id}")
+        self.ladder = [compile_punishment(str(p)) for p in rule.get("punishments", [])]
+
+_rules_cache = {}  # guild_id -> (mcrules.json mtime, {rule_id: CompiledRule})
+
+def get_compiled_rules(guild_id: int) -> dict:
+    """The guild's rules as CompiledRules, recompiled only when mcrules.json changes."""
+    mtime = get_server_data_mtime(guild_id, "mcrules.json")
+    cached = _rules_cache.get(guild_id)
+    if not cached or cached[0] != mtime:
+        rules = load_mc_rules(guild_id)
+        cached = _rules_cache[guild_id] = (mtime, {rule_id: CompiledRule(rule_id, rule) for rule_id, rule in rules.items()})
+    return cached[1]
+
+async def apply_discord_step(guild_id: int, member: discord.Member, step: PunishmentStep, mod_id: int, reason: str) -> str:
+    """Carries out a punishment step on a linked Discord member. Returns what was done ("" if nothing)."""
+    from datetime import timedelta
+    kind = step.discord[0]
+    if kind == "perm_ban":
+        await member.ban(reason=reason)
+        return f"Ban executed on Discord for {member.mention}."
+    if kind == "warn":
+        await run_storage(add_warning, guild_id, member.id, mod_id, reason)
+        return f"Warning logged on Discord for {member.mention}."
+    if kind == "timeout":
+        await member.timeout(timedelta(seconds=step.seconds), reason=reason)
+        return f"Muted (Timeout) for {step.duration} on Discord."
+    if kind == "long_ban":
+        await member.ban(reason=reason)
+        return f"Banned (exceeds timeout limit) on Discord."
+    if kind == "ban":
+        await member.ban(reason=reason)
+        return f"Ban executed on Discord."
+    return ""
+
 
 # ──────────────────────────────────────────────────────────────────────────────
-# Temporary handshake server (port 7913)
+# Push channel (bot → WMMC)
 # ──────────────────────────────────────────────────────────────────────────────
 
-class HandshakeHandler(BaseHTTPRequestHandler):
-    """Serves GET /handshake once, returning the guild ID, then signals shutdown."""
+class WMMCEventStream:
+    """
+    Per-guild ordered event log that WMMC follows over SSE (GET /events) or
+    long-poll (GET /events/poll).
 
-    def log_message(self, format, *args):  # suppress default access log noise
-        pass
+    Events get a "<epoch>.<seq>" cursor. The last EVENT_LOG_SIZE events are kept for
+    replay after a disconnect; a cursor from before a restart (different epoch) or one
+    that fell out of the log gets a single "reset" event, telling WMMC to resync state
+    through /sync/mutes. Published from the event loop, read from API threads.
+    """
 
-    def do_GET(self):
-        if self.path == "/handshake":
-            guild_id = self.server.guild_id
-            payload = json.dumps({"discord_server_id": str(guild_id)}).encode()
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Content-Length", str(len(payload)))
-            self.end_headers()
-            self.wfile.write(payload)
-            # Signal that the handshake was consumed
-            self.server.handshake_done.set()
+    EVENT_LOG_SIZE = 1000
+    SUBSCRIBER_GRACE = 60  # a long-poller counts as connected this long after its last poll
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._epoch = secrets.token_hex(4)
+        self._guilds = {}
+
+    def _guild(self, guild_id: int) -> dict:
+        g = self._guilds.get(guild_id)
+        if g is None:
+            g = self._guilds[guild_id] = {"seq": 0, "log": deque(maxlen=self.EVENT_LOG_SIZE), "streams": 0, "last_poll": 0.0}
+        return g
+
+    def publish(self, guild_id: int, event_type: str, data: dict) -> str | None:
+        if is_secondary_process():
+            # Only process 0 serves /events, so the event goes into its log
+            process_channel.send(0, "wmmc_event", guild_id=guild_id, type=event_type, data=data)
+            return None
+        with self._cond:
+            g = self._guild(guild_id)
+            g["seq"] += 1
+            event = {"id": f"{self._epoch}.{g['seq']}", "type": event_type, "data": data, "ts": int(time.time())}
+            g["log"].append((g["seq"], event))
+            self._cond.notify_all()
+            return event["id"]
+
+    def cursor(self, guild_id: int) -> str:
+        with self._cond:
+            return f"{self._epoch}.{self._guild(guild_id)['seq']}"
+
+    def _pending(self, g: dict, cursor: str) -> list:
+        epoch, _, seq = cursor.partition(".")
+        if epoch != self._epoch or not seq.isdigit() or int(seq) > g["seq"] or (
+                int(seq) < g["seq"] and g["log"][0][0] > int(seq) + 1):
+            return [{"id": f"{self._epoch}.{g['seq']}", "type": "reset", "data": {}, "ts": int(time.time())}]
+        return [e for s, e in g["log"] if s > int(seq)]
+
+    def wait(self, guild_id: int, cursor: str | None, timeout: float):
+        """Blocks until events exist after `cursor` or the timeout passes. Returns (events, new_cursor).
+
+        Without a cursor the subscriber starts from the current position.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            g = self._guild(guild_id)
+            cursor = cursor or f"{self._epoch}.{g['seq']}"
+            events = self._pending(g, cursor)
+            while not events:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                self._cond.wait(remaining)
+                events = self._pending(g, cursor)
+            return events, (events[-1]["id"] if events else cursor)
+
+    def mark_poll(self, guild_id: int):
+        with self._cond:
+            self._guild(guild_id)["last_poll"] = time.monotonic()
+
+    def stream_opened(self, guild_id: int, delta: int):
+        with self._cond:
+            self._guild(guild_id)["streams"] += delta
+
+    def has_subscriber(self, guild_id: int) -> bool:
+        with self._cond:
+            g = self._guild(guild_id)
+            return g["streams"] > 0 or time.monotonic() - g["last_poll"] < self.SUBSCRIBER_GRACE
+
+event_stream = WMMCEventStream()
+process_channel.on("wmmc_event", lambda m: event_stream.publish(m["guild_id"], m["type"], m["data"]))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# WMMC instance registry (one guild, many Minecraft servers)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class InstanceRegistry:
+    """
+    Every WMMC instance tethered to a guild, keyed by the `instance_id` it sends to /identify.
+
+    The endpoints live in mc_instances.json; liveness (heartbeats from /ping, open /events
+    streams, last delivery result) is kept in memory only. Guilds that only have the old
+    single-port mc_port.json show up as one "default" instance.
+    """
+
+    STALE_AFTER = 90   # seconds without a heartbeat before an instance counts as offline
+    DELIVERY_TIMEOUT = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live = {}   # (guild_id, instance_id) -> {"seen", "streams", "last_poll", "delivery"}
+
+    def load(self, guild_id: int) -> dict:
+        data = load_server_data(guild_id, "mc_instances.json")
+        if data is None:
+            legacy = load_server_data(guild_id, "mc_port.json") or {}
+            return {"default": {"host": "localhost", "port": legacy["port"]}} if legacy.get("port") else {}
+        return data.get("instances", {})
+
+    @staticmethod
+    def check_endpoint(port, host: str, socket_path: str | None) -> str | None:
+        """
+        Why an endpoint sent to /identify is refused, or None. The bot POSTs commands to it, and
+        legacy guilds without a token let anyone identify, so only loopback hosts and existing
+        sockets inside INSTANCE_SOCKET_DIR are accepted.
+        """
+        if port is not None and (isinstance(port, bool) or not isinstance(port, int) or not 0 < port < 65536):
+            return "listen_port must be a port number"
+        if host != "localhost":
+            try: loopback = ipaddress.ip_address(str(host)).is_loopback
+            except ValueError: loopback = False
+            if not loopback:
+                return "listen_host must be a loopback address"
+        if socket_path is not None:
+            if not INSTANCE_SOCKET_DIR:
+                return "listen_socket is not enabled (set WMMC_INSTANCE_SOCKET_DIR)"
+            real = os.path.realpath(str(socket_path))
+            if os.path.commonpath([real, os.path.realpath(INSTANCE_SOCKET_DIR)]) != os.path.realpath(INSTANCE_SOCKET_DIR):
+                return "listen_socket must be inside the configured socket directory"
+            try: is_socket = stat.S_ISSOCK(os.stat(real).st_mode)
+            except OSError: is_socket = False
+            if not is_socket:
+                return "listen_socket is not an existing socket"
+        return None
+
+    def register(self, guild_id: int, instance_id: str, port, host: str = "localhost", version: str = "unknown",
+                 socket_path: str | None = None):
+        # Instances of one guild often identify together at startup, from separate handler threads
+        with server_data_lock(guild_id, "mc_instances.json"):
+            instances = self.load(guild_id)
+            legacy = instances.get("default")
+            # Socket-only instances register without a port, which must not match a portless legacy entry
+            if instance_id != "default" and port and legacy and legacy.get("port") == port:
+                instances.pop("default")  # the pre-registry entry for this same server
+            instances[instance_id] = {"host": host, "port": port, "version": version, "identified_at": int(time.time())}
+            if socket_path:
+                instances[instance_id]["socket"] = socket_path
+            save_server_data(guild_id, "mc_instances.json", {"instances": instances})
+        self.heartbeat(guild_id, instance_id)
+
+    def _state(self, guild_id: int, instance_id: str) -> dict:
+        return self._live.setdefault((guild_id, instance_id), {"seen": 0.0, "streams": 0, "last_poll": 0.0, "delivery": None})
+
+    def heartbeat(self, guild_id: int, instance_id: str):
+        with self._lock:
+            self._state(guild_id, instance_id)["seen"] = time.monotonic()
+
+    def stream_opened(self, guild_id: int, instance_id: str, delta: int):
+        with self._lock:
+            state = self._state(guild_id, instance_id)
+            state["streams"] += delta
+            state["seen"] = time.monotonic()
+
+    def mark_poll(self, guild_id: int, instance_id: str):
+        with self._lock:
+            state = self._state(guild_id, instance_id)
+            state["last_poll"] = state["seen"] = time.monotonic()
+
+    def is_streaming(self, guild_id: int, instance_id: str) -> bool:
+        with self._lock:
+            state = self._live.get((guild_id, instance_id))
+            return bool(state) and (state["streams"] > 0 or
+                                    time.monotonic() - state["last_poll"] < WMMCEventStream.SUBSCRIBER_GRACE)
+
+    def health(self, guild_id: int, instance_id: str) -> str:
+        with self._lock:
+            state = self._live.get((guild_id, instance_id))
+        if not state:
+            return "unknown"
+        if state["streams"] > 0:
+            return "online"
+        if state["delivery"] and not state["delivery"][0] and state["delivery"][2] >= state["seen"]:
+            return "unreachable"
+        return "online" if time.monotonic() - state["seen"] < self.STALE_AFTER else "stale"
+
+    def _record_delivery(self, guild_id: int, instance_id: str, ok: bool, detail: str):
+        with self._lock:
+            state = self._state(guild_id, instance_id)
+            state["delivery"] = (ok, detail, time.monotonic())
+            if ok:
+                state["seen"] = state["delivery"][2]
+
+    async def deliver(self, guild_id: int, command: str) -> dict:
+        """
+        Pushes `command` to every instance of the guild at once and returns {instance_id: status}.
+        Instances following /events already got it from the push stream and are skipped.
+        Other shard processes hand the delivery to process 0, which knows who is streaming.
+        """
+        if is_secondary_process():
+            try:
+                return await process_channel.call(0, "wmmc_deliver", timeout=self.DELIVERY_TIMEOUT + 2,
+                                                  guild_id=guild_id, command=command)
+            except asyncio.TimeoutError:
+                return {"api": "⏳ handed to the API process, no reply yet"}
+        instances = self.load(guild_id)
+        if not instances and event_stream.has_subscriber(guild_id):
+            return {"events": "📡 push stream"}
+        # Older WMMC builds follow /events without naming themselves; the stream covers them
+        anonymous_stream = event_stream.has_subscriber(guild_id) and not any(
+            self.is_streaming(guild_id, i) for i in instances)
+        results, targets = {}, []
+        for instance_id, info in instances.items():
+            if anonymous_stream or self.is_streaming(guild_id, instance_id):
+                results[instance_id] = "📡 push stream"
+            elif not info.get("port") and not info.get("socket"):
+                results[instance_id] = "⏳ queued on /events"
+            elif self.check_endpoint(info.get("port"), info.get("host") or "localhost", info.get("socket")):
+                results[instance_id] = "❌ endpoint refused (re-run /wmmc setup)"  # registered before endpoints were checked
+            else:
+                targets.append((instance_id, info))
+
+        if targets:
+            import aiohttp
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.DELIVERY_TIMEOUT)) as session:
+                async def push(instance_id, info):
+                    if info.get("socket"):
+                        # Same request over the instance's Unix socket; the URL's host is ignored
+                        client = aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=info["socket"]),
+                                                       timeout=session.timeout)
+                        url = "http://localhost/command"
+                    else:
+                        client, url = session, f"http://{info.get('host') or 'localhost'}:{info['port']}/command"
+                    try:
+                        async with client.post(url, json={"command": command}) as resp:
+                            ok, detail = resp.status == 200, f"HTTP {resp.status}"
+                    except Exception as e:
+                        ok, detail = False, type(e).__name__
+                    finally:
+                        if client is not session:
+                            await client.close()
+                    self._record_delivery(guild_id, instance_id, ok, detail)
+                    if not ok:
+                        print(f"[WMMC API] Failed to push command to instance '{instance_id}' of guild {guild_id}: {detail}")
+                    return instance_id, ("✅ delivered" if ok else f"❌ {detail}")
+
+                results.update(await asyncio.gather(*(push(i, info) for i, info in targets)))
+        return results
+
+instances = InstanceRegistry()
+process_channel.on("wmmc_deliver", lambda m: instances.deliver(m["guild_id"], m["command"]))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Player history (GET /history)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class HistoryVersions:
+    """
+    ETags for GET /history that can be checked without reading any store.
+
+    A player's MC records change through /punishment/log, which bumps that player's counter.
+    The Discord side (warnings, mutes, links) is covered by those files' mtimes, like the other
+    mtime-validated caches. A write to mc_infractions.json that this process did not make
+    (another shard process, the startup migration, a hand edit) bumps the whole guild's epoch,
+    since it can't be attributed to a player. A boot nonce keeps tags from a previous run
+    from ever matching.
+    """
+
+    WATCHED = ("warnings.json", "mutes.json", "mclinks.json")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boot = secrets.token_hex(4)
+        self._players = {}     # (guild_id, player_uuid) -> version
+        self._epochs = {}      # guild_id -> version
+        self._own_mtime = {}   # guild_id -> mc_infractions.json mtime after this process's last write
+
+    def bump(self, guild_id: int, player_uuid: str):
+        with self._lock:
+            self._players[(guild_id, player_uuid)] = self._players.get((guild_id, player_uuid), 0) + 1
+
+    def wrote_infractions(self, guild_id: int):
+        mtime = get_server_data_mtime(guild_id, "mc_infractions.json")
+        with self._lock:
+            self._own_mtime[guild_id] = mtime
+
+    def etag(self, guild_id: int, player_uuid: str, variant: str = "") -> str:
+        """Weak ETag for the player's history; `variant` distinguishes pages and options."""
+        mc_mtime = get_server_data_mtime(guild_id, "mc_infractions.json")
+        mtimes = tuple(get_server_data_mtime(guild_id, f) for f in self.WATCHED)
+        with self._lock:
+            # Our own write may predate the guild's first lookup, so the epoch can't be assumed set
+            epoch = self._epochs.setdefault(guild_id, 0)
+            if guild_id not in self._own_mtime or self._own_mtime[guild_id] != mc_mtime:
+                epoch = self._epochs[guild_id] = epoch + 1
+                self._own_mtime[guild_id] = mc_mtime
+            parts = (self._boot, epoch, self._players.get((guild_id, player_uuid), 0), mtimes, variant)
+        return f'W/"{hashlib.blake2s(repr(parts).encode(), digest_size=9).hexdigest()}"'
+
+history_versions = HistoryVersions()
+
+
+def iter_player_history(guild_id: int, player_uuid: str, labels: bool = True):
+    """
+    A player's MC records plus their linked Discord account's warnings and mutes, newest first,
+    as GET /history rows. Each store is walked backwards (they are kept in time order) and
+    merged lazily, so a page only formats the rows it returns.
+    """
+    player_mc = [r for r in load_mc_infractions(guild_id) if r.get("playerUuid") == player_uuid]
+    player_name = player_mc[0]["playerName"] if player_mc else "Unknown"
+    linked_discord_id = next((d_id for d_id, mc_name in load_mc_links(guild_id).items()
+                              if mc_name.lower() == player_name.lower()), None)
+
+    def discord_rows(filename: str, describe):
+        if not linked_discord_id:
+            return
+        for r in reversed(load_server_data(guild_id, filename) or []):
+            if r["userId"] == str(linked_discord_id):
+                ts = record_ts(r)
+                row = {"type": describe(r), "origin": "Discord", "reason": r["reason"], "timestamp": ts}
+                if labels:
+                    row["date_label"] = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+                yield row
+
+    def mc_rows():
+        for r in reversed(player_mc):
+            ts = record_ts(r)
+            ptype = r.get("punishmentType", r.get("punishment", "Unknown"))
+            row = {"type": ptype.replace("_", " ").title(), "origin": "Minecraft", "reason": r.get("reason", ""), "timestamp": ts}
+            if labels:
+                row["date_label"] = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M") if ts else "N/A"
+            yield row
+
+    return heapq.merge(
+        discord_rows("warnings.json", lambda w: "Warning (Discord)"),
+        discord_rows("mutes.json", lambda m: f"Mute ({m['durationSec']//60}m) (Discord)"),
+        mc_rows(),
+        key=lambda row: row["timestamp"], reverse=True)
+
+
+def paginate_history(rows, limit: int, cursor: tuple | None) -> tuple:
+    """
+    Keyset pagination over newest-first rows. A cursor "<ts>.<n>" resumes after the first n rows
+    stamped ts, so records added since the previous page don't shift it. Returns (page, next cursor).
+    """
+    skip_ts, skip_n = cursor or (None, 0)
+    if skip_ts is not None:
+        def resumed(row):
+            nonlocal skip_n
+            if row["timestamp"] > skip_ts: return False
+            if row["timestamp"] == skip_ts and skip_n:
+                skip_n -= 1
+                return False
+            return True
+        rows = (row for row in rows if resumed(row))
+    page = list(islice(rows, limit + 1))
+    if len(page) <= limit:
+        return page, None
+    page.pop()
+    last_ts = page[-1]["timestamp"]
+    n = sum(1 for row in page if row["timestamp"] == last_ts) + (cursor[1] if cursor and cursor[0] == last_ts else 0)
+    return page, f"{last_ts}.{n}"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Chat automod (POST /ingest)
+# ──────────────────────────────────────────────────────────────────────────────
+# Stored per guild under info.json["mc_automod"], next to WarnsExtras' escalation policy.
+# Punishments use the rule ladder syntax ("warn", "mute_10m", "temp_ban_1d", "perm_ban").
+DEFAULT_MC_AUTOMOD = {
+    "enabled": False,               # off until a moderator turns it on
+    "keywords": [],                 # words or phrases matched whole-word, case-insensitively
+    "keyword_punishment": "warn",
+    "rate_messages": 0,             # more chat lines than this ...
+    "rate_seconds": 10,             # ... within this many seconds counts as spam (rate_messages 0 = off)
+    "rate_punishment": "mute_10m",
+    "cooldown_seconds": 60,         # at most one automatic punishment per player in this window
+}
+AUTOMOD_RULE_ID = "automod"         # ruleId of the MC infractions automod records
+INGEST_TEXT_MAX = 4096              # longest player name, uuid or chat line /ingest accepts
+
+def normalize_ingest_event(event) -> dict:
+    """
+    Checks one /ingest event and returns just the fields the worker reads, raising ValueError
+    on anything malformed, so the worker never sees a value it can't hash or compare.
+    """
+    if not isinstance(event, dict): raise ValueError("must be an object")
+    if not isinstance(event.get("type"), str): raise ValueError("`type` must be a string")
+    normalized = {"type": event["type"]}
+    for key in ("player_uuid", "player_name", "message"):
+        value = event.get(key)
+        if value is None: continue
+        if not isinstance(value, str) or len(value) > INGEST_TEXT_MAX:
+            raise ValueError(f"`{key}` must be a string of at most {INGEST_TEXT_MAX} characters")
+        if value: normalized[key] = value
+    if "player_uuid" not in normalized and "player_name" not in normalized:
+        raise ValueError("`player_uuid` or `player_name` required")
+    when = event.get("timestamp")
+    if when is not None:
+        if isinstance(when, bool) or not isinstance(when, (int, float)) or not math.isfinite(when) or when < 0:
+            raise ValueError("`timestamp` must be a non-negative number")
+        normalized["timestamp"] = when
+    return normalized
+
+def validate_mc_automod(policy: dict) -> dict:
+    """Returns a complete automod policy, raising ValueError on unknown keys or bad values."""
+    merged = dict(DEFAULT_MC_AUTOMOD)
+    for key, value in (policy or {}).items():
+        if key not in DEFAULT_MC_AUTOMOD: raise ValueError(f"Unknown automod key `{key}`.")
+        merged[key] = value
+    if isinstance(merged["enabled"], str):
+        merged["enabled"] = merged["enabled"].strip().lower() in ("1", "true", "yes", "on", "enable", "enabled")
+    merged["enabled"] = bool(merged["enabled"])
+    if isinstance(merged["keywords"], str):
+        merged["keywords"] = merged["keywords"].split(",")
+    merged["keywords"] = sorted({str(k).strip().lower() for k in merged["keywords"] if str(k).strip()})
+    for key in ("rate_messages", "rate_seconds", "cooldown_seconds"):
+        merged[key] = int(merged[key])
+        if merged[key] < 0: raise ValueError(f"`{key}` cannot be negative.")
+    if merged["rate_messages"] and not merged["rate_seconds"]: raise ValueError("`rate_seconds` must be positive.")
+    for key in ("keyword_punishment", "rate_punishment"):
+        merged[key] = str(merged[key]).strip().lower()
+        if compile_punishment(merged[key]).discord == ("none",):
+            raise ValueError(f"Invalid punishment `{merged[key]}`. Use `warn`, `mute_10m`, `temp_ban_1d` or `perm_ban`.")
+    return merged
+
+class CompiledAutomod:
+    """An automod policy with every keyword folded into one regex and both punishments compiled."""
+
+    def __init__(self, policy: dict):
+        self.policy = p = validate_mc_automod(policy)
+        self.enabled = p["enabled"]
+        words = sorted(p["keywords"], key=len, reverse=True)  # longest first, so phrases win over their words
+        self.pattern = re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, words)) + r")(?!\w)", re.IGNORECASE) if words else None
+        self.keyword_step = compile_punishment(p["keyword_punishment"])
+        self.rate_step = compile_punishment(p["rate_punishment"])
+        self.rate_messages = p["rate_messages"]
+        self.rate_seconds = p["rate_seconds"]
+        self.cooldown = p["cooldown_seconds"]
+
+
+class ChatIngest:
+    """
+    POST /ingest hands whole batches to a bounded queue and returns. One worker thread drains
+    several batches at a time, runs their chat lines through each guild's keyword filter and
+    per-player rate detector, and records the hits with a single mc_infractions.json write per
+    guild. Hits are published to WMMC as "automod" events and, for players linked through
+    mclinks.json, punished on Discord via the bot's event loop. A full queue makes /ingest
+    answer 429, so WMMC backs off instead of the bot buffering without bound.
+    """
+
+    DRAIN_BATCHES = 64
+    TRACKED_PLAYERS = 50_000   # rate-detector windows kept before the idle ones are dropped
+
+    def __init__(self, max_batches: int = INGEST_QUEUE_BATCHES):
+        self._queue = queue.Queue(maxsize=max_batches)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._policies = {}      # guild_id -> (info.json mtime, CompiledAutomod)
+        self._linked = {}        # guild_id -> (mclinks.json mtime, {mc name lowercased: discord id})
+        self._windows = {}       # (guild_id, player) -> deque of recent chat times
+        self._last_action = {}   # (guild_id, player) -> time of the last automatic punishment
+        self.stats = {"batches": 0, "events": 0, "rejected": 0, "keyword_hits": 0, "rate_hits": 0}
+
+    def submit(self, guild_id: int, events: list) -> bool:
+        """Queues a batch. False when the queue is full (the caller answers 429)."""
+        try:
+            self._queue.put_nowait((guild_id, events))
+        except queue.Full:
+            with self._lock:
+                self.stats["rejected"] += 1
+            return False
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="wmmc-ingest", daemon=True)
+                self._thread.start()
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            chunk = [self._queue.get()]
+            while len(chunk) < self.DRAIN_BATCHES:
+                try: chunk.append(self._queue.get_nowait())
+                except queue.Empty: break
+            try:
+                self.process(chunk)
+            except Exception as e:
+                print(f"[WMMC API] Ingest worker failed on {len(chunk)} batches: {e}")
+
+    def policy(self, guild_id: int) -> CompiledAutomod:
+        mtime = get_server_data_mtime(guild_id, "info.json")
+        cached = self._policies.get(guild_id)
+        if cached and cached[0] == mtime: return cached[1]
+        info = load_server_data(guild_id, "info.json") or {}
+        try: compiled = CompiledAutomod(info.get("mc_automod", {}))
+        except (ValueError, TypeError) as e:
+            print(f"Invalid MC automod policy for guild {guild_id}, automod disabled: {e}")
+            compiled = CompiledAutomod({})
+        self._policies[guild_id] = (mtime, compiled)
+        return compiled
+
+    def linked_account(self, guild_id: int, player_name: str) -> int | None:
+        mtime = get_server_data_mtime(guild_id, "mclinks.json")
+        cached = self._linked.get(guild_id)
+        if not cached or cached[0] != mtime:
+            cached = self._linked[guild_id] = (mtime, {name.lower(): int(d_id) for d_id, name in load_mc_links(guild_id).items()})
+        return cached[1].get(player_name.lower())
+
+    def process(self, chunk: list) -> list:
+        """Runs [(guild_id, events)] through the filters and acts on the hits, which it returns."""
+        by_guild = {}
+        for guild_id, events in chunk:
+            by_guild.setdefault(guild_id, []).extend(events)
+        hits = []
+        for guild_id, events in by_guild.items():
+            # One guild's failure must not cost the other guilds in the chunk their hits
+            try:
+                policy = self.policy(guild_id)
+                guild_hits = self._scan(guild_id, events, policy) if policy.enabled else []
+                if guild_hits:
+                    self._act(guild_id, guild_hits)
+            except Exception as e:
+                print(f"[WMMC API] Ingest failed for guild {guild_id} ({len(events)} events): {e}")
+                continue
+            # Only recorded hits start their player's cooldown
+            for kind, step, reason, event, when in guild_hits:
+                self._last_action[(guild_id, self._player(event))] = when
+            with self._lock:
+                self.stats["batches"] += sum(1 for g, _ in chunk if g == guild_id)
+                self.stats["events"] += len(events)
+                for kind, *_ in guild_hits:
+                    self.stats[f"{kind}_hits"] += 1
+            hits.extend((guild_id, *hit) for hit in guild_hits)
+        if len(self._windows) > self.TRACKED_PLAYERS:
+            # Players quiet for an hour start over; those who left were dropped on their leave event
+            cutoff = time.time() - 3600
+            self._windows = {k: w for k, w in self._windows.items() if w and w[-1] > cutoff}
+            self._last_action = {k: t for k, t in self._last_action.items() if t > cutoff - 86400}
+        return hits
+
+    @staticmethod
+    def _player(event: dict) -> str:
+        return event.get("player_uuid") or event.get("player_name")
+
+    def _scan(self, guild_id: int, events: list, policy: CompiledAutomod) -> list:
+        hits, now = [], time.time()
+        claimed = {}  # cooldowns started by this scan; committed by process() once the hits are recorded
+        for event in events:
+            player = self._player(event)
+            if not player:
+                continue
+            key = (guild_id, player)
+            if event.get("type") == "leave":
+                self._windows.pop(key, None)
+                continue
+            if event.get("type") != "chat":
+                continue
+            when = event.get("timestamp")
+            when = when / (1000 if when > 1e11 else 1) if when else now
+
+            hit = None
+            if policy.pattern:
+                match = policy.pattern.search(str(event.get("message", "")))
+                if match:
+                    hit = ("keyword", policy.keyword_step, f"Minecraft chat filter — \"{match.group(0)}\"")
+            if policy.rate_messages:
+                window = self._windows.get(key)
+                if window is None:
+                    window = self._windows[key] = deque()
+                window.append(when)
+                while window and when - window[0] > policy.rate_seconds:
+                    window.popleft()
+                if len(window) > policy.rate_messages and not hit:
+                    hit = ("rate", policy.rate_step, f"Minecraft chat spam — {len(window)} messages in {policy.rate_seconds}s")
+                    window.clear()
+            if hit and when - claimed.get(key, self._last_action.get(key, float("-inf"))) >= policy.cooldown:
+                claimed[key] = when
+                hits.append((*hit, event, when))
+        return hits
+
+    def _act(self, guild_id: int, hits: list):
+        bot = _api_bot_ref
+        mod_id = bot.user.id if bot and bot.user else 0
+        with server_data_lock(guild_id, "mc_infractions.json"):
+            records = load_mc_infractions(guild_id)
+            for kind, step, reason, event, when in hits:
+                bisect.insort(records, {
+                    "id": str(uuid.uuid4()),
+                    **({"playerUuid": event["player_uuid"]} if event.get("player_uuid") else {}),
+                    "playerName": event.get("player_name") or event.get("player_uuid"),
+                    "moderatorDiscordId": str(mod_id),
+                    "ruleId": AUTOMOD_RULE_ID,
+                    "degree": None,
+                    "punishmentType": step.raw,
+                    "reason": reason,
+                    **record_timestamps(datetime.fromtimestamp(int(when), timezone.utc))
+                }, key=record_ts)
+            save_mc_infractions(guild_id, records)
+
+        loop = getattr(bot, "loop", None) if bot else None
+        for kind, step, reason, event, when in hits:
+            name = event.get("player_name") or event.get("player_uuid")
+            if event.get("player_uuid"):
+                history_versions.bump(guild_id, event["player_uuid"])
+            event_stream.publish(guild_id, "automod", {"playerName": name, "punishment": step.raw, "reason": reason})
+            discord_id = self.linked_account(guild_id, name) if event.get("player_name") else None
+            if not discord_id:
+                continue
+            owner = get_guild_process(guild_id)
+            if owner != get_process_index():
+                # The guild's shard lives in another process; only that one can act on Discord
+                process_channel.send(owner, "mc_automod_punish", guild_id=guild_id, discord_id=discord_id,
+                                     punishment=step.raw, mod_id=mod_id, reason=reason)
+            elif isinstance(loop, asyncio.AbstractEventLoop) and loop.is_running():
+                asyncio.run_coroutine_threadsafe(self._punish_linked(guild_id, discord_id, step, mod_id, reason), loop)
+
+    async def _punish_linked(self, guild_id: int, discord_id: int, step: PunishmentStep, mod_id: int, reason: str):
+        guild = _api_bot_ref.get_guild(guild_id)
+        if guild is None:
+            return
+        try:
+            member = guild.get_member(discord_id) or await guild.fetch_member(discord_id)
+            await apply_discord_step(guild_id, member, step, mod_id, reason)
+        except Exception as e:
+            print(f"[WMMC API] Automod could not punish linked account {discord_id} in guild {guild_id}: {e}")
+
+chat_ingest = ChatIngest()
+process_channel.on("mc_automod_punish", lambda m: chat_ingest._punish_linked(
+    m["guild_id"], m["discord_id"], compile_punishment(m["punishment"]), m["mod_id"], m["reason"]))
+
+def _collect_ingest_metrics():
+    with chat_ingest._lock:
+        stats = dict(chat_ingest.stats)
+    return [("mc_ingest_queue_depth", {}, chat_ingest.depth())] + \
+           [(f"mc_ingest_{name}_total", {}, n) for name, n in stats.items()]
+
+metrics.add_collector(_collect_ingest_metrics)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Handshake server (port 7913, optionally a Unix socket)
+# ──────────────────────────────────────────────────────────────────────────────
+
+PAIRING_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # no 0/O or 1/I lookalikes
+PAIRING_CODE_LEN = 8
+
+class HandshakeBroker:
+    """
+    Serves GET /handshake?code=<pairing code> on the bot's event loop for every guild
+    currently running /minecraft setup. Each code is single-use; the listener is only
+    bound while at least one pairing is pending.
+    """
+
+    def __init__(self):
+        self._pending = {}   # code -> {"guild_id", "event", "result"}
+        self._servers = []   # the TCP listener, plus the Unix socket one if HANDSHAKE_SOCKET is set
+
+    async def open(self, guild_id: int) -> dict:
+        """Starts a pairing window for the guild and returns it. Raises OSError if the port is taken."""
+        # One window per guild: re-running setup supersedes the previous code
+        for code, pending in list(self._pending.items()):
+            if pending["guild_id"] == guild_id:
+                self._finish(code, "superseded")
+
+        if not self._servers:
+            await self._listen()
+
+        code = "".join(secrets.choice(PAIRING_ALPHABET) for _ in range(PAIRING_CODE_LEN))
+        while code in self._pending:
+            code = "".join(secrets.choice(PAIRING_ALPHABET) for _ in range(PAIRING_CODE_LEN))
+        pending = self._pending[code] = {"code": code, "guild_id": guild_id, "event": asyncio.Event(), "result": None}
+        return pending
+
+    async def wait(self, pending: dict, timeout: float) -> str:
+        """Waits for the pairing to end. Returns "paired", "superseded" or "timeout"."""
+        try:
+            await asyncio.wait_for(pending["event"].wait(), timeout)
+        except asyncio.TimeoutError:
+            self._finish(pending["code"], "timeout")
+        await self._close_if_idle()
+        return pending["result"]
+
+    def _finish(self, code: str, result: str):
+        pending = self._pending.pop(code, None)
+        if pending is not None:
+            pending["result"] = result
+            pending["event"].set()
+        return pending
+
+    async def _listen(self):
+        error = None
+        if HANDSHAKE_SOCKET:
+            _unlink_stale_socket(HANDSHAKE_SOCKET)
+            self._servers.append(await asyncio.start_unix_server(self._handle, path=HANDSHAKE_SOCKET))
+            os.chmod(HANDSHAKE_SOCKET, SOCKET_MODE)
+        try:
+            self._servers.append(await asyncio.start_server(self._handle, "localhost", HANDSHAKE_PORT))
+        except OSError as e:
+            error = e
+        if error and not self._servers:
+            raise error  # a taken TCP port only matters when there is no socket to pair over
+
+    async def _close_if_idle(self):
+        if not self._pending and self._servers:
+            servers, self._servers = self._servers, []
+            for server in servers:
+                server.close()
+                await server.wait_closed()
+            if HANDSHAKE_SOCKET:
+                _unlink_stale_socket(HANDSHAKE_SOCKET)
+
+    def _claim(self, code: str | None):
+        """Resolves a request to a pending pairing, returning (status, body)."""
+        if code:
+            pending = self._finish(code.strip().upper(), "paired")
+            if pending is None:
+                return 404, {"error": "unknown or expired pairing code"}
+        elif len(self._pending) == 1:
+            # Older WMMC builds don't send a code; only unambiguous while a single guild is pairing
+            pending = self._finish(next(iter(self._pending)), "paired")
         else:
-            self.send_response(404)
-            self.end_headers()
+            return 409, {"error": "pairing code required"}
+        guild_id = pending["guild_id"]
+        return 200, {"discord_server_id": str(guild_id), "api_token": issue_api_token(guild_id)}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            for _ in range(100):  # skip headers; the handshake only needs the request line
+                line = await asyncio.wait_for(reader.readline(), 10)
+                if line in (b"\r\n", b"\n", b""):
+                    break
 
-def _run_handshake_server(guild_id: int, done_event: threading.Event):
-    """Runs the temporary handshake HTTP server in a background thread."""
-    server = HTTPServer(("localhost", HANDSHAKE_PORT), HandshakeHandler)
-    server.guild_id = guild_id
-    server.handshake_done = done_event
-    server.timeout = 1  # poll every second to check for timeout / done_event
+            parts = request_line.decode("latin-1").split()
+            parsed = urlparse(parts[1]) if len(parts) >= 2 else None
+            if parsed is None or parts[0] != "GET" or parsed.path != "/handshake":
+                status, body = 404, {"error": "not found"}
+            else:
+                status, body = self._claim((parse_qs(parsed.query).get("code") or [None])[0])
 
-    deadline = asyncio.get_event_loop if False else None  # just a placeholder
-    import time
-    end_time = time.monotonic() + HANDSHAKE_TIMEOUT
+            payload = json.dumps(body).encode()
+            reason = {200: "OK", 404: "Not Found", 409: "Conflict"}[status]
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
 
-    while not done_event.is_set() and time.monotonic() < end_time:
-        server.handle_request()
+handshake_broker = HandshakeBroker()
 
-    server.server_close()
+
+def _unlink_stale_socket(path: str):
+    """Removes a socket file left behind by a previous run; refuses to delete anything else."""
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
 
 
 # ──────────────────────────────────────────────────────────────────────────────
-# Permanent API server (port 7912)
+# Permanent API server (port 7912, optionally a Unix socket)
 # ──────────────────────────────────────────────────────────────────────────────
 
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """Consumes one token. Returns 0 on success, otherwise seconds until one is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+_buckets: dict[int, TokenBucket] = {}
+_api_stats: dict[int, dict] = {}   # guild_id -> {"accepted", "rejected", "throttled"}
+_api_stats_lock = threading.Lock()
+
+def _count_request(guild_id: int | None, outcome: str):
+    with _api_stats_lock:
+        stats = _api_stats.setdefault(guild_id or 0, {"accepted": 0, "rejected": 0, "throttled": 0})
+        stats[outcome] += 1
+
+def _collect_api_metrics():
+    with _api_stats_lock:
+        return [("wmmc_api_requests_total", {"guild": str(g), "outcome": outcome}, n)
+                for g, stats in _api_stats.items() for outcome, n in stats.items()]
+
+metrics.add_collector(_collect_api_metrics)
+
+def get_api_stats(guild_id: int) -> dict:
+    with _api_stats_lock:
+        return dict(_api_stats.get(guild_id, {"accepted": 0, "rejected": 0, "throttled": 0}))
+
+def api_status_snapshot(guild_id: int) -> dict:
+    """What /minecraft status shows about the API; other shard processes ask process 0 for it."""
+    return {"running": _api_server is not None, "socket": API_SOCKET if _api_socket_server is not None else None,
+            "stats": get_api_stats(guild_id),
+            "health": {i: instances.health(guild_id, i) for i in instances.load(guild_id)}}
+
+process_channel.on("wmmc_status", lambda m: api_status_snapshot(m["guild_id"]))
+
 _api_server: HTTPServer | None = None
+_api_socket_server: socketserver.BaseServer | None = None
 _api_bot_ref = None   # set on cog init so handlers can call back into the bot
 
 
@@ -147,16 +1106,57 @@ class PermanentAPIHandler(BaseHTTPRequestHandler):
     """
     Permanent REST API that WMMC talks to after setup.
 
+    Served on localhost:API_PORT and, if WMMC_API_SOCKET is set, on that Unix socket as well.
+    Every endpoint except /ping and /metrics is authenticated first and then throttled per guild (token
+    bucket). Once the guild has been issued a token by /minecraft setup it needs "Authorization: Bearer
+    <api_token>"; guilds the bot has no data for are refused with 401.
+    POST bodies over MAX_BODY_BYTES (INGEST_BODY_BYTES for /ingest) are refused with 413 before being read.
+
+    Content negotiation (opt-in; plain JSON otherwise): responses are msgpack for "Accept: application/msgpack"
+    (when msgpack is installed) and gzip-compressed for "Accept-Encoding: gzip". POST bodies may be sent
+    the same way, with Content-Type: application/msgpack and/or Content-Encoding: gzip.
+
     Endpoints (Aligned with WMMC Implementation)
     ─────────
-    POST /identify                 → body: {"discord_server_id": "...", "wmmc_version": "..."}
-    POST /rules/sync               → body: {"discord_server_id": "...", "rules": "{...}"} (rules is a JSON string)
+    POST /identify                 → body: {"discord_server_id": "...", "wmmc_version": "...", "instance_id": "...",
+                                           "listen_port": ..., "listen_socket": "..."} (one guild may register
+                                           several instances; pushes go to listen_socket when given). 400 unless
+                                           listen_host is loopback and listen_socket an existing socket inside
+                                           INSTANCE_SOCKET_DIR
+    GET  /rules/check?server_id=...&hash=<sha256>
+                                   → {"upload": bool, "hash": "...", "version": n}; upload is false when the bot
+                                     already has rules with that hash (see rules_hash for the canonical form)
+    POST /rules/sync               → body: {"discord_server_id": "...", "rules": {...}} (rules may also be a JSON string)
+                                     or, incrementally: {"discord_server_id": "...", "base_hash": "...",
+                                     "upsert": {rule_id: rule, ...}, "delete": [rule_id, ...]}; a base_hash that is
+                                     not the bot's current hash gets 409, and WMMC falls back to a full upload.
+                                     Returns {"status", "count", "changed", "hash", "version"}
     POST /punishment/log           → body: {"discord_server_id": "...", "player_uuid": "...", "player_name": "...",
                                            "rule_id": "...", "degree": ..., "punishment_type": "...",
                                            "reason": "...", "timestamp": ...}
-    GET  /history?server_id=...&player_uuid=...
-                                   → returns combined history
-    GET  /ping                     → health check
+    GET  /history?server_id=...&player_uuid=...[&labels=0][&limit=N&cursor=...]
+                                   → returns combined history, newest first; labels=0 leaves out the formatted
+                                     date_label. With limit/cursor it returns one page plus "next_cursor"
+                                     (null on the last page). Carries an ETag; If-None-Match answers 304.
+    GET  /history/export?server_id=...[&format=ndjson|csv&since=...&until=...&origin=...]
+                                   → streams the guild's merged Discord + MC history, oldest first
+    GET  /sync/mutes?server_id=...[&since=<cursor>]
+                                   → live mutes of linked players, or only the changes after `since`
+    GET  /events?server_id=...[&cursor=...]
+                                   → SSE push stream (mute/unmute/expire/warning/command/reset events);
+                                     resumes from the Last-Event-ID header or `cursor`
+    GET  /events/poll?server_id=...&cursor=...[&timeout=30]
+                                   → long-poll variant of /events, returns {"events": [...], "cursor": "..."}
+    GET  /metrics                  → bot latency/storage metrics in Prometheus text format (no auth, like /ping)
+    GET  /ping[?server_id=...&instance_id=...]
+                                   → health check; with an instance it also counts as that instance's heartbeat
+    GET  /events and /events/poll also take `instance_id`, so direct pushes skip instances already streaming
+    POST /ingest                   → body: {"discord_server_id": "...", "events": [{"type": "chat"|"join"|"leave",
+                                           "player_uuid": "...", "player_name": "...", "message": "...",
+                                           "timestamp": ...}, ...]} (at most INGEST_BATCH_MAX events); feeds the
+                                     chat automod. 202 {"accepted", "queue_depth"}, 400 if any event is malformed
+                                     (names, uuids and messages must be strings, timestamps numbers), or 429
+                                     with Retry-After while the automod queue is full
     """
 
     def log_message(self, format, *args):
@@ -168,28 +1168,147 @@ class PermanentAPIHandler(BaseHTTPRequestHandler):
             if length == 0:
                 return {}
             raw = self.rfile.read(length)
+            if self.headers.get("Content-Encoding", "").lower() == "gzip":
+                inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                raw = inflater.decompress(raw, MAX_INFLATED_BYTES)
+                if inflater.unconsumed_tail:
+                    return None  # expands past MAX_INFLATED_BYTES
+            if msgpack and self.headers.get("Content-Type", "").split(";")[0].strip().lower() in MSGPACK_TYPES:
+                return msgpack.unpackb(raw, raw=False, strict_map_key=False)
             return json.loads(raw.decode("utf-8"))
         except Exception:
             return None
 
-    def _send_json(self, code: int, data: dict):
-        payload = json.dumps(data).encode()
+    def _accepts(self, header: str, values) -> bool:
+        """True if the request's `header` lists one of `values` without q=0."""
+        for item in self.headers.get(header, "").lower().split(","):
+            value, _, params = item.partition(";")
+            if value.strip() in values and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                return True
+        return False
+
+    def _admit(self, guild_id) -> bool:
+        """
+        Authenticates, then throttles, a request for `guild_id`. Sends the error response itself.
+
+        Authenticating first keeps callers without the token from draining the guild's bucket,
+        and guilds the bot has no data for are refused before they get a bucket, a stats entry
+        or a token cache entry, so made-up ids can't grow those maps.
+        """
+        try:
+            guild_id = int(guild_id)
+        except (TypeError, ValueError):
+            _count_request(None, "rejected")
+            self._send_json(400, {"error": "discord_server_id required"})
+            return False
+
+        auth = self.headers.get("Authorization", "")
+        token = auth[7:].strip() if auth.lower().startswith("bearer ") else self.headers.get("X-WMMC-Token")
+        if not has_server_dir(guild_id):
+            _count_request(None, "rejected")
+            self._send_json(401, {"error": "invalid or missing API token"})
+            return False
+        if not check_api_token(guild_id, token):
+            _count_request(guild_id, "rejected")
+            self._send_json(401, {"error": "invalid or missing API token"})
+            return False
+
+        bucket = _buckets.get(guild_id)
+        if bucket is None:
+            bucket = _buckets.setdefault(guild_id, TokenBucket(THROTTLE_RATE, THROTTLE_BURST))
+        wait = bucket.take()
+        if wait:
+            _count_request(guild_id, "throttled")
+            self._send_json(429, {"error": "rate limited", "retry_after": round(wait, 2)}, {"Retry-After": str(max(1, round(wait)))})
+            return False
+
+        _count_request(guild_id, "accepted")
+        return True
+
+    def _send_json(self, code: int, data: dict, headers: dict | None = None):
+        content_type, negotiated = "application/json", False
+        if msgpack and self._accepts("Accept", MSGPACK_TYPES):
+            payload, content_type, negotiated = msgpack.packb(data, use_bin_type=True), "application/msgpack", True
+        else:
+            payload = json.dumps(data).encode()
+        gzipped = len(payload) >= GZIP_MIN_BYTES and self._accepts("Accept-Encoding", ("gzip",))
+        if gzipped:
+            payload = gzip.compress(payload, compresslevel=5)
         self.send_response(code)
-        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Type", content_type)
         self.send_header("Content-Length", str(len(payload)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        if negotiated or gzipped:
+            self.send_header("Vary", "Accept, Accept-Encoding")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
         self.end_headers()
         self.wfile.write(payload)
 
     # ── GET ──────────────────────────────────────────────────────────────────
 
     def do_GET(self):
-        from urllib.parse import urlparse, parse_qs
         parsed = urlparse(self.path)
         qs = parse_qs(parsed.query)
 
+        if parsed.path == "/metrics":
+            # Guild-independent and localhost-only, like /ping; scraped by Prometheus
+            payload = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if parsed.path != "/ping":
+            server_id_list = qs.get("server_id") or qs.get("guild_id")
+            if not self._admit(server_id_list[0] if server_id_list else self.headers.get("X-Discord-Server-Id")):
+                return
+
         if parsed.path == "/ping":
+            # Instances heartbeat here; only authenticated pings count towards health
+            server_id_list = qs.get("server_id") or qs.get("guild_id")
+            instance_list = qs.get("instance_id")
+            if server_id_list and instance_list and server_id_list[0].isdigit():
+                auth = self.headers.get("Authorization", "")
+                token = auth[7:].strip() if auth.lower().startswith("bearer ") else self.headers.get("X-WMMC-Token")
+                if check_api_token(int(server_id_list[0]), token):
+                    instances.heartbeat(int(server_id_list[0]), instance_list[0])
             self._send_json(200, {"status": "ok"})
 
+        elif parsed.path == "/history/export":
+            server_id_list = qs.get("server_id") or qs.get("guild_id")
+            fmt = (qs.get("format") or ["ndjson"])[0].lower()
+            if not server_id_list or fmt not in EXPORT_FORMATS:
+                return self._send_json(400, {"error": "server_id required, format must be ndjson or csv"})
+            guild_id = int(server_id_list[0])
+            # since:/until:/origin: use the same syntax as !hwarn
+            try:
+                filters = parse_history_filters(" ".join(f"{k}:{qs[k][0]}" for k in ("since", "until", "origin") if k in qs))
+            except ValueError as e:
+                return self._send_json(400, {"error": str(e).replace("`", "")})
+            rows = iter_history_export(discord_export_sources(guild_id) + mc_export_sources(guild_id), filters)
+
+            # No Content-Length: the body is streamed in chunks and ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson" if fmt == "ndjson" else "text/csv; charset=utf-8")
+            self.send_header("Content-Disposition", f'attachment; filename="history-{guild_id}.{fmt}"')
+            self.end_headers()
+            self.close_connection = True
+            chunk, size = [], 0
+            try:
+                for line in iter_export_lines(rows, fmt):
+                    chunk.append(line)
+                    size += len(line)
+                    if size >= 64 * 1024:
+                        self.wfile.write("".join(chunk).encode("utf-8"))
+                        chunk, size = [], 0
+                self.wfile.write("".join(chunk).encode("utf-8"))
+            except OSError:
+                pass  # client went away mid-export
+
         elif parsed.path == "/history":
             server_id_list = qs.get("server_id") or qs.get("guild_id")
             uuid_list = qs.get("player_uuid")
@@ -199,70 +1318,38 @@ class PermanentAPIHandler(BaseHTTPRequestHandler):
 
             guild_id = int(server_id_list[0])
             player_uuid = uuid_list[0]
-
-            # 1. Load MC infractions for this UUID
-            mc_infractions = load_mc_infractions(guild_id)
-            player_mc = [r for r in mc_infractions if r["playerUuid"] == player_uuid]
-
-            # 2. Try to find linked Discord account for this UUID to pull Discord history
-            links = load_mc_links(guild_id)
-            player_name = player_mc[0]["playerName"] if player_mc else "Unknown"
-
-            discord_infractions = []
-            linked_discord_id = None
-            for d_id, mc_name in links.items():
-                if mc_name.lower() == player_name.lower():
-                    linked_discord_id = d_id
-                    break
-
-            if linked_discord_id:
-                from modules.core import load_server_data
-                from datetime import timedelta
-                d_warns = load_server_data(guild_id, "warnings.json") or []
-                for w in d_warns:
-                    if w["userId"] == str(linked_discord_id):
-                        ts = datetime.fromisoformat(w["timestamp"]).timestamp()
-                        discord_infractions.append({
-                            "type": "Warning (Discord)",
-                            "origin": "Discord",
-                            "reason": w["reason"],
-                            "timestamp": ts,
-                            "date_label": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
-                        })
-                d_mutes = load_server_data(guild_id, "mutes.json") or []
-                for m in d_mutes:
-                    if m["userId"] == str(linked_discord_id):
-                        ts = datetime.fromisoformat(m["timestamp"]).timestamp()
-                        discord_infractions.append({
-                            "type": f"Mute ({m['durationSec']//60}m) (Discord)",
-                            "origin": "Discord",
-                            "reason": m["reason"],
-                            "timestamp": ts,
-                            "date_label": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
-                        })
-
-            # 3. Format MC infractions
-            formatted_mc = []
-            for r in player_mc:
-                ts = r.get("timestamp") or 0
-                if isinstance(ts, str):
-                    try:
-                        ts = datetime.fromisoformat(ts).timestamp()
-                    except ValueError:
-                        ts = 0
-
-                ptype = r.get("punishmentType", r.get("punishment", "Unknown"))
-                formatted_mc.append({
-                    "type": ptype.replace("_", " ").title(),
-                    "origin": "Minecraft",
-                    "reason": r.get("reason", ""),
-                    "timestamp": ts,
-                    "date_label": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M") if ts else "N/A"
-                })
-
-            # 4. Combine and Sort
-            combined = sorted(discord_infractions + formatted_mc, key=lambda x: x["ts"] if "ts" in x else x["timestamp"], reverse=True)
-            self._send_json(200, {"infractions": combined})
+            # Clients that format dates themselves skip the per-record strftime and the bytes
+            labels = (qs.get("labels") or ["1"])[0] not in ("0", "false")
+            try:
+                limit = int(qs["limit"][0]) if "limit" in qs else None
+                cursor = qs["cursor"][0].split(".") if "cursor" in qs else None
+                cursor = (int(cursor[0]), int(cursor[1])) if cursor else None
+                if limit is not None and not 1 <= limit <= HISTORY_PAGE_MAX:
+                    raise ValueError
+            except (ValueError, IndexError):
+                return self._send_json(400, {"error": f"limit must be 1-{HISTORY_PAGE_MAX}, cursor must come from next_cursor"})
+
+            # Tag first, then read: a write in between makes the body newer than its tag, never older
+            etag = history_versions.etag(guild_id, player_uuid, f"{labels}|{limit}|{cursor}")
+            if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            rows = iter_player_history(guild_id, player_uuid, labels)
+            if limit is None and cursor is None:
+                return self._send_json(200, {"infractions": list(rows)}, {"ETag": etag})
+            page, next_cursor = paginate_history(rows, limit or HISTORY_PAGE_MAX, cursor)
+            self._send_json(200, {"infractions": page, "next_cursor": next_cursor}, {"ETag": etag})
+
+        elif parsed.path == "/rules/check":
+            server_id_list = qs.get("server_id") or qs.get("guild_id")
+            if not server_id_list:
+                return self._send_json(400, {"error": "server_id required"})
+            meta = load_mc_rules_meta(int(server_id_list[0]))
+            client_hash = (qs.get("hash") or [""])[0].lower()
+            self._send_json(200, {"upload": client_hash != meta["hash"], "hash": meta["hash"], "version": meta["version"]})
 
         elif parsed.path == "/sync/mutes":
             server_id_list = qs.get("server_id") or qs.get("guild_id")
@@ -271,26 +1358,73 @@ class PermanentAPIHandler(BaseHTTPRequestHandler):
 
             guild_id = int(server_id_list[0])
             links = load_mc_links(guild_id) # {discord_id: mc_name}
-            if not links:
-                return self._send_json(200, {"mutes": []})
-
-            from modules.core import load_server_data
-            from datetime import timedelta
-            d_mutes = load_server_data(guild_id, "mutes.json") or []
-            active_mutes = []
-            now = datetime.now(timezone.utc)
-
-            for m in d_mutes:
-                d_id = str(m["userId"])
-                if d_id in links:
-                    ts = datetime.fromisoformat(m["timestamp"])
-                    expiry = ts + timedelta(seconds=m.get("durationSec", 0))
-                    if expiry > now:
-                        active_mutes.append({
-                            "playerName": links[d_id],
-                            "expiry": int(expiry.timestamp())
-                        })
-            self._send_json(200, {"mutes": active_mutes})
+            since = (qs.get("since") or [None])[0]
+
+            # Delta mode: only what changed after the client's cursor
+            if since:
+                changes, cursor = active_mutes.changes_since(guild_id, since)
+                if changes is not None:
+                    return self._send_json(200, {
+                        "full": False,
+                        "cursor": cursor,
+                        "changes": [{"playerName": links[d_id], "action": action, "expiry": expiry}
+                                    for action, d_id, expiry in changes if d_id in links]
+                    })
+
+            live, cursor = active_mutes.snapshot(guild_id)
+            active = [{"playerName": links[d_id], "expiry": expiry} for d_id, expiry in live.items() if d_id in links]
+            self._send_json(200, {"full": True, "cursor": cursor, "mutes": active})
+
+        elif parsed.path == "/events":
+            server_id_list = qs.get("server_id") or qs.get("guild_id")
+            if not server_id_list:
+                return self._send_json(400, {"error": "server_id required"})
+            guild_id = int(server_id_list[0])
+            cursor = self.headers.get("Last-Event-ID") or (qs.get("cursor") or [None])[0]
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            instance_id = (qs.get("instance_id") or [None])[0]
+            event_stream.stream_opened(guild_id, 1)
+            if instance_id:
+                instances.stream_opened(guild_id, instance_id, 1)
+            try:
+                self.wfile.write(b"retry: 3000\n\n")
+                self.wfile.flush()
+                while True:
+                    events, cursor = event_stream.wait(guild_id, cursor, EVENT_KEEPALIVE)
+                    if not events:
+                        self.wfile.write(b": keepalive\n\n")
+                    for e in events:
+                        self.wfile.write(f"id: {e['id']}\nevent: {e['type']}\ndata: {json.dumps(e)}\n\n".encode())
+                    self.wfile.flush()
+            except OSError:
+                pass  # WMMC disconnected; it resumes with Last-Event-ID
+            finally:
+                event_stream.stream_opened(guild_id, -1)
+                if instance_id:
+                    instances.stream_opened(guild_id, instance_id, -1)
+
+        elif parsed.path == "/events/poll":
+            server_id_list = qs.get("server_id") or qs.get("guild_id")
+            if not server_id_list:
+                return self._send_json(400, {"error": "server_id required"})
+            guild_id = int(server_id_list[0])
+            try:
+                timeout = min(max(float((qs.get("timeout") or [EVENT_POLL_MAX])[0]), 0), EVENT_POLL_MAX)
+            except ValueError:
+                timeout = EVENT_POLL_MAX
+            instance_id = (qs.get("instance_id") or [None])[0]
+            event_stream.mark_poll(guild_id)
+            if instance_id:
+                instances.mark_poll(guild_id, instance_id)
+            events, cursor = event_stream.wait(guild_id, (qs.get("cursor") or [None])[0], timeout)
+            event_stream.mark_poll(guild_id)
+            if instance_id:
+                instances.mark_poll(guild_id, instance_id)
+            self._send_json(200, {"events": events, "cursor": cursor})
 
         else:
             self._send_json(404, {"error": "not found"})
@@ -298,37 +1432,86 @@ class PermanentAPIHandler(BaseHTTPRequestHandler):
     # ── POST ─────────────────────────────────────────────────────────────────
 
     def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        max_bytes = INGEST_BODY_BYTES if self.path == "/ingest" else MAX_BODY_BYTES
+        if length < 0 or length > max_bytes:
+            # Refuse before reading anything, and drop the connection so the body is never consumed
+            _count_request(None, "rejected")
+            self.close_connection = True
+            return self._send_json(413, {"error": f"body must be at most {max_bytes} bytes"})
+
         body = self._read_json_body()
-        if body is None:
+        if not isinstance(body, dict):
+            _count_request(None, "rejected")
             return self._send_json(400, {"error": "invalid json"})
 
         # Aligned key: discord_server_id
         target_guild_id = body.get("discord_server_id") or body.get("guild_id")
+        if not self._admit(target_guild_id or self.headers.get("X-Discord-Server-Id")):
+            return
 
         if self.path == "/identify":
             if not target_guild_id:
                 return self._send_json(400, {"error": "discord_server_id required"})
                 
-            listen_port = body.get("listen_port")
-            if listen_port:
-                save_server_data(int(target_guild_id), "mc_port.json", {"port": listen_port})
-                
-            print(f"[WMMC API] Identified: Guild {target_guild_id} (Version: {body.get('wmmc_version', 'unknown')}, Port: {listen_port})")
+            listen_port, listen_host, listen_socket = body.get("listen_port"), body.get("listen_host") or "localhost", body.get("listen_socket")
+            if isinstance(listen_port, str) and listen_port.isdigit():
+                listen_port = int(listen_port)
+            refused = instances.check_endpoint(listen_port, listen_host, listen_socket)
+            if refused:
+                return self._send_json(400, {"error": refused})
+            instance_id = str(body.get("instance_id") or body.get("server_name") or (f"port-{listen_port}" if listen_port else "default"))
+            instances.register(int(target_guild_id), instance_id, listen_port,
+                               host=listen_host, version=body.get("wmmc_version", "unknown"), socket_path=listen_socket)
+
+            print(f"[WMMC API] Identified: Guild {target_guild_id} instance '{instance_id}' (Version: {body.get('wmmc_version', 'unknown')}, Port: {listen_port})")
             self._send_json(200, {"status": "identified"})
 
         elif self.path == "/rules/sync":
-            if not target_guild_id or "rules" not in body:
-                return self._send_json(400, {"error": "discord_server_id and rules required"})
+            if not target_guild_id or not ("rules" in body or "upsert" in body or "delete" in body):
+                return self._send_json(400, {"error": "discord_server_id and rules (or upsert/delete) required"})
+            guild_id = int(target_guild_id)
 
-            # WMMC sends rules as a JSON STRING
-            rules_raw = body["rules"]
-            try:
-                rules_dict = json.loads(rules_raw)
-                save_mc_rules(int(target_guild_id), rules_dict)
-                print(f"[WMMC API] Rules synced for guild {target_guild_id} ({len(rules_dict)} entries)")
-                self._send_json(200, {"status": "synced", "count": len(rules_dict)})
-            except Exception as e:
-                self._send_json(400, {"error": f"Invalid rules JSON: {e}"})
+            # Concurrent syncs must not both compare against version N and both write N+1
+            conflict = error = None
+            with server_data_lock(guild_id, "mcrules.json"):
+                try:
+                    if "rules" in body:
+                        # Older WMMC builds send rules as a JSON string inside the JSON body; newer ones send the object
+                        rules_raw = body["rules"]
+                        rules_dict = rules_raw if isinstance(rules_raw, dict) else json.loads(rules_raw)
+                    else:
+                        upsert, delete = body.get("upsert") or {}, body.get("delete") or []
+                        if not isinstance(upsert, dict) or not isinstance(delete, list):
+                            raise ValueError("upsert must be an object and delete a list")
+                        current = load_mc_rules_meta(guild_id)["hash"]
+                        if str(body.get("base_hash", "")).lower() != current:
+                            conflict = current
+                        rules_dict = {} if conflict else load_mc_rules(guild_id)
+                        rules_dict.update({str(rule_id): rule for rule_id, rule in upsert.items()})
+                        for rule_id in delete:
+                            rules_dict.pop(str(rule_id), None)
+                    if not isinstance(rules_dict, dict) or not all(isinstance(r, dict) for r in rules_dict.values()):
+                        raise ValueError("rules must be an object of rule objects")
+                    # msgpack bodies may carry non-string keys; JSON (and so the hash) needs strings
+                    rules_dict = {str(rule_id): rule for rule_id, rule in rules_dict.items()}
+                    rules_hash(rules_dict)
+                except Exception as e:
+                    error = e
+                if conflict is None and error is None:
+                    changed, meta = save_mc_rules(guild_id, rules_dict)
+
+            if error is not None:
+                return self._send_json(400, {"error": f"Invalid rules JSON: {error}"})
+            if conflict is not None:
+                return self._send_json(409, {"error": "base_hash does not match, upload all rules", "hash": conflict})
+            if changed:
+                print(f"[WMMC API] Rules synced for guild {guild_id} ({len(rules_dict)} entries, v{meta['version']})")
+            self._send_json(200, {"status": "synced", "count": len(rules_dict), "changed": changed,
+                                  "hash": meta["hash"], "version": meta["version"]})
 
         elif self.path == "/punishment/log":
             required = ["discord_server_id", "player_uuid", "player_name", "rule_id", "punishment_type", "reason"]
@@ -336,31 +1519,84 @@ class PermanentAPIHandler(BaseHTTPRequestHandler):
                 return self._send_json(400, {"error": f"Missing fields: {required}"})
 
             guild_id = int(body["discord_server_id"])
-            records = load_mc_infractions(guild_id)
-            records.append({
-                "id": str(uuid.uuid4()),
-                "playerUuid": body["player_uuid"],
-                "playerName": body["player_name"],
-                "ruleId": body["rule_id"],
-                "degree": body.get("degree", 0),
-                "punishmentType": body["punishment_type"],
-                "reason": body["reason"],
-                "timestamp": body.get("timestamp", datetime.now().timestamp())
-            })
-            save_mc_infractions(guild_id, records)
+            logged_at = epoch_from_any(body.get("timestamp")) or int(datetime.now(timezone.utc).timestamp())
+            with server_data_lock(guild_id, "mc_infractions.json"):
+                records = load_mc_infractions(guild_id)
+                # WMMC reports its own timestamp, so insert in time order rather than appending
+                bisect.insort(records, {
+                    "id": str(uuid.uuid4()),
+                    "playerUuid": body["player_uuid"],
+                    "playerName": body["player_name"],
+                    "ruleId": body["rule_id"],
+                    "degree": body.get("degree", 0),
+                    "punishmentType": body["punishment_type"],
+                    "reason": body["reason"],
+                    **record_timestamps(datetime.fromtimestamp(logged_at, timezone.utc))
+                }, key=record_ts)
+                save_mc_infractions(guild_id, records)
+            history_versions.bump(guild_id, body["player_uuid"])
             print(f"[WMMC API] Punishment logged for '{body['player_name']}' in guild {guild_id}: {body['punishment_type']}")
             self._send_json(200, {"status": "logged"})
 
+        elif self.path == "/ingest":
+            events = body.get("events")
+            if not target_guild_id or not isinstance(events, list):
+                return self._send_json(400, {"error": "discord_server_id and an events list required"})
+            if len(events) > INGEST_BATCH_MAX:
+                return self._send_json(413, {"error": f"at most {INGEST_BATCH_MAX} events per batch"})
+            try:
+                for i, event in enumerate(events):
+                    events[i] = normalize_ingest_event(event)
+            except ValueError as e:
+                return self._send_json(400, {"error": f"events[{i}]: {e}"})
+            if events and not chat_ingest.submit(int(target_guild_id), events):
+                return self._send_json(429, {"error": "ingest queue full", "retry_after": 1}, {"Retry-After": "1"})
+            self._send_json(202, {"accepted": len(events), "queue_depth": chat_ingest.depth()})
+
         else:
             self._send_json(404, {"error": "not found"})
 
 
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """PermanentAPIHandler over a Unix domain socket, one thread per connection like the TCP server."""
+    daemon_threads = True
+    request_queue_size = 128  # a full backlog refuses Unix connections outright instead of retrying like TCP
+
+    def server_bind(self):
+        _unlink_stale_socket(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, SOCKET_MODE)
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)  # BaseHTTPRequestHandler expects a (host, port) client address
+
+    def server_close(self):
+        super().server_close()
+        _unlink_stale_socket(self.server_address)
+
+
+def _start_permanent_api_socket():
+    global _api_socket_server
+    if _api_socket_server is not None or not API_SOCKET or not hasattr(socket, "AF_UNIX"):
+        return
+    try:
+        _api_socket_server = UnixHTTPServer(API_SOCKET, PermanentAPIHandler)
+        print(f"[WMMC] Permanent API server listening on unix:{API_SOCKET}")
+        threading.Thread(target=_api_socket_server.serve_forever, name="wmmc-api-socket", daemon=True).start()
+    except OSError as e:
+        print(f"[WMMC] Could not listen on unix:{API_SOCKET}: {e}")
+
+
 def _start_permanent_api_server():
     global _api_server
+    _start_permanent_api_socket()
     if _api_server is not None:
         return  # already running
     try:
-        _api_server = HTTPServer(("localhost", API_PORT), PermanentAPIHandler)
+        # Threaded so long-lived /events streams don't block the other endpoints
+        _api_server = ThreadingHTTPServer(("localhost", API_PORT), PermanentAPIHandler)
+        _api_server.daemon_threads = True
         _api_server.timeout = 1
         print(f"[WMMC] Permanent API server started on localhost:{API_PORT}")
 
@@ -378,7 +1614,7 @@ def _start_permanent_api_server():
 # Discord Cog
 # ──────────────────────────────────────────────────────────────────────────────
 
-@Module.version("1.2")
+@Module.version("1.3")
 @Module.enabled()
 @Module.help(
     commands={
@@ -388,6 +1624,7 @@ def _start_permanent_api_server():
         "minecraft link": "Links a Discord account to a Minecraft username",
         "minecraft unlink": "Removes a Discord↔Minecraft account link",
         "minecraft links": "Lists all Discord↔Minecraft account links",
+        "minecraft automod [set <key> <value>|reset]": "Shows or changes the in-game chat automod",
         "punish": "Issues a standardized or manual Minecraft punishment",
     },
     description="Minecraft integration — rule syncing, cross-platform punishments, and account linking."
@@ -397,7 +1634,35 @@ class Minecraft(commands.Cog):
         self.bot = bot
         global _api_bot_ref
         _api_bot_ref = bot
-        _start_permanent_api_server()
+        # WMMC talks to one fixed port, so only the primary shard process serves the API. It reads
+        # every guild's files directly; the other processes send it their events, deliveries and
+        # status lookups over process_channel, and it sends automod actions back the same way.
+        if is_primary_process():
+            _start_permanent_api_server()
+        active_mutes.add_listener(self._on_active_mute_change)
+
+    async def cog_load(self):
+        process_channel.start()
+
+    def cog_unload(self):
+        active_mutes.remove_listener(self._on_active_mute_change)
+        process_channel.stop()
+
+    # ── Push channel publishers ──────────────────────────────────────────────
+
+    def _on_active_mute_change(self, guild_id: int, action: str, user_id: str, expiry: int):
+        """Forwards Discord-side mute/unmute/expire of linked accounts to WMMC."""
+        if get_guild_process(guild_id) != get_process_index():
+            return  # the API process noticing another shard's expiry; that shard reports it
+        mc_name = load_mc_links(guild_id).get(user_id)
+        if mc_name:
+            event_stream.publish(guild_id, action, {"playerName": mc_name, "expiry": expiry})
+
+    @commands.Cog.listener()
+    async def on_member_warned(self, member: discord.Member, count: int, reason: str):
+        mc_name = load_mc_links(member.guild.id).get(str(member.id))
+        if mc_name:
+            event_stream.publish(member.guild.id, "warning", {"playerName": mc_name, "reason": reason, "count": count})
 
     # ── /minecraft slash command group ───────────────────────────────────────
 
@@ -416,14 +1681,20 @@ class Minecraft(commands.Cog):
         if not is_moderator(ctx_or_int.user if is_int else ctx_or_int.author, min_level=3):
             return await send_response(ctx_or_int, "Administrator permission (Level 3) required.", ephemeral=True)
 
+        try:
+            pairing = await handshake_broker.open(guild_id)
+        except OSError as e:
+            return await send_response(ctx_or_int, f"Could not open the handshake port {HANDSHAKE_PORT}: {e}", ephemeral=True)
+
         embed = discord.Embed(
             title="🔗 Minecraft Setup — Handshake Window Open",
             description=(
-                "A temporary connection window is now open on **localhost:7913** for **10 minutes**.\n\n"
+                f"A temporary connection window is now open on **localhost:{HANDSHAKE_PORT}**"
+                + (f" and **unix:{HANDSHAKE_SOCKET}**" if HANDSHAKE_SOCKET else "") + " for **10 minutes**.\n\n"
                 "**Next step:** Go to your Minecraft server and run:\n"
-                "```\n/wmmc setup\n```\n"
-                "Once the handshake succeeds, this window will close automatically and your Minecraft "
-                "server will be tethered to this Discord server.\n\n"
+                f"```\n/wmmc setup {pairing['code']}\n```\n"
+                "The pairing code works once. When the handshake succeeds, this window closes automatically "
+                "and your Minecraft server is tethered to this Discord server.\n\n"
                 f"🔒 **Discord server ID:** `{guild_id}`"
             ),
             color=0x00cc66
@@ -431,35 +1702,27 @@ class Minecraft(commands.Cog):
         embed.set_footer(text="Handshake window closes in 10 minutes if not used.")
         await send_response(ctx_or_int, embed=embed)
 
-        # Run the temporary handshake server in a background thread
-        done_event = threading.Event()
-
-        def run_server():
-            _run_handshake_server(guild_id, done_event)
-
-        server_thread = threading.Thread(target=run_server, name="wmmc-handshake", daemon=True)
-        server_thread.start()
-
         # Wait for the handshake to complete or timeout, then follow up
         async def await_result():
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, lambda: done_event.wait(HANDSHAKE_TIMEOUT))
-            if result:
-                success_embed = discord.Embed(
+            result = await handshake_broker.wait(pairing, HANDSHAKE_TIMEOUT)
+            if result == "paired":
+                result_embed = discord.Embed(
                     title="Handshake Complete!",
                     description=(
                         f"Your Minecraft server has successfully tethered to **{guild_name}**.\n"
-                        f"Discord server ID `{guild_id}` is now saved on the Minecraft side.\n\n"
+                        f"Discord server ID `{guild_id}` and its API token are now saved on the Minecraft side.\n\n"
                         f"The Minecraft server will communicate with this bot at **localhost:{API_PORT}** from now on."
                     ),
                     color=0x00ff88
                 )
-                if is_int:
-                    await ctx_or_int.followup.send(embed=success_embed)
-                else:
-                    await ctx_or_int.channel.send(embed=success_embed)
+            elif result == "superseded":
+                result_embed = discord.Embed(
+                    title="Handshake Cancelled",
+                    description=f"Setup was started again, so pairing code `{pairing['code']}` is no longer valid.",
+                    color=0xffaa00
+                )
             else:
-                timeout_embed = discord.Embed(
+                result_embed = discord.Embed(
                     title="Handshake Timed Out",
                     description=(
                         "The 10-minute window expired without a Minecraft server connecting.\n"
@@ -467,10 +1730,10 @@ class Minecraft(commands.Cog):
                     ),
                     color=0xff4444
                 )
-                if is_int:
-                    await ctx_or_int.followup.send(embed=timeout_embed)
-                else:
-                    await ctx_or_int.channel.send(embed=timeout_embed)
+            if is_int:
+                await ctx_or_int.followup.send(embed=result_embed)
+            else:
+                await ctx_or_int.channel.send(embed=result_embed)
 
         asyncio.create_task(await_result())
 
@@ -542,14 +1805,13 @@ class Minecraft(commands.Cog):
         mod = ctx_or_int.user if isinstance(ctx_or_int, discord.Interaction) else ctx_or_int.author
         guild = self.bot.get_guild(guild_id) or (ctx_or_int.guild if isinstance(ctx_or_int, discord.Interaction) else ctx_or_int.guild)
 
-        rules = load_mc_rules(guild_id)
-        if rule_id not in rules:
+        rule = get_compiled_rules(guild_id).get(rule_id)
+        if rule is None:
             return await send_response(ctx_or_int,
                 f"❌ Rule `{rule_id}` not found. Use `/minecraft rules` to see available rules.", ephemeral=True)
 
-        rule = rules[rule_id]
-        rule_name = rule.get("name", f"Rule {rule_id}")
-        punishments = rule.get("punishments", [])
+        rule_name = rule.name
+        ladder = rule.ladder
 
         # 1. Resolve 'player' if it's a mention or ID
         links = load_mc_links(guild_id)
@@ -564,7 +1826,7 @@ class Minecraft(commands.Cog):
                 discord_linked_id = int(uid)
 
         # 2. Manual vs Standardized
-        is_manual = len(punishments) == 0
+        is_manual = len(ladder) == 0
         if is_manual:
             reason = f"Rule {rule_id} ({rule_name}) — manual infraction (via Discord)"
             add_mc_infraction(guild_id, resolved_player, mod.id, rule_id, 0, "manual", reason)
@@ -576,10 +1838,11 @@ class Minecraft(commands.Cog):
             return await send_response(ctx_or_int, embed=embed)
 
         if degree is None: degree = 1
-        if degree < 1 or degree > len(punishments):
-            return await send_response(ctx_or_int, f"Invalid degree `{degree}`. Valid: 1–{len(punishments)}.")
+        if degree < 1 or degree > len(ladder):
+            return await send_response(ctx_or_int, f"Invalid degree `{degree}`. Valid: 1–{len(ladder)}.")
 
-        punishment_str = punishments[degree - 1]
+        step = ladder[degree - 1]
+        punishment_str = step.raw
         reason = f"Minecraft Rule {rule_id} ({rule_name}) — {degree}° violation"
 
         # 3. Apply Discord Action
@@ -594,27 +1857,7 @@ class Minecraft(commands.Cog):
             linked_member = guild.get_member(discord_linked_id) or await guild.fetch_member(discord_linked_id)
             if linked_member:
                 try:
-                    from modules.core import parse_duration, add_warning
-                    from datetime import timedelta
-                    if punishment_str == "perm_ban":
-                        await linked_member.ban(reason=reason)
-                        discord_action = f"Ban executed on Discord for {linked_member.mention}."
-                    elif punishment_str == "warn":
-                        add_warning(guild_id, linked_member.id, mod.id, reason)
-                        discord_action = f"Warning logged on Discord for {linked_member.mention}."
-                    else:
-                        dur_str = punishment_str.split("_")[-1]
-                        dur_sec = parse_duration(dur_str)
-                        if dur_sec:
-                            if dur_sec <= 2419200:
-                                await linked_member.timeout(timedelta(seconds=dur_sec), reason=reason)
-                                discord_action = f"Muted (Timeout) for {dur_str} on Discord."
-                            else:
-                                await linked_member.ban(reason=reason)
-                                discord_action = f"Banned (exceeds timeout limit) on Discord."
-                        elif "ban" in punishment_str:
-                            await linked_member.ban(reason=reason)
-                            discord_action = f"Ban executed on Discord."
+                    discord_action = await apply_discord_step(guild_id, linked_member, step, mod.id, reason)
                 except Exception as e:
                     if "Missing Permissions" in str(e) or "403" in str(e):
                         discord_action = f"*Linked to {linked_member.mention}, but WMD lacks permissions to punish them (check role hierarchy).* "
@@ -626,24 +1869,13 @@ class Minecraft(commands.Cog):
         # 4. Log MC infraction and Queue Sync for WMMC
         add_mc_infraction(guild_id, resolved_player, mod.id, rule_id, degree, punishment_str, reason)
         
-        port_data = load_server_data(guild_id, "mc_port.json")
-        port = port_data.get("port") if port_data else None
-        
         cmd_string = f"punish {resolved_player} {rule_id} {degree}"
-        if port:
-            async def send_to_wmmc():
-                import aiohttp
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        url = f"http://localhost:{port}/command"
-                        async with session.post(url, json={"command": cmd_string}, timeout=3) as resp:
-                            if resp.status != 200:
-                                print(f"[WMMC API] Failed to push command to WMMC on port {port}: HTTP {resp.status}")
-                except Exception as e:
-                    print(f"[WMMC API] Error pushing command to WMMC on port {port}: {e}")
-            self.bot.loop.create_task(send_to_wmmc())
-        else:
-            print(f"[WMMC API] No port found for guild {guild_id}. Command `{cmd_string}` not sent to Minecraft.")
+        event_stream.publish(guild_id, "command", {"command": cmd_string, "playerName": resolved_player, "ruleId": rule_id, "degree": degree})
+
+        # Direct push to every instance that isn't following /events
+        if isinstance(ctx_or_int, discord.Interaction) and not ctx_or_int.response.is_done():
+            await ctx_or_int.response.defer()
+        delivery = await instances.deliver(guild_id, cmd_string)
 
         embed = discord.Embed(
             title="Minecraft Punishment Record",
@@ -656,7 +1888,11 @@ class Minecraft(commands.Cog):
             ),
             color=0xff4444
         )
-        embed.set_footer(text=f"Issued by {mod.name} • Syncing to Minecraft...")
+        if delivery:
+            embed.add_field(name="Minecraft Delivery", value="\n".join(f"`{i}` — {status}" for i, status in delivery.items()), inline=False)
+        else:
+            embed.add_field(name="Minecraft Delivery", value="⏳ No instance registered yet; queued on /events for replay.", inline=False)
+        embed.set_footer(text=f"Issued by {mod.name}")
         await send_response(ctx_or_int, embed=embed)
 
     # ── Prefix fallback for /punish ───────────────────────────────────────────
@@ -674,7 +1910,7 @@ class Minecraft(commands.Cog):
     @commands.group(name="minecraft", invoke_without_command=True)
     async def minecraft_prefix(self, ctx):
         if ctx.invoked_subcommand is None:
-            await ctx.reply("Usage: `!minecraft <setup|status|rules|link|unlink|links>`")
+            await ctx.reply("Usage: `!minecraft <setup|status|rules|link|unlink|links|automod>`")
 
     @minecraft_prefix.command(name="setup")
     async def minecraft_setup_prefix(self, ctx):
@@ -718,6 +1954,41 @@ class Minecraft(commands.Cog):
         text = "\n".join(f"<@{d_id}> ↔ `{n}`" for d_id, n in links.items())
         await ctx.reply(embed=discord.Embed(title="Linked Accounts", description=text, color=0x5865F2))
 
+    @minecraft_prefix.group(name="automod", invoke_without_command=True)
+    async def minecraft_automod_prefix(self, ctx):
+        if not is_moderator(ctx.author, min_level=1): return await ctx.reply("Moderator Level 1 required.")
+        policy = chat_ingest.policy(ctx.guild.id)
+        lines = [f"`{k}`: `{', '.join(v) if isinstance(v, list) else v}`" for k, v in policy.policy.items()]
+        with chat_ingest._lock:
+            stats = dict(chat_ingest.stats)
+        embed = discord.Embed(title="Minecraft Chat Automod", description="\n".join(lines), color=0xff8800)
+        embed.add_field(name="Ingest (all guilds)", value=(
+            f"{stats['events']:,} events in {stats['batches']:,} batches • {stats['keyword_hits']} keyword hits • "
+            f"{stats['rate_hits']} spam hits • {stats['rejected']} batches refused • queue {chat_ingest.depth()}"), inline=False)
+        embed.set_footer(text=f"Automod: {'enabled' if policy.enabled else 'disabled'} • !minecraft automod set <key> <value>")
+        await ctx.reply(embed=embed)
+
+    @minecraft_automod_prefix.command(name="set")
+    async def minecraft_automod_set(self, ctx, key: str, *, value: str):
+        if not is_moderator(ctx.author, min_level=3): return await ctx.reply("Moderator Level 3 required.")
+        info = load_server_data(ctx.guild.id, "info.json") or {}
+        policy = dict(info.get("mc_automod", {}))
+        policy[key] = value
+        try: policy = validate_mc_automod(policy)
+        except (ValueError, TypeError) as e: return await ctx.reply(f"❌ {e}")
+        info["mc_automod"] = policy
+        save_server_data(ctx.guild.id, "info.json", info)
+        shown = ", ".join(policy[key]) if isinstance(policy[key], list) else policy[key]
+        await ctx.reply(f"✅ Set `{key}` to `{shown}`.")
+
+    @minecraft_automod_prefix.command(name="reset")
+    async def minecraft_automod_reset(self, ctx):
+        if not is_moderator(ctx.author, min_level=3): return await ctx.reply("Moderator Level 3 required.")
+        info = load_server_data(ctx.guild.id, "info.json") or {}
+        info.pop("mc_automod", None)
+        save_server_data(ctx.guild.id, "info.json", info)
+        await ctx.reply("✅ Minecraft chat automod reset to default (disabled).")
+
     # ── Refactored Logic for Parity ──────────────────────────────────────────
 
     async def _execute_minecraft_status(self, ctx_or_int):
@@ -725,13 +1996,32 @@ class Minecraft(commands.Cog):
         rules = load_mc_rules(guild_id)
         links = load_mc_links(guild_id)
         infractions = load_mc_infractions(guild_id)
-        api_status = "🟢 Running" if _api_server is not None else "🔴 Not running"
+        if not is_secondary_process():
+            api = api_status_snapshot(guild_id)
+        else:
+            try: api = await process_channel.call(0, "wmmc_status", timeout=3, guild_id=guild_id)
+            except asyncio.TimeoutError: api = None
+        api = api or {"running": False, "socket": None, "stats": {"accepted": 0, "rejected": 0, "throttled": 0}, "health": {}}
+        api_status = "🟢 Running" if api["running"] else "🔴 Not running"
+        if api["socket"]:
+            api_status += f"\n🔌 Unix socket `{api['socket']}`"
 
         embed = discord.Embed(title="Minecraft Module Status", color=0x5865F2)
         embed.add_field(name="Permanent API (port 7912)", value=api_status, inline=False)
-        embed.add_field(name="Synced Rules", value=str(len(rules)), inline=True)
+        embed.add_field(name="Synced Rules", value=f"{len(rules)} (v{load_mc_rules_meta(guild_id)['version']})", inline=True)
         embed.add_field(name="Linked Accounts", value=str(len(links)), inline=True)
         embed.add_field(name="MC Infractions", value=str(len(infractions)), inline=True)
+        stats = api["stats"]
+        has_token = bool((load_server_data(guild_id, "mc_api.json") or {}).get("token_sha256"))
+        embed.add_field(name="API Token", value="🔒 Issued" if has_token else "⚠️ None (re-run setup)", inline=True)
+        embed.add_field(name="API Requests", value=f"{stats['accepted']} ok • {stats['rejected']} rejected • {stats['throttled']} throttled", inline=False)
+        health_icons = {"online": "🟢", "stale": "🟡", "unreachable": "🔴", "unknown": "⚪"}
+        endpoint = lambda info: f"socket `{info['socket']}`" if info.get("socket") else f"port {info.get('port') or '—'}"
+        instance_lines = [
+            f"{health_icons[h]} `{i}` — {endpoint(info)}, v{info.get('version', '?')}"
+            for i, info in instances.load(guild_id).items() for h in [api["health"].get(i, "unknown")]
+        ]
+        embed.add_field(name="WMMC Instances", value="\n".join(instance_lines) or "None registered", inline=False)
         embed.set_footer(text=f"Guild ID: {guild_id}")
         await send_response(ctx_or_int, embed=embed)
 
@@ -752,45 +2042,39 @@ class Minecraft(commands.Cog):
 
     # ── Internal Helpers ──────────────────────────────────────────────────────
 
-    async def get_combined_history(self, member: discord.Member):
-        from modules.core import load_server_data
+    def get_history_sources(self, member: discord.Member):
+        """Returns ([(origin, records, to_item)], mc_name) for the member's linked MC infractions."""
         guild_id = member.guild.id
-
-        # 1. Discord Data
-        warns = load_server_data(guild_id, "warnings.json") or []
-        user_warns = [w for w in warns if w["userId"] == str(member.id)]
-        mutes = load_server_data(guild_id, "mutes.json") or []
-        user_mutes = [m for m in mutes if m["userId"] == str(member.id)]
-
-        # 2. MC Data
         links = load_mc_links(guild_id)
         mc_name = links.get(str(member.id))
-        mc_infractions = []
-        if mc_name:
-            all_mc = load_mc_infractions(guild_id)
-            mc_infractions = [r for r in all_mc if r["playerName"].lower() == mc_name.lower()]
-
-        # 3. Combine
-        items = []
-        for w in user_warns:
-            ts = datetime.fromisoformat(w["timestamp"]).timestamp()
-            items.append({"origin": "Discord", "type": "Warning", "reason": w["reason"], "ts": ts})
-        for m in user_mutes:
-            ts = datetime.fromisoformat(m["timestamp"]).timestamp()
-            items.append({"origin": "Discord", "type": f"Mute ({m['durationSec']//60}m)", "reason": m["reason"], "ts": ts})
-        for r in mc_infractions:
-            ts = r.get("timestamp") or 0
-            if isinstance(ts, str):
-                try:
-                    ts = datetime.fromisoformat(ts).timestamp()
-                except ValueError:
-                    ts = 0
-            ptype = r.get("punishmentType", r.get("punishment", "Unknown"))
-            items.append({"origin": "Minecraft", "type": ptype.replace("_", " ").title(), "reason": r.get("reason", ""), "ts": ts})
+        if not mc_name:
+            return [], None
+        records = load_records_by(guild_id, "mc_infractions.json", "playerName", mc_name)
+        return [("Minecraft", records, _mc_history_item)], mc_name
 
-        items.sort(key=lambda x: x["ts"], reverse=True)
+    async def get_combined_history(self, member: discord.Member):
+        from modules.core import discord_history_sources, merge_history_sources
+        mc_sources, mc_name = self.get_history_sources(member)
+        sources = discord_history_sources(member.guild.id, member.id) + mc_sources
+        items, total = merge_history_sources(sources, 0, sum(len(r) for _, r, _ in sources))
         return items, mc_name
 
+    def get_export_sources(self, guild_id: int) -> list:
+        return mc_export_sources(guild_id)
+
+
+def mc_export_sources(guild_id: int) -> list:
+    """Guild-wide (origin, records, to_row) source for MC infractions, tagged with the linked Discord user."""
+    by_name = {name.lower(): d_id for d_id, name in load_mc_links(guild_id).items()}
+    return [("Minecraft", load_mc_infractions(guild_id), lambda r: export_row(
+        r, "Minecraft", r.get("punishmentType", r.get("punishment", "unknown")),
+        user_id=by_name.get(r.get("playerName", "").lower()), player=r.get("playerName")))]
+
+def _mc_history_item(r: dict) -> dict:
+    ts = record_ts(r)
+    ptype = r.get("punishmentType", r.get("punishment", "Unknown"))
+    return {"origin": "Minecraft", "type": ptype.replace("_", " ").title(), "reason": r.get("reason", ""), "ts": ts}
+
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Minecraft(bot))
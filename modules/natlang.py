@@ -3,9 +3,9 @@ import json
 import discord
 from discord.ext import commands
 from discord import app_commands
-from module_utils import Module, load_server_data, is_module_enabled
+from module_utils import Module, load_server_data, is_module_enabled, run_storage, metrics
 from groq import Groq
-from modules.core import is_moderator
+from modules.core import is_moderator, end_active_mute, resolve_member
 
 groq_client = Groq(api_key=os.getenv("GROQ")) if os.getenv("GROQ") else None
 
@@ -71,13 +71,14 @@ class NatLang(commands.Cog):
         if message.author.bot or not message.guild:
             return
 
+        # Cheap cached check first: most guilds never enable NatLang, so skip their messages entirely
+        if not is_module_enabled(message.guild.id, "NatLang"):
+            return
+
         config = load_server_data(message.guild.id, "config.json") or {}
         wakeword = config.get("natlang_wakeword", "WM").lower()
 
         if message.content.strip().lower().split(" ")[0] == wakeword:
-            if not is_module_enabled(message.guild.id, "NatLang"):
-                return
-
             if not is_moderator(message.author):
                 return await message.reply("❌ Denied.")
 
@@ -197,20 +198,21 @@ If you cannot identify a user, use their username or mention as user_id.
 
             ctx = "\n".join(context_parts) + f"\nQuery: {query}"
 
-            completion = groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": ctx
-                    }
-                ],
-                response_format={"type": "json_object"}
-            )
+            with metrics.timer("groq", "llama-3.3-70b-versatile"):
+                completion = groq_client.chat.completions.create(
+                    model="llama-3.3-70b-versatile",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": prompt
+                        },
+                        {
+                            "role": "user",
+                            "content": ctx
+                        }
+                    ],
+                    response_format={"type": "json_object"}
+                )
 
             res = json.loads(completion.choices[0].message.content)
 
@@ -255,23 +257,14 @@ If you cannot identify a user, use their username or mention as user_id.
                     .replace("!", "")
                 )
 
-                try:
-                    uid = int(u_str)
-                    return guild.get_member(uid) or await self.bot.fetch_user(uid)
-
-                except ValueError:
-                    u_lower = str(u_input).lower()
-
-                    for m in guild.members:
-                        if (
-                            m.name.lower() == u_lower
-                            or (
-                                m.nick
-                                and m.nick.lower() == u_lower
-                            )
-                        ):
-                            return m
+                member = await resolve_member(guild, u_str if u_str.isdigit() else str(u_input))
+                if member or not u_str.isdigit():
+                    return member
 
+                # Not in the guild (e.g. unban): fall back to the plain user
+                try:
+                    return await self.bot.fetch_user(int(u_str))
+                except discord.HTTPException:
                     return None
 
             core_cog = self.bot.get_cog("Core")
@@ -435,7 +428,7 @@ If you cannot identify a user, use their username or mention as user_id.
                     ephemeral=True
                 )
 
-            if t_member and t_member == guild.owner:
+            if t_member and t_member.id == guild.owner_id:
                 return await self._send_or_reply(
                     target,
                     "Cannot moderate owner.",
@@ -491,6 +484,7 @@ If you cannot identify a user, use their username or mention as user_id.
 
             elif action == "unmute" and core_cog:
                 await t_member.timeout(None)
+                await run_storage(end_active_mute, guild.id, t_member.id)
 
                 await self._send_or_reply(
                     target,
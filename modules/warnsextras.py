@@ -1,25 +1,217 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from module_utils import Module, load_server_data, save_server_data
-from datetime import datetime, timedelta
+from module_utils import Module, load_server_data, save_server_data, get_server_data_mtime, server_data_lock, run_storage
+from datetime import datetime, timedelta, timezone
 import asyncio
-from modules.core import is_moderator
+import csv
+import io
+import json
+import math
+import time
+import uuid
+from modules.core import is_moderator, get_author, parse_duration, build_history_filters, parse_history_filters, describe_history_filters, page_records, PaginatedEmbedView, get_user_counters, load_warning_counters, save_warning_counters, reset_warning_counters, rebuild_warning_counters, RECENT_WARNINGS_KEPT, record_ts, epoch_from_any, add_warnings_bulk
 
-@Module.version("1.2")
+# ─── Escalation Policy ──────────────────────────────────────────────────────
+# Stored per guild under info.json["escalation"]. The default reproduces the original
+# behaviour: from the 3rd warning on, mute for (count - 2) * 6 hours.
+DEFAULT_ESCALATION = {
+    "window_hours": 0,            # only warnings inside this sliding window count (0 = all time)
+    "decay_half_life_hours": 0,   # a warning's weight halves every N hours (0 = no decay)
+    "mute_start": 3,              # first effective warning count that mutes
+    "mute_ladder": [],            # explicit mute durations from mute_start on, e.g. ["1h", "6h", "1d"]
+    "mute_step": "6h",            # added per warning past the end of the ladder
+    "kick_at": 0,                 # effective count that kicks (0 = never)
+    "ban_at": 0                   # effective count that bans (0 = never)
+}
+MAX_TIMEOUT_SEC = 28 * 86400  # Discord's timeout limit
+
+def format_duration(seconds: int) -> str:
+    parts = []
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60), ("s", 1)):
+        if seconds >= size:
+            parts.append(f"{seconds // size}{unit}")
+            seconds %= size
+    return " ".join(parts) or "0s"
+
+def validate_escalation_policy(policy: dict) -> dict:
+    """Returns a complete policy dict, raising ValueError on unknown keys or bad values."""
+    merged = dict(DEFAULT_ESCALATION)
+    for key, value in (policy or {}).items():
+        if key not in DEFAULT_ESCALATION: raise ValueError(f"Unknown policy key `{key}`.")
+        merged[key] = value
+    for key in ("window_hours", "decay_half_life_hours", "mute_start", "kick_at", "ban_at"):
+        merged[key] = int(merged[key])
+        if merged[key] < 0: raise ValueError(f"`{key}` cannot be negative.")
+    if isinstance(merged["mute_ladder"], str):
+        merged["mute_ladder"] = [d.strip() for d in merged["mute_ladder"].split(",") if d.strip()]
+    for dur in merged["mute_ladder"] + [merged["mute_step"]]:
+        if parse_duration(str(dur)) is None: raise ValueError(f"Invalid duration `{dur}`. Use format: `10s`, `5m`, `2h`, `1d`")
+    return merged
+
+class CompiledEscalation:
+    """An escalation policy flattened into a count → action lookup table.
+
+    Actions are tuples: ("none",), ("mute", seconds), ("kick",) or ("ban",).
+    Counts past the end of the table follow a single precomputed tail rule.
+    """
+
+    def __init__(self, policy: dict, enabled: bool = True):
+        self.policy = validate_escalation_policy(policy)
+        self.enabled = enabled
+        p = self.policy
+        self.window = p["window_hours"] * 3600
+        self.half_life = p["decay_half_life_hours"] * 3600
+        self.mute_start = p["mute_start"]
+        self.ladder = [parse_duration(str(d)) for d in p["mute_ladder"]]
+        self.step = parse_duration(str(p["mute_step"]))
+        size = max(self.mute_start + len(self.ladder), p["kick_at"], p["ban_at"]) + 1
+        self.table = [self._resolve(n) for n in range(size)]
+        if p["ban_at"]: self.tail = ("ban",)
+        elif p["kick_at"]: self.tail = ("kick",)
+        elif self.mute_start and self.step: self.tail = None  # open-ended mute ladder
+        else: self.tail = self.table[-1]
+
+    def _mute_seconds(self, count: int) -> int:
+        idx = count - self.mute_start
+        if idx < len(self.ladder): return min(self.ladder[idx], MAX_TIMEOUT_SEC)
+        base = self.ladder[-1] if self.ladder else 0
+        return min(base + (idx - len(self.ladder) + 1) * self.step, MAX_TIMEOUT_SEC)
+
+    def _resolve(self, count: int):
+        p = self.policy
+        if p["ban_at"] and count >= p["ban_at"]: return ("ban",)
+        if p["kick_at"] and count >= p["kick_at"]: return ("kick",)
+        if self.mute_start and count >= self.mute_start:
+            secs = self._mute_seconds(count)
+            if secs: return ("mute", secs)
+        return ("none",)
+
+    def effective_count(self, counters: dict, now: float) -> int:
+        """Applies the sliding window and decay to a user's counters (bounded by RECENT_WARNINGS_KEPT)."""
+        if not self.window and not self.half_life:
+            return counters["warnings"]
+        total = 0.0
+        for ts in reversed(counters["recent"]):
+            age = max(0, now - ts)
+            if self.window and age > self.window: break
+            total += 0.5 ** (age / self.half_life) if self.half_life else 1
+        return int(math.floor(total + 1e-9))
+
+    def action_for(self, count: int):
+        if count < len(self.table): return self.table[count]
+        if self.tail is None: return ("mute", self._mute_seconds(count))
+        return self.tail
+
+    def evaluate(self, counters: dict, now: float = None):
+        if now is None: now = datetime.now(timezone.utc).timestamp()
+        count = self.effective_count(counters, now)
+        return count, self.action_for(count)
+
+def replay_escalation(policy: dict, warnings: list) -> list:
+    """Replays a recorded warnings.json log against a policy without touching Discord.
+
+    Returns one (warning, effective_count, action) tuple per warning, in time order.
+    """
+    compiled = CompiledEscalation(policy)
+    counters = {}
+    results = []
+    for w in sorted(warnings, key=record_ts):
+        ts = record_ts(w)
+        c = counters.setdefault(w["userId"], {"warnings": 0, "recent": []})
+        c["warnings"] += 1
+        c["recent"] = (c["recent"] + [int(ts)])[-RECENT_WARNINGS_KEPT:]
+        count, action = compiled.evaluate(c, ts)
+        results.append((w, count, action))
+    return results
+
+# ─── Bulk import ─────────────────────────────────────────────────────────────
+# Column names used by the exports of the bots we usually migrate from, plus our own.
+IMPORT_ALIASES = {
+    "user": ("userId", "user_id", "user", "member_id", "target_id", "discord_id", "offender_id"),
+    "moderator": ("moderatorId", "moderator_id", "mod_id", "moderator", "issuer_id", "staff_id"),
+    "reason": ("reason", "note", "description"),
+    "timestamp": ("ts", "timestamp", "created_at", "date", "time"),
+}
+IMPORT_MAX_REJECTS_SHOWN = 10
+
+def _pick(row: dict, field: str):
+    for key in IMPORT_ALIASES[field]:
+        if row.get(key) not in (None, ""): return row[key]
+    return None
+
+def parse_import_rows(raw: bytes, filename: str = "") -> list:
+    """Reads a CSV or JSON export into a list of dict rows. JSON may be a list or {"warnings": [...]}."""
+    text = raw.decode("utf-8-sig")
+    if filename.lower().endswith(".csv") or not text.lstrip().startswith(("[", "{")):
+        return list(csv.DictReader(io.StringIO(text)))
+    data = json.loads(text)
+    if isinstance(data, dict): data = data.get("warnings", data.get("warns", []))
+    if not isinstance(data, list): raise ValueError("expected a list of warnings")
+    return data
+
+def import_warnings(guild_id: int, rows: list, default_mod_id=None) -> dict:
+    """Validates, dedupes by (user, timestamp, reason) and bulk-loads rows. Returns a report dict."""
+    started = time.perf_counter()
+    existing = load_server_data(guild_id, "warnings.json") or []
+    seen = {(w["userId"], record_ts(w), w.get("reason", "").strip()) for w in existing}
+    accepted, rejects, duplicates = [], [], 0
+    for n, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            rejects.append((n, "not an object")); continue
+        user = str(_pick(row, "user") or "").strip("<@!> ")
+        reason = str(_pick(row, "reason") or "").strip()
+        try: ts = epoch_from_any(_pick(row, "timestamp"))
+        except (TypeError, ValueError): ts = 0
+        if not user.isdigit(): rejects.append((n, "missing or invalid user id")); continue
+        if not reason: rejects.append((n, "missing reason")); continue
+        if ts <= 0: rejects.append((n, "missing or invalid timestamp")); continue
+        key = (user, ts, reason)
+        if key in seen:
+            duplicates += 1; continue
+        seen.add(key)
+        mod = str(_pick(row, "moderator") or default_mod_id or "0").strip("<@!> ")
+        accepted.append({
+            "id": str(uuid.uuid4()), "userId": user, "reason": reason,
+            "moderatorId": mod if mod.isdigit() else "0",
+            "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat(), "ts": ts,
+            "importedFrom": row.get("source", "import"),
+        })
+    imported = add_warnings_bulk(guild_id, accepted)
+    elapsed = time.perf_counter() - started
+    return {"rows": len(rows), "imported": imported, "duplicates": duplicates, "rejected": rejects,
+            "seconds": elapsed, "rate": len(rows) / elapsed if elapsed else 0.0}
+
+def format_import_report(report: dict) -> str:
+    lines = [
+        f"Imported **{report['imported']}** of {report['rows']} rows in {report['seconds']:.2f}s "
+        f"({report['rate']:,.0f} rows/s).",
+        f"Duplicates skipped: {report['duplicates']} • Rejected: {len(report['rejected'])}",
+    ]
+    for n, why in report["rejected"][:IMPORT_MAX_REJECTS_SHOWN]:
+        lines.append(f"  row {n}: {why}")
+    if len(report["rejected"]) > IMPORT_MAX_REJECTS_SHOWN:
+        lines.append(f"  … and {len(report['rejected']) - IMPORT_MAX_REJECTS_SHOWN} more")
+    return "\n".join(lines)
+
+@Module.version("1.3")
 @Module.enabled()
 @Module.help(
     commands={
-        "allwarns": "shows all warns in a server",
+        "allwarns": "shows all warns in a server (filters: mod:@user since:YYYY-MM-DD until:YYYY-MM-DD)",
         "clearwarns": "clears all warns from a user",
         "resetwarns": "clears all warns in the whole server",
-        "automute": "toggle auto-mute on warnings"
+        "automute": "toggle auto-mute on warnings",
+        "escalation": "shows, sets, resets or simulates the auto-punishment policy",
+        "rebuildcounters": "rebuilds warning counters from the raw warning log",
+        "warns import": "imports warnings from another bot's CSV/JSON export (attach the file)"
     },
     description="WarnsExtras handles advanced warning features and auto punishments."
 )
 class WarnsExtras(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._policies = {}  # guild_id -> (info.json mtime, CompiledEscalation)
 
     async def _send_or_reply(self, target, content=None, embed=None, view=None, ephemeral=False):
         if isinstance(target, discord.Interaction):
@@ -27,22 +219,88 @@ class WarnsExtras(commands.Cog):
             else: await target.response.send_message(content=content, embed=embed, view=view, ephemeral=ephemeral)
         else: await target.reply(content=content, embed=embed, view=view)
 
+    def get_escalation(self, guild_id: int) -> CompiledEscalation:
+        mtime = get_server_data_mtime(guild_id, "info.json")
+        cached = self._policies.get(guild_id)
+        if cached and cached[0] == mtime: return cached[1]
+        info = load_server_data(guild_id, "info.json") or {}
+        try: compiled = CompiledEscalation(info.get("escalation", {}), enabled=not info.get("auto_mute_disabled", False))
+        except (ValueError, TypeError) as e:
+            print(f"Invalid escalation policy for guild {guild_id}, using default: {e}")
+            compiled = CompiledEscalation({}, enabled=not info.get("auto_mute_disabled", False))
+        self._policies[guild_id] = (mtime, compiled)
+        return compiled
+
     @commands.Cog.listener()
     async def on_member_warned(self, member: discord.Member, count: int, reason: str):
         from module_utils import is_module_enabled
         if not is_module_enabled(member.guild.id, "WarnsExtras"): return
         
-        info = load_server_data(member.guild.id, "info.json") or {}
-        auto_mute_disabled = info.get("auto_mute_disabled", False)
+        policy = self.get_escalation(member.guild.id)
+        if not policy.enabled: return
         
-        if auto_mute_disabled or count < 3: return
+        count, action = policy.evaluate(get_user_counters(member.guild.id, member.id))
+        if action[0] == "none": return
         
-        hours = (count - 2) * 6
-        duration = timedelta(hours=hours)
         try:
-            await member.timeout(duration, reason=f"Auto-timeout: Reached {count} warnings")
-            await member.send(f"🔇 You have been automatically timed out in **{member.guild.name}** for {hours} hours due to reaching {count} warnings.")
-        except Exception as e: print(f"Failed to auto-timeout user {member.name}: {e}")
+            if action[0] == "mute":
+                await member.timeout(timedelta(seconds=action[1]), reason=f"Auto-timeout: Reached {count} warnings")
+                await member.send(f"🔇 You have been automatically timed out in **{member.guild.name}** for {format_duration(action[1])} due to reaching {count} warnings.")
+            elif action[0] == "kick":
+                try: await member.send(f"👢 You have been automatically kicked from **{member.guild.name}** due to reaching {count} warnings.")
+                except Exception: pass
+                await member.kick(reason=f"Auto-kick: Reached {count} warnings")
+            elif action[0] == "ban":
+                try: await member.send(f"🔨 You have been automatically banned from **{member.guild.name}** due to reaching {count} warnings.")
+                except Exception: pass
+                await member.ban(reason=f"Auto-ban: Reached {count} warnings")
+        except Exception as e: print(f"Failed to auto-{action[0]} user {member.name}: {e}")
+
+    # ─── Escalation Policy ───────────────────────────────────────────────────
+    @commands.group(name="escalation", invoke_without_command=True)
+    async def escalation_prefix(self, ctx):
+        if not is_moderator(ctx.author, min_level=1): return await ctx.reply("Moderator Level 1 required.")
+        policy = self.get_escalation(ctx.guild.id)
+        lines = [f"`{k}`: `{v}`" for k, v in policy.policy.items()]
+        ladder = []
+        for n in range(1, len(policy.table) + 2):
+            act = policy.action_for(n)
+            if act[0] != "none": ladder.append(f"{n} → {act[0]}" + (f" {format_duration(act[1])}" if act[0] == "mute" else ""))
+        embed = discord.Embed(title="Auto-Punishment Escalation", description="\n".join(lines), color=0xff8800)
+        embed.add_field(name="Ladder", value="\n".join(ladder) or "No automatic actions.", inline=False)
+        embed.set_footer(text=f"Auto punishments: {'enabled' if policy.enabled else 'disabled'} • !escalation set <key> <value>")
+        await ctx.reply(embed=embed)
+
+    @escalation_prefix.command(name="set")
+    async def escalation_set(self, ctx, key: str, *, value: str):
+        if not is_moderator(ctx.author, min_level=3): return await ctx.reply("Moderator Level 3 required.")
+        info = load_server_data(ctx.guild.id, "info.json") or {}
+        policy = dict(info.get("escalation", {}))
+        policy[key] = value
+        try: policy = validate_escalation_policy(policy)
+        except (ValueError, TypeError) as e: return await ctx.reply(f"❌ {e}")
+        info["escalation"] = policy
+        save_server_data(ctx.guild.id, "info.json", info)
+        await ctx.reply(f"✅ Set `{key}` to `{policy[key]}`.")
+
+    @escalation_prefix.command(name="reset")
+    async def escalation_reset(self, ctx):
+        if not is_moderator(ctx.author, min_level=3): return await ctx.reply("Moderator Level 3 required.")
+        info = load_server_data(ctx.guild.id, "info.json") or {}
+        info.pop("escalation", None)
+        save_server_data(ctx.guild.id, "info.json", info)
+        await ctx.reply("✅ Escalation policy reset to default.")
+
+    @escalation_prefix.command(name="simulate")
+    async def escalation_simulate(self, ctx):
+        if not is_moderator(ctx.author, min_level=2): return await ctx.reply("Moderator Level 2 required.")
+        warns = load_server_data(ctx.guild.id, "warnings.json") or []
+        results = replay_escalation(self.get_escalation(ctx.guild.id).policy, warns)
+        totals = {}
+        for _, _, action in results:
+            totals[action[0]] = totals.get(action[0], 0) + 1
+        summary = "\n".join(f"**{k}**: {v}" for k, v in sorted(totals.items())) or "No warnings recorded."
+        await ctx.reply(embed=discord.Embed(title=f"Escalation Replay ({len(results)} warnings)", description=summary, color=0xff8800))
 
     # ─── Auto Mute Toggle ────────────────────────────────────────────────────
     @app_commands.command(name="automute", description="Toggle auto-mute on warnings (Admins only)")
@@ -69,24 +327,38 @@ class WarnsExtras(commands.Cog):
 
     # ─── All Warns ───────────────────────────────────────────────────────────
     @app_commands.command(name="allwarns", description="Shows all warnings in this server")
-    async def allwarns_slash(self, interaction: discord.Interaction):
+    @app_commands.describe(moderator="Only warnings issued by this moderator", since="YYYY-MM-DD", until="YYYY-MM-DD")
+    async def allwarns_slash(self, interaction: discord.Interaction, moderator: discord.Member = None, since: str = None, until: str = None):
         if not is_moderator(interaction.user, min_level=1): return await interaction.response.send_message("Moderator Level 1 required.", ephemeral=True)
-        await self._do_allwarns(interaction)
+        try: filters = build_history_filters(str(moderator.id) if moderator else None, since, until)
+        except ValueError as e: return await interaction.response.send_message(f"⚠️ {e}", ephemeral=True)
+        await self._do_allwarns(interaction, filters)
 
     @commands.command(name="allwarns")
-    async def allwarns_prefix(self, ctx):
+    async def allwarns_prefix(self, ctx, *, filters: str = None):
         if not is_moderator(ctx.author, min_level=1): return await ctx.reply("Moderator Level 1 required.")
-        await self._do_allwarns(ctx)
+        try: filters = parse_history_filters(filters)
+        except ValueError as e: return await ctx.reply(f"⚠️ {e}")
+        await self._do_allwarns(ctx, filters)
 
-    async def _do_allwarns(self, target):
+    async def _do_allwarns(self, target, filters: dict = None):
         guild_id = target.guild.id
+        filters = filters or {}
         warns = load_server_data(guild_id, "warnings.json") or []
         if not warns: return await self._send_or_reply(target, "✅ No warnings found.", ephemeral=True)
-        warns.sort(key=lambda x: x["timestamp"], reverse=True)
-        lines = [f"• <@{w['userId']}> — {w['reason']} (by <@{w['moderatorId']}> on <t:{int(datetime.fromisoformat(w['timestamp']).timestamp())}:f>)" for w in warns]
-        embed = discord.Embed(title=f"Server Warnings ({len(warns)})", description="\n".join(lines[:30]), color=0xff4444)
-        if len(lines) > 30: embed.set_footer(text="Showing last 30 warnings.")
-        await self._send_or_reply(target, embed=embed)
+
+        def render(page_warns, page, pages, total):
+            lines = [f"• <@{w['userId']}> — {w['reason']} (by <@{w['moderatorId']}> on <t:{record_ts(w)}:f>)" for w in page_warns]
+            embed = discord.Embed(title=f"Server Warnings ({total})", description="\n".join(lines), color=0xff4444)
+            footer = f"Page {page + 1}/{pages}"
+            if filters: footer += f" • {describe_history_filters(filters)}"
+            embed.set_footer(text=footer)
+            return embed
+
+        view = PaginatedEmbedView(get_author(target).id, lambda offset, limit: page_records(warns, offset, limit, filters), render)
+        embed = view.build_embed()
+        if not view.total: return await self._send_or_reply(target, "✅ No warnings match those filters.", ephemeral=True)
+        await self._send_or_reply(target, embed=embed, view=view if view.pages > 1 else None)
 
     # ─── Clear Warns ─────────────────────────────────────────────────────────
     @app_commands.command(name="clearwarns", description="Clears all warnings for a member")
@@ -99,13 +371,19 @@ class WarnsExtras(commands.Cog):
         if not is_moderator(ctx.author, min_level=2): return await ctx.reply("Moderator Level 2 required.")
         await self._do_clearwarns(ctx, member)
 
+    @staticmethod
+    def _clear_user_warnings(guild_id: int, user_id: int) -> list:
+        with server_data_lock(guild_id, "warnings.json"):
+            warns = load_server_data(guild_id, "warnings.json") or []
+            user_warns = [w for w in warns if w["userId"] == str(user_id)]
+            if user_warns:
+                save_server_data(guild_id, "warnings.json", [w for w in warns if w["userId"] != str(user_id)])
+                reset_warning_counters(guild_id, user_id)
+        return user_warns
+
     async def _do_clearwarns(self, target, member):
-        guild_id = target.guild.id
-        warns = load_server_data(guild_id, "warnings.json") or []
-        user_warns = [w for w in warns if w["userId"] == str(member.id)]
+        user_warns = await run_storage(self._clear_user_warnings, target.guild.id, member.id)
         if not user_warns: return await self._send_or_reply(target, f"{member.name} has no warnings.", ephemeral=True)
-        updated = [w for w in warns if w["userId"] != str(member.id)]
-        save_server_data(guild_id, "warnings.json", updated)
         await self._send_or_reply(target, f"Cleared {len(user_warns)} warnings for {member.mention}.")
 
     # ─── Reset Warns ─────────────────────────────────────────────────────────
@@ -119,14 +397,28 @@ class WarnsExtras(commands.Cog):
         if not is_moderator(ctx.author, min_level=3): return await ctx.reply("Moderator Level 3 required.")
         await self._do_resetwarns(ctx)
 
+    @staticmethod
+    def _reset_all_warnings(guild_id: int) -> tuple:
+        with server_data_lock(guild_id, "warnings.json"):
+            old_warns = load_server_data(guild_id, "warnings.json") or []
+            old_counters = json.loads(json.dumps(load_warning_counters(guild_id)))
+            save_server_data(guild_id, "warnings.json", [])
+            reset_warning_counters(guild_id)
+        return old_warns, old_counters
+
+    @staticmethod
+    def _restore_warnings(guild_id: int, old_warns: list, old_counters: dict):
+        with server_data_lock(guild_id, "warnings.json"), server_data_lock(guild_id, "warn_counters.json"):
+            save_server_data(guild_id, "warnings.json", old_warns)
+            save_warning_counters(guild_id, old_counters)
+
     async def _do_resetwarns(self, target):
         guild_id = target.guild.id
-        old_warns = load_server_data(guild_id, "warnings.json") or []
-        save_server_data(guild_id, "warnings.json", [])
+        old_warns, old_counters = await run_storage(self._reset_all_warnings, guild_id)
         
         view = discord.ui.View()
         async def undo(intx):
-            save_server_data(guild_id, "warnings.json", old_warns)
+            await run_storage(self._restore_warnings, guild_id, old_warns, old_counters)
             await intx.response.edit_message(content="Restored warnings.", view=None)
         
         btn = discord.ui.Button(label="Undo", style=discord.ButtonStyle.primary)
@@ -142,5 +434,39 @@ class WarnsExtras(commands.Cog):
             try: await msg.edit(view=None)
             except: pass
 
+    # ─── Rebuild Counters ────────────────────────────────────────────────────
+    @commands.command(name="rebuildcounters")
+    async def rebuildcounters_prefix(self, ctx):
+        if not is_moderator(ctx.author, min_level=3): return await ctx.reply("Moderator Level 3 required.")
+        counters = await run_storage(rebuild_warning_counters, ctx.guild.id)
+        await ctx.reply(f"Rebuilt warning counters for {len(counters['users'])} users.")
+
+    # ─── Bulk Import ─────────────────────────────────────────────────────────
+    @commands.group(name="warns", invoke_without_command=True)
+    async def warns_group(self, ctx):
+        await ctx.reply("⚠️ Usage: `!warns import` with a CSV or JSON export attached.")
+
+    @warns_group.command(name="import")
+    async def warns_import(self, ctx):
+        if not is_moderator(ctx.author, min_level=3): return await ctx.reply("Moderator Level 3 required.")
+        if not ctx.message.attachments: return await ctx.reply("⚠️ Attach a CSV or JSON export to import.")
+        attachment = ctx.message.attachments[0]
+        try: rows = parse_import_rows(await attachment.read(), attachment.filename)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e: return await ctx.reply(f"❌ Could not read `{attachment.filename}`: {e}")
+        async with ctx.typing():
+            report = await run_storage(import_warnings, ctx.guild.id, rows, ctx.author.id)
+        await ctx.reply(format_import_report(report))
+
 async def setup(bot):
-    await bot.add_cog(WarnsExtras(bot))
\ No newline at end of file
+    await bot.add_cog(WarnsExtras(bot))
+
+
+if __name__ == "__main__":
+    # Offline import, for running against the data directory while the bot is stopped:
+    #   python -m modules.warnsextras <guild_id> <export.csv|export.json> [default_moderator_id]
+    import sys
+    if len(sys.argv) < 3:
+        sys.exit("usage: python -m modules.warnsextras <guild_id> <file> [default_moderator_id]")
+    with open(sys.argv[2], "rb") as f:
+        import_rows = parse_import_rows(f.read(), sys.argv[2])
+    print(format_import_report(import_warnings(int(sys.argv[1]), import_rows, sys.argv[3] if len(sys.argv) > 3 else None)).replace("**", ""))
\ No newline at end of file